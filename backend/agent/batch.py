@@ -0,0 +1,248 @@
+"""Batch runs — many prompts through the pipeline with bounded concurrency.
+
+Input is JSONL, one item per line::
+
+    {"id": "q1", "message": "how many open cases"}
+    {"id": "q2", "message": "top 5 agents by closed cases", "budget_seconds": 60}
+
+(``prompt`` is accepted for ``message``; ``id`` defaults to the line number.)
+At most ``concurrency`` items run at once.  Every item goes through
+``run_agent_pipeline`` in one process, so they share its caches — the schema
+catalog, learned plan templates, few-shot examples and the Gemini prompt
+single-flight.  Duplicate prompts (same text after whitespace / case
+folding) are run once per batch and the other items reuse the result, even
+when they are not in flight at the same time.
+
+Results are produced per item as they finish, followed by one summary::
+
+    {"type": "item", "id": "q1", "index": 0, "ok": true, "agent_response": "...", "latency_ms": 412.3, ...}
+    {"type": "summary", "items": 2, "ok": 2, "failed": 0, "coalesced": 0,
+     "throughput_per_s": 3.1, "latency_ms": {"p50": ..., "p90": ..., "p95": ..., "p99": ..., "max": ...}}
+
+``POST /api/chat/batch`` streams exactly these lines as NDJSON; the CLI runs
+the same thing in-process (or against a server with ``--url``)::
+
+    python -m agent.batch prompts.jsonl -o results.ndjson --summary summary.json
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from agent import context
+from agent.graph import _pipeline_key, run_agent_pipeline
+from agent.llm import gateway
+from config import BATCH_CONCURRENCY, BATCH_MAX_ITEMS
+from db import tenants
+
+
+class BatchError(ValueError):
+    """The batch input as a whole is unusable (empty, too large)."""
+
+
+def parse_items(lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """Parse JSONL into items; a bad line becomes an item carrying ``error``."""
+    items: List[Dict[str, Any]] = []
+    for n, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+            if isinstance(data, str):
+                data = {"message": data}
+            message = str(data.get("message") or data.get("prompt") or "").strip()
+            item = {"id": str(data.get("id", n)), "message": message, "budget_seconds": data.get("budget_seconds")}
+            if not message:
+                item["error"] = "missing 'message'"
+        except (ValueError, AttributeError) as exc:
+            item = {"id": str(n), "message": "", "error": f"invalid JSON line: {exc}"}
+        items.append(item)
+    if not items:
+        raise BatchError("batch is empty")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise BatchError(f"batch has {len(items)} items; the limit is {BATCH_MAX_ITEMS}")
+    return items
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(results: List[Dict[str, Any]], wall_seconds: float, llm_calls: int) -> Dict[str, Any]:
+    latencies = sorted(r["latency_ms"] for r in results if r["ok"] and not r.get("coalesced_from"))
+    return {
+        "type": "summary",
+        "items": len(results),
+        "ok": sum(r["ok"] for r in results),
+        "failed": sum(not r["ok"] for r in results),
+        "coalesced": sum(bool(r.get("coalesced_from")) for r in results),
+        "degraded": sum(bool(r.get("degradations")) for r in results),
+        "llm_calls": llm_calls,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_s": round(len(results) / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_ms": {
+            "p50": _percentile(latencies, 0.50),
+            "p90": _percentile(latencies, 0.90),
+            "p95": _percentile(latencies, 0.95),
+            "p99": _percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else 0.0,
+        },
+    }
+
+
+async def run_batch(items: List[Dict[str, Any]], concurrency: int = BATCH_CONCURRENCY,
+                    session_id: str = "", budget_seconds: Optional[float] = None,
+                    tenant_id: str = "") -> AsyncIterator[Dict[str, Any]]:
+    """Run *items* (from :func:`parse_items`), yielding results as they finish, then the summary.
+
+    All items run under one session, *session_id* (default ``batch-<id>``), so
+    side-effect tools stay idempotent across duplicates.  That session is
+    exempt from ``USAGE_SESSION_TOKEN_BUDGET`` (one batch would otherwise spend
+    it within a few items); the global token budget still applies.  *budget_seconds*
+    is the default per-item budget; an item's own ``budget_seconds`` wins.
+    Every item reads *tenant_id*'s database.
+    """
+    session_id = session_id or f"batch-{context.new_request_id()}"
+    gate = asyncio.Semaphore(max(1, concurrency))
+    runs: Dict[str, asyncio.Task] = {}  # pipeline key -> first item's run
+    owners: Dict[str, str] = {}  # pipeline key -> first item's id
+    done: asyncio.Queue = asyncio.Queue()
+    calls_before = gateway.stats()["calls"]
+
+    async def pipeline(item: Dict[str, Any]):
+        async with gate:
+            t0 = time.perf_counter()
+            budget = item.get("budget_seconds")
+            state = await run_agent_pipeline(
+                user_message=item["message"],
+                session_id=session_id,
+                budget_seconds=budget_seconds if budget is None else float(budget),
+                tenant_id=tenant_id,
+                session_budget=False,
+            )
+            return state, (time.perf_counter() - t0) * 1000
+
+    async def one(index: int, item: Dict[str, Any]) -> None:
+        result: Dict[str, Any] = {"type": "item", "id": item["id"], "index": index, "message": item["message"]}
+        t0 = time.perf_counter()
+        try:
+            if item.get("error"):
+                raise BatchError(item["error"])
+            key = _pipeline_key(item["message"], tenant_id)
+            if key in runs:
+                result["coalesced_from"] = owners[key]
+            else:
+                runs[key] = asyncio.ensure_future(pipeline(item))
+                owners[key] = item["id"]
+            state, run_ms = await asyncio.shield(runs[key])
+            result.update(
+                ok=True,
+                agent_response=state.agent_response,
+                intent=state.intent,
+                sql_used=state.sql_used,
+                had_retry=state.had_retry,
+                degradations=state.degradations,
+                request_id=state.request_id,
+                latency_ms=round((time.perf_counter() - t0) * 1000 if "coalesced_from" in result else run_ms, 1),
+            )
+        except Exception as exc:
+            result.update(ok=False, error=str(exc), latency_ms=round((time.perf_counter() - t0) * 1000, 1))
+        await done.put(result)
+
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(one(i, item)) for i, item in enumerate(items)]
+    results: List[Dict[str, Any]] = []
+    try:
+        for _ in tasks:
+            result = await done.get()
+            results.append(result)
+            yield result
+    finally:
+        for task in tasks + list(runs.values()):
+            task.cancel()  # client went away: stop the rest
+    yield summarize(results, time.perf_counter() - started, gateway.stats()["calls"] - calls_before)
+
+
+# ── CLI ───────────────────────────────────────────────────────────
+
+async def _run_remote(url: str, body: bytes, concurrency: int, budget: Optional[float],
+                      tenant_id: str) -> AsyncIterator[Dict[str, Any]]:
+    import httpx
+
+    params: Dict[str, Any] = {"concurrency": concurrency}
+    if tenant_id:
+        params["tenant_id"] = tenant_id
+    if budget is not None:
+        params["budget_seconds"] = budget
+    async with httpx.AsyncClient(timeout=None) as client:
+        async with client.stream("POST", url.rstrip("/") + "/api/chat/batch", content=body, params=params,
+                                 headers={"Content-Type": "application/x-ndjson"}) as resp:
+            if resp.status_code != 200:
+                raise SystemExit(f"{resp.status_code}: {(await resp.aread()).decode()}")
+            async for line in resp.aiter_lines():
+                if line.strip():
+                    yield json.loads(line)
+
+
+async def _main(args: Any) -> int:
+    import sys
+
+    with open(args.input, "rb") as f:
+        body = f.read()
+    if args.url:
+        lines = _run_remote(args.url, body, args.concurrency, args.budget, args.tenant)
+    else:
+        try:
+            items = parse_items(body.decode().splitlines())
+        except BatchError as exc:
+            raise SystemExit(str(exc))
+        try:
+            tenants.registry.get(args.tenant)
+        except tenants.UnknownTenant as exc:
+            raise SystemExit(str(exc))
+        lines = run_batch(items, args.concurrency, budget_seconds=args.budget, tenant_id=args.tenant)
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    summary: Dict[str, Any] = {}
+    try:
+        async for line in lines:
+            if line.get("type") == "summary":
+                summary = line
+                continue
+            out.write(json.dumps(line, ensure_ascii=False) + "\n")
+            out.flush()
+            if args.out and not line["ok"]:
+                print(f"item {line['id']}: {line.get('error')}", file=sys.stderr)
+    finally:
+        if args.out:
+            out.close()
+
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    lat = summary.get("latency_ms", {})
+    print(f"{summary.get('items', 0)} items  {summary.get('ok', 0)} ok  {summary.get('failed', 0)} failed  "
+          f"{summary.get('coalesced', 0)} coalesced  {summary.get('llm_calls', 0)} LLM calls  "
+          f"{summary.get('wall_seconds', 0)} s  {summary.get('throughput_per_s', 0)} items/s", file=sys.stderr)
+    print(f"latency p50 {lat.get('p50', 0)} ms  p95 {lat.get('p95', 0)} ms  p99 {lat.get('p99', 0)} ms  "
+          f"max {lat.get('max', 0)} ms", file=sys.stderr)
+    return 1 if summary.get("failed") else 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a JSONL file of prompts through the copilot.")
+    parser.add_argument("input", help="JSONL: one {\"id\", \"message\"} object per line")
+    parser.add_argument("-o", "--out", help="write per-item NDJSON results here (default stdout)")
+    parser.add_argument("--summary", help="write the summary JSON here")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--budget", type=float, default=None, help="per-item time budget in seconds")
+    parser.add_argument("--tenant", default="", help="tenant whose CRM database to query (default: the main one)")
+    parser.add_argument("--url", help="run against a server (e.g. http://127.0.0.1:8000) instead of in-process")
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
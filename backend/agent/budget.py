@@ -0,0 +1,50 @@
+"""Per-request time budget and the degradation ladder.
+
+``run_agent_pipeline`` gives every request ``REQUEST_BUDGET_SECONDS`` (or the
+caller's own budget) as a deadline in ``agent.context``.  Gemini calls use it
+as their timeout cap and SQL statements are interrupted when it passes.  As
+the budget runs low the pipeline gives things up in a fixed order:
+
+1. ``no_retry`` — less than ``RETRY_MIN_SECONDS`` left: a failed step is not
+   re-planned.
+2. ``local_response`` — less than ``RESPONSE_LLM_MIN_SECONDS`` left (or the
+   response call ran out of time): the reply is rendered locally
+   (``agent.renderer``) instead of by Gemini.
+3. ``partial_results`` — the deadline passed during planning or execution:
+   remaining tool calls are skipped and the reply covers what did run.
+
+Applied degradations are recorded on the state and on every event emitted
+after them.
+"""
+from __future__ import annotations
+
+import time
+from typing import Optional
+
+from agent.context import deadline
+from config import RESPONSE_LLM_MIN_SECONDS, RETRY_MIN_SECONDS
+
+NO_RETRY = "no_retry"
+LOCAL_RESPONSE = "local_response"
+PARTIAL_RESULTS = "partial_results"
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request; ``None`` without a deadline."""
+    expires = deadline()
+    return None if expires is None else expires - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def allows_retry() -> bool:
+    left = remaining()
+    return left is None or left >= RETRY_MIN_SECONDS
+
+
+def allows_llm_response() -> bool:
+    left = remaining()
+    return left is None or left >= RESPONSE_LLM_MIN_SECONDS
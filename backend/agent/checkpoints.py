@@ -0,0 +1,101 @@
+"""Pipeline checkpoints — resume a run without redoing finished LLM calls.
+
+After every node ``agent.graph`` saves the whole :class:`AgentState` plus
+the name of the node to run next to the ``checkpoint`` table in
+``AGENT_STORE_PATH``, keyed by request id.  If the worker restarts or the
+WebSocket drops mid-run, a client that reconnects with the request id
+(``{"resume": "<request_id>"}``) gets the events so far replayed, and the
+run continues from the next node with the same session and request id —
+the intent and tool-selection answers already paid for are reused.  Tools
+re-run on resume are still de-duplicated by the delivery outbox, whose
+idempotency key includes the request id.
+
+Finished runs keep their final state for ``CHECKPOINT_TTL_SECONDS`` so a
+late reconnect can still fetch the answer.
+"""
+from __future__ import annotations
+
+import dataclasses
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from agent.state import AgentState, StepEvent
+from config import AGENT_STORE_PATH, CHECKPOINT_TTL_SECONDS
+
+DONE = "done"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoint (
+    request_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    next_step TEXT NOT NULL,        -- node to run next, or 'done'
+    state TEXT NOT NULL,            -- AgentState as JSON
+    steps INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS checkpoint_updated ON checkpoint (updated);
+"""
+
+
+@dataclass
+class Checkpoint:
+    request_id: str
+    session_id: str
+    next_step: str
+    state: AgentState
+    steps: int
+    updated: float
+
+    @property
+    def done(self) -> bool:
+        return self.next_step == DONE
+
+
+def _conn() -> sqlite3.Connection:
+    AGENT_STORE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(AGENT_STORE_PATH, timeout=5)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def dump_state(state: AgentState) -> str:
+    return json.dumps(dataclasses.asdict(state), ensure_ascii=False, default=str)
+
+
+def load_state(raw: str) -> AgentState:
+    data: Dict[str, Any] = json.loads(raw)
+    fields = {f.name for f in dataclasses.fields(AgentState)}
+    data = {k: v for k, v in data.items() if k in fields}  # tolerate checkpoints from older versions
+    data["events"] = [StepEvent(**e) for e in data.get("events", [])]
+    return AgentState(**data)
+
+
+def save(state: AgentState, next_step: str) -> None:
+    now = time.time()
+    with _conn() as conn:
+        conn.execute(
+            "INSERT INTO checkpoint (request_id, session_id, next_step, state, steps, created, updated) "
+            "VALUES (?, ?, ?, ?, 1, ?, ?) "
+            "ON CONFLICT(request_id) DO UPDATE SET next_step = excluded.next_step, state = excluded.state, "
+            "steps = steps + 1, updated = excluded.updated",
+            (state.request_id, state.session_id, next_step, dump_state(state), now, now),
+        )
+        if next_step == DONE:
+            conn.execute("DELETE FROM checkpoint WHERE updated < ?", (now - CHECKPOINT_TTL_SECONDS,))
+
+
+def load(request_id: str) -> Optional[Checkpoint]:
+    with _conn() as conn:
+        row = conn.execute(
+            "SELECT request_id, session_id, next_step, state, steps, updated FROM checkpoint "
+            "WHERE request_id = ? AND updated >= ?",
+            (request_id, time.time() - CHECKPOINT_TTL_SECONDS),
+        ).fetchone()
+    if row is None:
+        return None
+    return Checkpoint(row[0], row[1], row[2], load_state(row[3]), row[4], row[5])
+
@@ -0,0 +1,51 @@
+"""Per-request context visible to tools without threading it through calls.
+
+``run_agent_pipeline`` sets these at the start of every request; tools that
+record side effects (e.g. the delivery outbox) read them to tag what they
+create with the session and request that caused it.  The request's
+deadline (see ``agent.budget``) travels the same way, down to Gemini calls
+and SQL statements, and so does the tenant whose CRM database the tools
+read (see ``db.tenants``).
+"""
+from __future__ import annotations
+
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional, Tuple
+
+session_id_var: ContextVar[str] = ContextVar("session_id", default="")
+request_id_var: ContextVar[str] = ContextVar("request_id", default="")
+deadline_var: ContextVar[Optional[float]] = ContextVar("deadline", default=None)  # time.monotonic()
+tenant_id_var: ContextVar[str] = ContextVar("tenant_id", default="")  # "" = default tenant
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def bind(session_id: str, request_id: str) -> None:
+    session_id_var.set(session_id)
+    request_id_var.set(request_id)
+
+
+def current() -> Tuple[str, str]:
+    """``(session_id, request_id)`` of the request being processed."""
+    return session_id_var.get(), request_id_var.get()
+
+
+def set_deadline(budget_seconds: float) -> None:
+    """Give the current request *budget_seconds* from now (``<= 0``: no deadline)."""
+    deadline_var.set(time.monotonic() + budget_seconds if budget_seconds > 0 else None)
+
+
+def deadline() -> Optional[float]:
+    return deadline_var.get()
+
+
+def set_tenant(tenant_id: str) -> None:
+    tenant_id_var.set(tenant_id)
+
+
+def tenant_id() -> str:
+    return tenant_id_var.get()
@@ -0,0 +1,192 @@
+"""Verified question → SQL examples for few-shot tool planning.
+
+Every request whose ``query_database`` call validated and executed on the
+first attempt is stored as a (user message, final SQL) pair.  When planning
+a new request, the ``FEW_SHOT_K`` most similar stored questions (hashed
+n-gram cosine, see :mod:`db.vectors`) are added to the planner prompt so it
+reuses column names that are known to work instead of guessing.
+
+Examples are kept per tenant (``db.tenants``): a question is only ever
+shown examples verified against the same tenant's database.
+
+Each pipeline run is also logged with its retry count and LLM call count,
+split by whether examples were injected, so the effect on retries can be
+compared (``GET /api/metrics/retries``).
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from agent import context
+from agent.state import AgentState
+from config import AGENT_STORE_PATH, FEW_SHOT_K
+from db.tenants import DEFAULT_TENANT
+from db.vectors import HashingVectorizer
+
+EXAMPLE_DIM = 512
+MIN_SIMILARITY = 0.35
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sql_example (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    tenant_id TEXT NOT NULL DEFAULT 'default',
+    message TEXT NOT NULL,
+    sql TEXT NOT NULL,
+    UNIQUE (tenant_id, message, sql)
+);
+CREATE TABLE IF NOT EXISTS pipeline_run (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    session_id TEXT,
+    retry_count INTEGER NOT NULL,
+    llm_calls INTEGER NOT NULL,
+    few_shot INTEGER NOT NULL,
+    success INTEGER NOT NULL
+);
+"""
+
+# Stores created before examples were kept per tenant: their rows belong to the default tenant.
+_MIGRATE = """
+ALTER TABLE sql_example RENAME TO sql_example_untenanted;
+{create}
+INSERT INTO sql_example (id, ts, message, sql) SELECT id, ts, message, sql FROM sql_example_untenanted;
+DROP TABLE sql_example_untenanted;
+"""
+
+
+def _tenant(tenant_id: Optional[str]) -> str:
+    """*tenant_id*, or the current request's, with "" spelled as the default tenant."""
+    if tenant_id is None:
+        tenant_id = context.tenant_id()
+    return tenant_id or DEFAULT_TENANT
+
+
+class ExampleStore:
+    """SQLite-backed example store with an in-memory similarity matrix per tenant."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._vectorizer = HashingVectorizer(EXAMPLE_DIM)
+        self._tenants: Dict[str, Tuple[List[Tuple[str, str]], np.ndarray]] = {}
+        self._migrated = False
+
+    def _conn(self) -> sqlite3.Connection:
+        AGENT_STORE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(AGENT_STORE_PATH, timeout=5)
+        conn.executescript(_SCHEMA)
+        if not self._migrated:
+            cols = {r[1] for r in conn.execute("PRAGMA table_info(sql_example)")}
+            if "tenant_id" not in cols:
+                create = _SCHEMA.split(";")[0] + ";"
+                conn.executescript(_MIGRATE.format(create=create))
+            self._migrated = True
+        return conn
+
+    def _load(self, tenant_id: str) -> Tuple[List[Tuple[str, str]], np.ndarray]:
+        if tenant_id not in self._tenants:
+            with self._conn() as conn:
+                rows = conn.execute(
+                    "SELECT message, sql FROM sql_example WHERE tenant_id = ? ORDER BY id", (tenant_id,)
+                ).fetchall()
+            matrix = (self._vectorizer.transform([m for m, _ in rows]) if rows
+                      else np.zeros((0, EXAMPLE_DIM), dtype=np.float32))
+            self._tenants[tenant_id] = ([(m, s) for m, s in rows], matrix)
+        return self._tenants[tenant_id]
+
+    def add(self, message: str, sql: str, tenant_id: Optional[str] = None) -> None:
+        tenant_id = _tenant(tenant_id)
+        with self._lock:
+            examples, matrix = self._load(tenant_id)
+            if (message, sql) in examples:
+                return
+            with self._conn() as conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO sql_example (ts, tenant_id, message, sql) VALUES (?, ?, ?, ?)",
+                    (time.time(), tenant_id, message, sql),
+                )
+            self._tenants[tenant_id] = (
+                examples + [(message, sql)],
+                np.vstack([matrix, self._vectorizer.transform([message])]),
+            )
+
+    def nearest(self, message: str, k: int = FEW_SHOT_K, tenant_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Up to *k* of the tenant's stored examples most similar to *message*."""
+        if k <= 0:
+            return []
+        with self._lock:
+            examples, matrix = self._load(_tenant(tenant_id))
+            if not examples:
+                return []
+            scores = matrix @ self._vectorizer.transform([message])[0]
+        top = np.argsort(-scores)[:k]
+        return [
+            {"message": examples[i][0], "sql": examples[i][1], "similarity": round(float(scores[i]), 3)}
+            for i in top
+            if scores[i] >= MIN_SIMILARITY
+        ]
+
+    # ── run tracking ──
+
+    def record_run(self, state: AgentState) -> None:
+        """Log the run; store its SQL as an example if it worked first time.
+
+        Runs answered by the fast path or a plan template are skipped: they
+        make no planner call, so they would skew the with/without-examples
+        comparison, and their SQL is not worth showing the planner.
+        """
+        if state.fast_path or state.plan_template_id is not None:
+            return
+        ok = bool(state.tool_results) and all(
+            r.get("result", {}).get("success", False) for r in state.tool_results
+        )
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO pipeline_run (ts, session_id, retry_count, llm_calls, few_shot, success) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (time.time(), state.session_id, state.retry_count, state.llm_calls,
+                 1 if state.few_shot_examples else 0, 1 if ok else 0),
+            )
+        if ok and not state.had_retry:
+            for r in state.tool_results:
+                sql = r.get("result", {}).get("sql")
+                if r.get("tool") == "query_database" and sql:
+                    self.add(state.user_message, sql, state.tenant_id)
+
+    def retry_stats(self) -> Dict[str, Any]:
+        """Retry rate and LLM calls per request, with vs without few-shot examples."""
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT few_shot, COUNT(*), AVG(retry_count > 0), AVG(llm_calls), AVG(success) "
+                "FROM pipeline_run GROUP BY few_shot"
+            ).fetchall()
+            stored = conn.execute("SELECT COUNT(*) FROM sql_example").fetchone()[0]
+        groups = {
+            ("with_examples" if few_shot else "without_examples"): {
+                "runs": n,
+                "retry_rate": round(retry_rate, 3),
+                "llm_calls_per_request": round(llm_calls, 2),
+                "success_rate": round(success, 3),
+            }
+            for few_shot, n, retry_rate, llm_calls, success in rows
+        }
+        return {"stored_examples": stored, **groups}
+
+
+example_store = ExampleStore()
+
+
+def few_shot_block(examples: List[Dict[str, Any]]) -> str:
+    """Format examples for the planner prompt."""
+    if not examples:
+        return ""
+    lines = ["Verified examples (similar questions and SQL that executed successfully):"]
+    for ex in examples:
+        lines.append(f"  Q: {ex['message']}")
+        lines.append(f"  SQL: {ex['sql']}")
+    return "\n".join(lines)
@@ -0,0 +1,292 @@
+"""Rule-based fast path — answers trivial lookups without any LLM call.
+
+A small compiled grammar (English and Thai) recognises four shapes:
+
+* list tables            "list tables", "มีตารางอะไรบ้าง"
+* columns of one table   "schema of Account", "โครงสร้างตาราง Case"
+* counts                 "how many open cases", "มีเคสที่เปิดอยู่กี่เคส"
+* latest / top-N rows    "latest 5 Escalated cases", "top 10 orders by EffectiveDate",
+                         "เคสล่าสุด 5 รายการ"
+
+Table nouns, qualifiers (``open`` / ``closed`` / an exact ``Status`` value)
+and columns are resolved against the live schema; anything the grammar or
+the schema cannot resolve unambiguously returns ``None`` and the request goes
+through the normal LLM pipeline.  A resolved plan still runs through
+``validation_node`` and ``execution_node``; the reply is rendered locally.
+"""
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agent.renderer import is_thai
+from config import MAX_ROWS, SCHEMA_CACHE_SECONDS
+from db import tenants
+from mcp.tools.database import schema_catalog
+
+_DEFAULT_N = 10
+
+# Polite / filler words stripped before matching.
+_EN_PREFIX_RE = re.compile(r"^(?:please |can you |could you |pls )?(?:show me |tell me |give me |show |list |get |display )?")
+_TH_PREFIX_RE = re.compile(r"^(?:ช่วย)?(?:ขอดู|ขอ|แสดง|บอก|ดู)?(?:ให้)?")
+_TH_SUFFIX_RE = re.compile(r"(?:ให้หน่อย|หน่อย)?(?:ครับ|ค่ะ|คะ|นะ)*$")
+
+_EN_ALIASES = {"customer": "Account", "customers": "Account", "accounts": "Account"}
+_TH_TABLES = {
+    "เคส": "Case", "ลูกค้า": "Account", "บัญชี": "Account", "คำสั่งซื้อ": "Order",
+    "ออเดอร์": "Order", "ผู้ใช้": "User", "พนักงาน": "User", "รายการสินค้า": "OrderItem",
+}
+_TH_QUALIFIERS = {
+    "ที่เปิดอยู่": "open", "เปิดอยู่": "open", "ที่ค้างอยู่": "open", "ค้างอยู่": "open", "ค้าง": "open",
+    "ที่ปิดแล้ว": "closed", "ปิดแล้ว": "closed", "ทั้งหมด": "all",
+}
+_TH_LABELS = {"open": "ที่เปิดอยู่"}
+_CLOSED_STATUS = "Closed"
+
+_TH_NOUN = "|".join(sorted(map(re.escape, _TH_TABLES), key=len, reverse=True))
+_TH_QUAL = "|".join(sorted(map(re.escape, _TH_QUALIFIERS), key=len, reverse=True))
+
+_EN_RULES: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("tables", re.compile(
+        r"(?:(?:all |the )?tables|what tables (?:are there|do we have|exist|are available)"
+        r"|which tables (?:are there|do we have|exist))")),
+    ("schema", re.compile(
+        r"(?:(?:the )?(?:schema|columns|fields|structure) (?:of|for|in) (?:the )?(?P<table>\w+)(?: table)?"
+        r"|describe (?:the )?(?P<table2>\w+)(?: table)?)")),
+    ("count", re.compile(
+        r"(?:how many|count(?: of| the)?|number of|total number of) (?:(?P<qual>\w+) )?(?P<table>\w+)"
+        r"(?: are there| do we have| in total| exist)?")),
+    ("latest", re.compile(
+        r"(?:the )?(?:(?P<n>\d+) )?(?:latest|newest|most recent|recent|last) (?:(?P<n2>\d+) )?"
+        r"(?:(?P<qual>\w+) )?(?P<table>\w+)")),
+    ("top", re.compile(
+        r"(?:the )?top (?P<n>\d+) (?:(?P<qual>\w+) )?(?P<table>\w+) by (?P<col>\w+)")),
+]
+_TH_RULES: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("tables", re.compile(r"(?:มี)?ตาราง(?:อะไรบ้าง|ทั้งหมด)(?:มีอะไรบ้าง)?")),
+    ("schema", re.compile(
+        r"(?:โครงสร้าง|คอลัมน์|ฟิลด์)(?:ของ)?(?:ตาราง)?(?P<table>[A-Za-z]\w*|" + _TH_NOUN + r")")),
+    ("count", re.compile(
+        r"(?:มี|จำนวน)?(?P<table>" + _TH_NOUN + r")(?P<qual>" + _TH_QUAL + r"|[A-Za-z]\w*)?"
+        r"(?:ทั้งหมด)?(?:มี)?กี่(?:เคส|รายการ|ราย|คน|อัน)?")),
+    ("count", re.compile(
+        r"จำนวน(?P<table>" + _TH_NOUN + r")(?P<qual>" + _TH_QUAL + r"|[A-Za-z]\w*)?")),
+    ("latest", re.compile(
+        r"(?P<table>" + _TH_NOUN + r")(?P<qual>" + _TH_QUAL + r"|[A-Za-z]\w*)?ล่าสุด"
+        r"(?P<n>\d+)?(?:รายการ|อัน|เคส|คน)?")),
+]
+
+
+@dataclass
+class FastPlan:
+    """A resolved fast-path request."""
+    rule: str
+    intent: str
+    detail: str
+    tool_calls: List[Dict[str, Any]]
+    render: Callable[[Dict[str, Any], bool], str]
+    thai: bool = False
+
+
+@dataclass
+class _Catalog:
+    schema: Dict[str, List[str]] = field(default_factory=dict)
+    statuses: Dict[str, List[str]] = field(default_factory=dict)
+    loaded: float = 0.0
+
+
+_lock = threading.Lock()
+_stats: Dict[str, Any] = {"requests": 0, "hits": 0, "fallbacks": 0, "rules": {}}
+
+
+# ── Catalog ───────────────────────────────────────────────────────
+
+def _get_catalog() -> _Catalog:
+    """The current tenant's tables and status values (kept in ``Tenant.caches``)."""
+    tenant = tenants.current()
+    with tenant.lock:
+        catalog = tenant.caches.get("fast_path")
+        if catalog is not None and time.monotonic() - catalog.loaded < SCHEMA_CACHE_SECONDS:
+            return catalog
+    schema = {
+        t: cols for t, cols in schema_catalog()["schema"].items() if not t.startswith("agg_")
+    }
+    statuses: Dict[str, List[str]] = {}
+    with tenant.pool.connection() as conn:
+        for table, cols in schema.items():
+            if "Status" in cols:
+                statuses[table] = [
+                    r[0] for r in conn.execute(
+                        f'SELECT DISTINCT Status FROM "{table}" WHERE Status IS NOT NULL LIMIT 50'
+                    )
+                ]
+    catalog = _Catalog(schema, statuses, time.monotonic())
+    with tenant.lock:
+        tenant.caches["fast_path"] = catalog
+    return catalog
+
+
+def _resolve_table(word: Optional[str], catalog: _Catalog) -> Optional[str]:
+    if not word:
+        return None
+    if word in _TH_TABLES:
+        table = _TH_TABLES[word]
+        return table if table in catalog.schema else None
+    w = word.lower()
+    if w in _EN_ALIASES and _EN_ALIASES[w] in catalog.schema:
+        return _EN_ALIASES[w]
+    for table in catalog.schema:
+        t = table.lower()
+        if w in (t, t + "s", t + "es"):
+            return table
+    return None
+
+
+def _resolve_qualifier(qual: Optional[str], table: str, catalog: _Catalog) -> Optional[Tuple[str, str]]:
+    """``(where_clause, label)``; ``("", "")`` for no filter, ``None`` if unresolvable."""
+    if not qual:
+        return "", ""
+    key = _TH_QUALIFIERS.get(qual, qual.lower())
+    if key == "all":
+        return "", ""
+    values = catalog.statuses.get(table)
+    if not values:
+        return None
+    if key == "open" and _CLOSED_STATUS in values:
+        return f"Status <> '{_CLOSED_STATUS}'", "open"
+    if key == "closed" and _CLOSED_STATUS in values:
+        return f"Status = '{_CLOSED_STATUS}'", _CLOSED_STATUS
+    matches = [v for v in values if str(v).lower() == key]
+    if len(matches) == 1:
+        value = str(matches[0]).replace("'", "''")
+        return f"Status = '{value}'", str(matches[0])
+    return None
+
+
+def _date_column(cols: List[str]) -> Optional[str]:
+    if "CreatedDate" in cols:
+        return "CreatedDate"
+    dates = [c for c in cols if c.endswith("Date")]
+    return dates[0] if len(dates) == 1 else None
+
+
+# ── Plans ─────────────────────────────────────────────────────────
+
+def _query_plan(rule: str, sql: str, detail: str, render) -> FastPlan:
+    return FastPlan(rule, "query_data", detail, [{"name": "query_database", "arguments": {"sql": sql}}], render)
+
+
+def _build(rule: str, groups: Dict[str, Optional[str]], catalog: _Catalog) -> Optional[FastPlan]:
+    if rule == "tables":
+        def render(result: Dict[str, Any], thai: bool) -> str:
+            tables = [t for t in result.get("schema", {}) if not t.startswith("agg_")]
+            if thai:
+                return f"ฐานข้อมูลมี {len(tables)} ตาราง: {', '.join(tables)}"
+            return f"The database has {len(tables)} tables: {', '.join(tables)}."
+        return FastPlan(rule, "query_data", "List database tables",
+                        [{"name": "get_schema", "arguments": {}}], render)
+
+    table = _resolve_table(groups.get("table") or groups.get("table2"), catalog)
+    if table is None:
+        return None
+
+    if rule == "schema":
+        def render(result: Dict[str, Any], thai: bool) -> str:
+            cols = result.get("schema", {}).get(table, [])
+            if thai:
+                return f"ตาราง {table} มี {len(cols)} คอลัมน์: {', '.join(cols)}"
+            return f"Table {table} has {len(cols)} columns: {', '.join(cols)}."
+        return FastPlan(rule, "query_data", f"Describe table {table}",
+                        [{"name": "get_schema", "arguments": {}}], render)
+
+    qualifier = _resolve_qualifier(groups.get("qual"), table, catalog)
+    if qualifier is None:
+        return None
+    where, label = qualifier
+    where_sql = f" WHERE {where}" if where else ""
+    subject = f"{label} {table}".strip()
+    subject_th = f"{table} {_TH_LABELS.get(label, label)}".strip()
+
+    if rule == "count":
+        sql = f'SELECT COUNT(*) AS count FROM "{table}"{where_sql}'
+
+        def render(result: Dict[str, Any], thai: bool) -> str:
+            n = (result.get("rows") or [{}])[0].get("count", 0)
+            if thai:
+                return f"มี {subject_th} ทั้งหมด {n:,} รายการ"
+            return f"There are {n:,} {subject} records."
+        return _query_plan(rule, sql, f"Count {subject} records", render)
+
+    n = int(groups.get("n") or groups.get("n2") or _DEFAULT_N)
+    if not 1 <= n <= MAX_ROWS:
+        return None
+    if rule == "top":
+        col = next((c for c in catalog.schema[table] if c.lower() == (groups.get("col") or "").lower()), None)
+    else:
+        col = _date_column(catalog.schema[table])
+    if col is None:
+        return None
+    sql = f'SELECT * FROM "{table}"{where_sql} ORDER BY "{col}" DESC LIMIT {n}'
+    ranking = f"by {col}" if rule == "top" else f"most recent by {col}"
+
+    def render(result: Dict[str, Any], thai: bool) -> str:
+        count = result.get("row_count", 0)
+        if thai:
+            return f"แสดง {subject_th} {count} รายการ เรียงตาม {col} จากมากไปน้อย"
+        return f"Here are {count} {subject} records, {ranking}."
+    return _query_plan(rule, sql, f"Top {n} {subject} records {ranking}", render)
+
+
+def _normalise(message: str) -> Tuple[str, bool]:
+    thai = is_thai(message)
+    text = message.strip().rstrip("?!.").strip()
+    if thai:
+        text = _TH_SUFFIX_RE.sub("", _TH_PREFIX_RE.sub("", re.sub(r"\s+", "", text)))
+    else:
+        text = _EN_PREFIX_RE.sub("", re.sub(r"\s+", " ", text.lower()))
+    return text, thai
+
+
+def route(message: str) -> Optional[FastPlan]:
+    """Resolve *message* to a :class:`FastPlan`, or ``None`` to use the LLM."""
+    with _lock:
+        _stats["requests"] += 1
+    text, thai = _normalise(message)
+    for rule, pattern in (_TH_RULES if thai else _EN_RULES):
+        m = pattern.fullmatch(text)
+        if not m:
+            continue
+        try:
+            plan = _build(rule, m.groupdict(), _get_catalog())
+        except sqlite3.Error:
+            return None
+        if plan is not None:
+            plan.thai = thai
+            return plan
+    return None
+
+
+def record(plan: FastPlan, answered: bool) -> None:
+    """Count a fast-path hit, or a fallback when execution did not succeed."""
+    with _lock:
+        if answered:
+            _stats["hits"] += 1
+            _stats["rules"][plan.rule] = _stats["rules"].get(plan.rule, 0) + 1
+        else:
+            _stats["fallbacks"] += 1
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        requests = _stats["requests"]
+        return {
+            "requests": requests,
+            "hits": _stats["hits"],
+            "fallbacks": _stats["fallbacks"],
+            "hit_rate": round(_stats["hits"] / requests, 3) if requests else 0.0,
+            "hits_by_rule": dict(_stats["rules"]),
+        }
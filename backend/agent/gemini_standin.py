@@ -0,0 +1,164 @@
+"""Local stand-in for the Gemini ``generateContent`` REST endpoint.
+
+Answers every request with a canned text after an injectable delay, and can
+be told to fail or stall the next N calls — enough to exercise the retry,
+hedging, circuit-breaker and fallback paths in :mod:`agent.llm` without a
+network or API key::
+
+    python -m agent.gemini_standin --port 8031 --latency 0.2
+    GEMINI_API_KEY=x GEMINI_BASE_URL=http://127.0.0.1:8031  uvicorn main:app
+
+or in-process::
+
+    with GeminiStandIn(latency=0.05) as standin:
+        standin.fail_next(2, 429)
+        ...  # standin.base_url; standin.requests
+"""
+from __future__ import annotations
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+_PATH = re.compile(r"/v1\w*/models/([^:/]+):generateContent")
+
+Responder = Callable[[str, str], str]  # (model, prompt) -> text
+
+
+def _default_responder(model: str, prompt: str) -> str:
+    if "Respond with JSON" in prompt:
+        return json.dumps({"intent": "query_data", "detail": "stand-in", "needs_tools": ["query_database"]})
+    return f"[{model}] stand-in answer"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+
+    def do_POST(self) -> None:  # noqa: N802
+        standin: GeminiStandIn = self.server.standin  # type: ignore[attr-defined]
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        match = _PATH.search(self.path)
+        model = match.group(1) if match else ""
+        prompt = "".join(
+            part.get("text", "")
+            for content in body.get("contents", [])
+            for part in content.get("parts", [])
+        )
+        status, delay = standin._next_outcome(model)
+        time.sleep(delay)
+        if status != 200:
+            self._send(status, {"error": {"code": status, "message": "stand-in failure", "status": "UNAVAILABLE"}})
+            return
+        text = standin.responder(model, prompt)
+        self._send(200, {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "modelVersion": model,
+        })
+
+    def _send(self, status: int, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class GeminiStandIn:
+    """Fake Gemini server on a background thread (port 0 = pick a free port).
+
+    *latency* is the base delay per call; *jitter* adds a uniform random
+    0..jitter on top, and *tail* makes that fraction of calls take
+    *tail_latency* instead (a slow p99 to hedge against).  *fail_rate* is the
+    fraction of calls answered with HTTP 503.
+    """
+
+    def __init__(self, port: int = 0, host: str = "127.0.0.1", latency: float = 0.0,
+                 jitter: float = 0.0, tail: float = 0.0, tail_latency: float = 2.0,
+                 fail_rate: float = 0.0, responder: Optional[Responder] = None):
+        self.http = ThreadingHTTPServer((host, port), _Handler)
+        self.http.daemon_threads = True
+        self.http.standin = self  # type: ignore[attr-defined]
+        self.host = host
+        self.latency, self.jitter, self.tail, self.tail_latency = latency, jitter, tail, tail_latency
+        self.fail_rate = fail_rate
+        self.responder: Responder = responder or _default_responder
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._failures: List[int] = []
+        self._stalls: List[float] = []
+        self._down: set = set()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.http.server_address[1]}"
+
+    def fail_next(self, n: int, status: int = 503) -> None:
+        with self._lock:
+            self._failures.extend([status] * n)
+
+    def stall_next(self, n: int, seconds: float) -> None:
+        with self._lock:
+            self._stalls.extend([seconds] * n)
+
+    def set_down(self, model: str, down: bool = True) -> None:
+        """Make every call for *model* fail with 503 until cleared."""
+        with self._lock:
+            (self._down.add if down else self._down.discard)(model)
+
+    def _next_outcome(self, model: str) -> tuple:
+        with self._lock:
+            self.requests.append({"model": model, "at": time.time()})
+            if model in self._down:
+                return 503, self.latency
+            if self._failures:
+                return self._failures.pop(0), self.latency
+            if self._stalls:
+                return 200, self._stalls.pop(0)
+        if self.fail_rate and random.random() < self.fail_rate:
+            return 503, self.latency
+        if self.tail and random.random() < self.tail:
+            return 200, self.tail_latency
+        return 200, self.latency + random.uniform(0, self.jitter)
+
+    def start(self) -> "GeminiStandIn":
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.http.shutdown()
+        self.http.server_close()
+
+    def __enter__(self) -> "GeminiStandIn":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local Gemini stand-in.")
+    parser.add_argument("--port", type=int, default=8031)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--tail", type=float, default=0.0, help="fraction of calls that are slow")
+    parser.add_argument("--tail-latency", type=float, default=2.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of calls answered 503")
+    args = parser.parse_args()
+
+    with GeminiStandIn(args.port, latency=args.latency, jitter=args.jitter, tail=args.tail,
+                       tail_latency=args.tail_latency, fail_rate=args.fail_rate) as standin:
+        print(f"Gemini stand-in at {standin.base_url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -1,12 +1,30 @@
 """LangGraph state machine for the CRM Copilot agent.
 
 Graph:  intent → tool_selection → validation → [retry?] → execution → response
+
+With ``AGENT_SPECULATIVE_PLANNING=1`` tool selection starts alongside intent
+classification and its plan is adopted unless the intent contradicts it
+(see ``agent.speculation``).
+
+Each arrow is a checkpoint (see ``agent.checkpoints``): the state and the
+next step are saved after every node, so a dropped run can be resumed with
+:func:`resume_agent_pipeline` without repeating its LLM calls.
 """
 from __future__ import annotations
 
-from typing import Any, Dict
+import asyncio
+import copy
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
 
-from agent.state import AgentState
+from agent import budget, checkpoints, context, fast_path, speculation
+from agent.examples import example_store
+from agent.idempotency import SIDE_EFFECT_TOOLS
+from agent.llm import DeadlineExceeded
+from agent.singleflight import EventFlight, make_key, pipeline_stats
+from agent.state import AgentState, StepEvent
+from agent.templates import plan_templates
 from agent.nodes import (
     intent_node,
     tool_selection_node,
@@ -14,6 +32,15 @@ from agent.nodes import (
     execution_node,
     response_node,
 )
+from config import (
+    CHECKPOINTS,
+    COALESCE,
+    FAST_PATH,
+    PLAN_TEMPLATES,
+    REQUEST_BUDGET_SECONDS,
+    SPECULATIVE_PLANNING,
+)
+from session import usage
 
 
 def _should_retry(state: AgentState) -> bool:
@@ -23,12 +50,107 @@ def _should_retry(state: AgentState) -> bool:
         for r in state.tool_results
     ):
         return False
-    return state.retry_count < state.max_retries
+    if state.retry_count >= state.max_retries:
+        return False
+    if not budget.allows_retry():
+        state.degrade(budget.NO_RETRY)
+        return False
+    return True
+
+
+def _begin_retry(state: AgentState) -> None:
+    state.retry_count += 1
+    state.had_retry = True
+    state.add_event("retry", "processing",
+                    f"Retrying (attempt {state.retry_count}/{state.max_retries})…",
+                    {"reason": state.error_message})
+
+
+def _out_of_time(state: AgentState, step: str) -> None:
+    """The deadline passed during an LLM planning step: answer with what we have."""
+    state.degrade(budget.PARTIAL_RESULTS)
+    state.selected_tools = []
+    state.add_event(step, "failed", "Time budget exhausted")
+
+
+def _run_fast_path(plan: fast_path.FastPlan, base: AgentState) -> Optional[AgentState]:
+    """Run a fast-path plan without any LLM call; ``None`` if it did not succeed."""
+    state = AgentState(user_message=base.user_message, session_id=base.session_id,
+                       request_id=base.request_id, tenant_id=base.tenant_id, fast_path=plan.rule,
+                       degradations=list(base.degradations))
+    flag = {"fast_path": plan.rule}
+    state.intent, state.intent_detail = plan.intent, plan.detail
+    state.add_event("intent", "success", plan.detail, {"intent_type": plan.intent, **flag})
+    state.selected_tools = plan.tool_calls
+    state.add_event("tool_selection", "success",
+                    f"Selected: {', '.join(t['name'] for t in plan.tool_calls)}",
+                    {"tools": plan.tool_calls, **flag})
+    state = validation_node(state)
+    if not state.validation_passed:
+        return None
+    state = execution_node(state)
+    if not all(r.get("result", {}).get("success", False) for r in state.tool_results):
+        return None
+    for event in state.events:
+        event.data = {**(event.data or {}), **flag}
+    state.add_event("response", "processing", "Generating response…", flag)
+    state.agent_response = plan.render(state.tool_results[0]["result"], plan.thai)
+    state.add_event("response", "success", "Response generated",
+                    {"response": state.agent_response, **flag})
+    return state
+
+
+def _refuse(state: AgentState) -> None:
+    """Token budget spent and no fast-path answer: reply without calling Gemini."""
+    scope = usage.ledger.exhausted(state.session_id) or "session"
+    state.add_event("intent", "failed", "Token budget used up", {"budget": scope})
+    state.agent_response = usage.ledger.refusal(scope)
+    state.add_event("response", "success", "Response generated", {"response": state.agent_response})
+
+
+def _record(state: AgentState, learn: bool = False) -> None:
+    try:
+        example_store.record_run(state)
+        if learn and PLAN_TEMPLATES and state.plan_template_id is None and not state.skipped_tools:
+            plan_templates.learn(state)
+    except sqlite3.Error:
+        pass  # tracking must never fail a chat
 
 
-async def run_agent_pipeline(user_message: str, session_id: str = "", on_event=None):
+def _streamed(events: List[StepEvent]) -> List[StepEvent]:
+    """The events a client sees: a step's "processing" event is dropped once
+    that step's outcome follows it."""
+    return [
+        e for i, e in enumerate(events)
+        if not (e.status == "processing" and i + 1 < len(events) and events[i + 1].step_name == e.step_name)
+    ]
+
+
+def _pipeline_key(user_message: str, tenant_id: str = "") -> str:
+    return make_key(tenant_id, " ".join(user_message.split()).casefold())
+
+
+def _has_side_effects(event: Dict[str, Any]) -> bool:
+    tools = (event.get("data") or {}).get("tools") or []
+    return any(t.get("name") in SIDE_EFFECT_TOOLS for t in tools)
+
+
+_flights: Dict[str, EventFlight] = {}  # by message, for coalescing
+_running: Dict[str, EventFlight] = {}  # by request id, for resume
+
+
+async def run_agent_pipeline(user_message: str, session_id: str = "", on_event=None,
+                             budget_seconds: Optional[float] = None, request_id: str = "",
+                             tenant_id: str = "", session_budget: bool = True):
     """Execute the full agent pipeline, emitting events for each step.
 
+    Identical messages already being processed are coalesced: the caller
+    waits on the in-flight run and receives its step events as they happen.
+    A run from another session is only shared if its first plan is
+    read-only — if it sends email / Slack / reports, the caller runs its own.
+    That is decided before any event reaches the caller; once events have
+    been streamed the caller stays attached, even if a retry re-plans.
+
     Parameters
     ----------
     user_message : str
@@ -37,76 +159,311 @@ async def run_agent_pipeline(user_message: str, session_id: str = "", on_event=N
         Used for logging/tracking.
     on_event : callable | None
         ``async def on_event(event_dict)`` — called after every step.
+    budget_seconds : float | None
+        Time budget for this request (default ``REQUEST_BUDGET_SECONDS``;
+        ``0`` = none).  See ``agent.budget`` for how the pipeline degrades
+        as it runs out.
+    request_id : str
+        Id for this run (default: a new one).  Callers that may want to
+        resume the run pass their own and hand it to the client.
+    tenant_id : str
+        Whose CRM database the tools read (default: ``DB_PATH``).  Callers
+        validate it first with ``db.tenants.registry.get``.
+    session_budget : bool
+        Whether ``USAGE_SESSION_TOKEN_BUDGET`` applies.  Batch runs pass
+        ``False``: their items share one session, so only the global budget
+        bounds them.
 
     Returns
     -------
     AgentState
         The completed state with all results & events.
+
+    Raises ``session.usage.UsageBudgetExceeded`` when a token budget is
+    spent and ``USAGE_BUDGET_ACTION=reject``; with ``fast_path`` the run
+    skips every Gemini call instead.
     """
-    state = AgentState(user_message=user_message, session_id=session_id)
-
-    async def emit() -> None:
-        if on_event and state.events:
-            await on_event(state.events[-1].to_dict())
-
-    # Step 1: Intent recognition
-    state = intent_node(state)
-    await emit()
-
-    # Retry loop covers tool_selection → validation → execution
-    while True:
-        # Step 2: Tool selection
-        state = tool_selection_node(state)
-        await emit()
-
-        if not state.selected_tools:
-            # No tools → just generate a direct response
-            state.add_event("schema_validation", "skipped", "No tools selected")
-            await emit()
-            state.add_event("execution", "skipped", "No tools to execute")
-            await emit()
-            break
-
-        # Step 3: Schema validation
-        state = validation_node(state)
-        await emit()
-
-        if not state.validation_passed:
-            if _should_retry(state):
-                state.retry_count += 1
-                state.had_retry = True
-                state.add_event("retry", "processing",
-                                f"Retrying (attempt {state.retry_count}/{state.max_retries})…",
-                                {"reason": state.error_message})
-                await emit()
+    if budget_seconds is None:
+        budget_seconds = REQUEST_BUDGET_SECONDS
+    request_id = request_id or context.new_request_id()
+    spent = usage.ledger.admit(session_id, session_budget)  # "" = within budget
+
+    key = _pipeline_key(user_message, tenant_id) if COALESCE else ""
+    flight = _flights.get(key) if key else None
+    if flight is not None:
+        shared = await _follow(flight, session_id, on_event, request_id)
+        if shared is not None:
+            return shared
+        key = ""  # detached: run alone, don't replace the flight being followed
+
+    state = AgentState(user_message=user_message, session_id=session_id, request_id=request_id,
+                       tenant_id=tenant_id)
+    if spent:
+        state.degrade(usage.FAST_PATH_ONLY)
+    return await _lead(state, "start", on_event, budget_seconds, key)
+
+
+async def resume_agent_pipeline(request_id: str, session_id: str, on_event=None,
+                                budget_seconds: Optional[float] = None) -> Optional[AgentState]:
+    """Reattach to run *request_id*, or continue it from its last checkpoint.
+
+    The events emitted so far are replayed through *on_event* first.  A run
+    still in progress in this process is followed rather than restarted;
+    a finished one just returns its final state.  ``None`` if the run is
+    unknown, its checkpoint expired, or it belongs to a session other than
+    *session_id*.
+    """
+    flight, checkpoint = _running.get(request_id), None
+    if flight is None and CHECKPOINTS:
+        checkpoint = await asyncio.to_thread(checkpoints.load, request_id)
+        flight = _running.get(request_id)  # may have been resumed meanwhile
+    if flight is not None:
+        return await _attach(flight, on_event) if flight.session_id == session_id else None
+    if checkpoint is None or checkpoint.session_id != session_id:
+        return None
+    if checkpoint.done:
+        if on_event:
+            for event in _streamed(checkpoint.state.events):
+                await on_event(event.to_dict())
+        return checkpoint.state
+
+    # Claim the run before the first await below, so a second reconnect for
+    # the same run attaches to this one instead of continuing it again.
+    flight = _running[request_id] = EventFlight(session_id)
+    try:
+        for event in _streamed(checkpoint.state.events):
+            await flight.publish(event.to_dict())
+            if on_event:
+                await on_event(event.to_dict())
+    except BaseException as exc:
+        _running.pop(request_id, None)
+        flight.finish(error=exc)
+        raise
+    if budget_seconds is None:
+        budget_seconds = REQUEST_BUDGET_SECONDS
+    return await _lead(checkpoint.state, checkpoint.next_step, on_event, budget_seconds, "", flight)
+
+
+async def _lead(state: AgentState, step: str, on_event, budget_seconds: float, key: str,
+                flight: Optional[EventFlight] = None) -> AgentState:
+    """Run the pipeline, publishing its events for followers / resumers
+    (on *flight* if the caller already registered one)."""
+    request_id = state.request_id
+    if flight is None:
+        flight = _running[request_id] = EventFlight(state.session_id)
+    if key:
+        _flights[key] = flight
+        pipeline_stats.executed += 1
+
+    async def fan_out(event: Dict[str, Any]) -> None:
+        await flight.publish(event)
+        if on_event:
+            await on_event(event)
+
+    try:
+        state = await _run_pipeline(state, step, fan_out, budget_seconds)
+    except BaseException as exc:
+        flight.finish(error=exc)
+        raise
+    finally:
+        _running.pop(request_id, None)
+        if key:
+            _flights.pop(key, None)
+    flight.finish(state)
+    return state
+
+
+async def _attach(flight: EventFlight, on_event) -> AgentState:
+    """Stream all of an in-flight run's events (past and future) and return its result."""
+    queue = flight.subscribe()
+    try:
+        while True:
+            event = await queue.get()
+            if EventFlight.is_done(event):
+                break
+            if on_event:
+                await on_event(event)
+    finally:
+        flight.unsubscribe(queue)
+    return await asyncio.shield(flight.result)
+
+
+async def _follow(flight: EventFlight, session_id: str, on_event, request_id: str) -> Optional[AgentState]:
+    """Mirror an in-flight run; ``None`` if its first plan has side effects for another session.
+
+    Events from another session's run are held back until its first plan is
+    known, so detaching never leaves the caller with a partial stream.  After
+    that the caller stays attached: a later re-plan (on retry) cannot detach
+    it, or the client would get a second, duplicate stream from its own run.
+    """
+    queue = flight.subscribe()
+    same_session = flight.session_id == session_id
+    pending: List[Dict[str, Any]] = []  # held back until the plan is known
+    plan_known = same_session
+    try:
+        while True:
+            event = await queue.get()
+            if EventFlight.is_done(event):
+                break
+            if not plan_known and event["step_name"] == "tool_selection" and event["status"] == "success":
+                if not same_session and _has_side_effects(event):
+                    pipeline_stats.detached += 1
+                    return None
+                plan_known = True
+            if not plan_known:
+                pending.append(event)
                 continue
+            for held in pending + [event]:
+                if on_event:
+                    await on_event(held)
+            pending = []
+    finally:
+        flight.unsubscribe(queue)
+    leader = await asyncio.shield(flight.result)  # re-raises the leader's error
+    for held in pending:
+        if on_event:
+            await on_event(held)
+    pipeline_stats.shared += 1
+    state = copy.deepcopy(leader)
+    state.session_id, state.request_id = session_id, request_id
+    state.coalesced_from = leader.request_id
+    return state
+
+
+async def _run_pipeline(state: AgentState, step: str, on_event, budget_seconds: float) -> AgentState:
+    """Run from *step* (``"start"`` for a new request) to the end."""
+    # Tools tag side effects (e.g. queued deliveries) with this request,
+    # Gemini calls / SQL honour its deadline and SQL reads its tenant's
+    # database; asyncio.to_thread copies the context into the node threads.
+    context.bind(state.session_id, state.request_id)
+    context.set_deadline(budget_seconds)
+    context.set_tenant(state.tenant_id)
+
+    if step == "start":
+        # Trivial lookups (list tables, counts, latest N …) skip the LLM entirely;
+        # with the token budget spent they are all that is answered.
+        tokens_spent = usage.FAST_PATH_ONLY in state.degradations
+        plan = (await asyncio.to_thread(fast_path.route, state.user_message)
+                if FAST_PATH or tokens_spent else None)
+        if plan is not None:
+            fast_state = await asyncio.to_thread(_run_fast_path, plan, state)
+            fast_path.record(plan, answered=fast_state is not None)
+            if fast_state is not None:
+                if on_event:
+                    # same events the LLM pipeline streams: the outcome of each step
+                    for event in fast_state.events:
+                        if event.status != "processing":
+                            await on_event(event.to_dict())
+                return fast_state  # not recorded: see ExampleStore.record_run
+        if tokens_spent:
+            _refuse(state)
+            if on_event:
+                for event in state.events:
+                    await on_event(event.to_dict())
+            return state
+        step = "plan"
+
+    sent = len(state.events)  # a resumed run has replayed its earlier events already
+    speculative: Optional[speculation.Speculation] = None  # plan started alongside the intent call
+    intent_finished = 0.0
+
+    async def advance(next_step: str) -> str:
+        """Checkpoint, then stream the events this step added."""
+        nonlocal sent
+        if CHECKPOINTS:
+            try:
+                await asyncio.to_thread(checkpoints.save, state, next_step)
+            except sqlite3.Error:
+                pass  # checkpointing must never fail a chat
+        batch, sent = state.events[sent:], len(state.events)
+        if on_event:
+            for event in _streamed(batch):
+                await on_event(event.to_dict())
+        return next_step
+
+    while step != checkpoints.DONE:
+        if step == "plan":
+            # A learned plan template replaces intent + tool selection on the
+            # first attempt; retries fall back to the LLM planner.
+            template = None
+            if PLAN_TEMPLATES:
+                try:
+                    template = await asyncio.to_thread(plan_templates.match, state.user_message,
+                                                       state.tenant_id)
+                except sqlite3.Error:
+                    template = None
+            if template:
+                tpl, bound_plan = template
+                state.plan_template_id = tpl.id
+                state.intent = tpl.intent
+                state.intent_detail = f"Matched plan template #{tpl.id}"
+                state.add_event("intent", "success", state.intent_detail,
+                                {"intent_type": tpl.intent, "plan_template": tpl.id})
+                state.selected_tools = bound_plan
+                state.add_event("tool_selection", "success",
+                                f"Selected: {', '.join(t['name'] for t in bound_plan)}",
+                                {"tools": bound_plan, "plan_template": tpl.id})
+                step = await advance("validation")
+            else:
+                if SPECULATIVE_PLANNING:
+                    speculative = speculation.start(state)
+                try:
+                    state = await asyncio.to_thread(intent_node, state)
+                except DeadlineExceeded:
+                    _out_of_time(state, "intent")
+                intent_finished = time.perf_counter()
+                out_of_time = budget.PARTIAL_RESULTS in state.degradations
+                if out_of_time and speculative is not None:
+                    speculative.abandon()
+                    speculative = None
+                step = await advance("response" if out_of_time else "tool_selection")
+
+        elif step == "tool_selection":
+            pending, speculative = speculative, None
+            if pending is None or not await pending.resolve(state, intent_finished):
+                try:
+                    state = await asyncio.to_thread(tool_selection_node, state)
+                except DeadlineExceeded:
+                    _out_of_time(state, "tool_selection")
+            if state.selected_tools:
+                step = await advance("validation")
+            else:
+                if budget.PARTIAL_RESULTS not in state.degradations:
+                    # No tools → just generate a direct response
+                    state.add_event("schema_validation", "skipped", "No tools selected")
+                    state.add_event("execution", "skipped", "No tools to execute")
+                step = await advance("response")
+
+        elif step == "validation":
+            state = await asyncio.to_thread(validation_node, state)
+            if state.validation_passed:
+                step = await advance("execution")
+            elif _should_retry(state):
+                _begin_retry(state)
+                step = await advance("tool_selection")
             else:
                 # Give up → still generate a (failed) response
                 state.add_event("execution", "skipped", "Skipped due to validation failure")
-                await emit()
-                break
+                step = await advance("response")
+
+        elif step == "execution":
+            state = await asyncio.to_thread(execution_node, state)
+            exec_ok = all(
+                r.get("result", {}).get("success", False) for r in state.tool_results
+            )
+            if not exec_ok and _should_retry(state):
+                _begin_retry(state)
+                step = await advance("tool_selection")
+            else:
+                # All good (or exhausted retries)
+                step = await advance("response")
+
+        elif step == "response":
+            state = await asyncio.to_thread(response_node, state)
+            step = await advance(checkpoints.DONE)
 
-        # Step 4: Execution
-        state = execution_node(state)
-        await emit()
-
-        exec_ok = all(
-            r.get("result", {}).get("success", False) for r in state.tool_results
-        )
-        if not exec_ok and _should_retry(state):
-            state.retry_count += 1
-            state.had_retry = True
-            state.add_event("retry", "processing",
-                            f"Retrying (attempt {state.retry_count}/{state.max_retries})…",
-                            {"reason": state.error_message})
-            await emit()
-            continue
-
-        # All good (or exhausted retries)
-        break
-
-    # Step 5: Response generation
-    state = response_node(state)
-    await emit()
+        else:
+            raise ValueError(f"Unknown pipeline step {step!r}")
 
+    await asyncio.to_thread(_record, state, True)
     return state
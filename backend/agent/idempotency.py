@@ -0,0 +1,107 @@
+"""Idempotent execution of side-effecting tools.
+
+A retry re-plans and re-executes the whole tool list, so without this an
+email or Slack post that already succeeded in attempt 1 would be sent again
+in attempt 2.  :func:`wrap` puts a cache in front of the tools in
+``SIDE_EFFECT_TOOLS``: a call whose canonicalised arguments match an earlier
+successful call in the same session — within the same request, or within
+``IDEMPOTENCY_WINDOW_SECONDS`` across requests — returns the earlier result
+(marked ``idempotent_replay``) without executing again.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+
+from agent.context import current
+from config import IDEMPOTENCY_WINDOW_SECONDS
+
+SIDE_EFFECT_TOOLS = frozenset({"send_summary_email", "notify_slack_channel", "generate_report"})
+_MAX_ENTRIES = 2048
+
+ToolFn = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+def canonical_args(args: Dict[str, Any]) -> str:
+    """Argument JSON with sorted keys and whitespace-normalised strings."""
+    def norm(value: Any) -> Any:
+        if isinstance(value, str):
+            return " ".join(value.split())
+        if isinstance(value, dict):
+            return {k: norm(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [norm(v) for v in value]
+        return value
+    return json.dumps(norm(args), sort_keys=True, ensure_ascii=False, default=str)
+
+
+class IdempotencyCache:
+    """Successful side-effect results keyed by (session, tool, canonical args)."""
+
+    def __init__(self, window: float = IDEMPOTENCY_WINDOW_SECONDS):
+        self.window = window
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, str, Dict[str, Any]]] = {}  # key -> (ts, request_id, result)
+        self.executed = 0
+        self.replayed = 0
+
+    @staticmethod
+    def key(session_id: str, tool: str, args: Dict[str, Any]) -> str:
+        raw = f"{session_id}\x1f{tool}\x1f{canonical_args(args)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str, request_id: str) -> Dict[str, Any] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            ts, req, result = entry
+            if (request_id and req == request_id) or time.monotonic() - ts < self.window:
+                self.replayed += 1
+                return result
+            del self._entries[key]
+            return None
+
+    def store(self, key: str, request_id: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self.executed += 1
+            if len(self._entries) >= _MAX_ENTRIES:
+                cutoff = time.monotonic() - self.window
+                self._entries = {k: v for k, v in self._entries.items() if v[0] >= cutoff}
+                while len(self._entries) >= _MAX_ENTRIES:  # still full: drop the oldest
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic(), request_id, result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "window_seconds": self.window,
+                "executed": self.executed,
+                "replayed": self.replayed,
+                "cached": len(self._entries),
+            }
+
+
+cache = IdempotencyCache()
+
+
+def wrap(name: str, fn: ToolFn) -> ToolFn:
+    """Idempotent version of *fn* if *name* has side effects, else *fn*."""
+    if name not in SIDE_EFFECT_TOOLS:
+        return fn
+
+    def idempotent(args: Dict[str, Any]) -> Dict[str, Any]:
+        session_id, request_id = current()
+        key = cache.key(session_id, name, args)
+        prior = cache.lookup(key, request_id)
+        if prior is not None:
+            return {**prior, "idempotent_replay": True}
+        result = fn(args)
+        if isinstance(result, dict) and result.get("success"):
+            cache.store(key, request_id, result)
+        return result
+
+    return idempotent
@@ -0,0 +1,351 @@
+"""Gemini gateway — every LLM call in the agent goes through :data:`gateway`.
+
+On top of one shared ``genai.Client`` (one keep-alive connection pool of
+``LLM_POOL_SIZE``), each call gets:
+
+* a per-attempt timeout of ``LLM_TIMEOUT_SECONDS``, capped by the caller's
+  deadline if one is given;
+* up to ``LLM_MAX_ATTEMPTS`` attempts on retryable errors (429, 5xx,
+  timeouts, connection errors) with exponential backoff and full jitter;
+* optionally (``LLM_HEDGE=1``) a second, hedged copy of the request once the
+  first has been running longer than the observed p95 latency — whichever
+  answers first wins;
+* a circuit breaker per model: after ``LLM_BREAKER_THRESHOLD`` consecutive
+  failures calls fail fast for ``LLM_BREAKER_COOLDOWN`` seconds, then one
+  trial call is let through;
+* for the steps in ``FALLBACK_STEPS`` (intent classification), a retry on
+  ``GEMINI_FALLBACK_MODEL`` when the primary model is unavailable.
+
+When all of that fails the caller gets :class:`LLMUnavailable` (with a
+``retry_after`` hint) instead of a raw SDK exception.  Counters are exposed
+at ``GET /api/metrics/llm``.
+
+``google.genai`` is imported when the client is first built.  Use
+:mod:`agent.gemini_standin` as a local server with injected latency and
+failures; ``python -m agent.llm`` runs a small benchmark against it.
+"""
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, Optional
+
+from config import (
+    GEMINI_API_KEY,
+    GEMINI_BASE_URL,
+    GEMINI_FALLBACK_MODEL,
+    GEMINI_MODEL,
+    LLM_BACKOFF_SECONDS,
+    LLM_BREAKER_COOLDOWN_SECONDS,
+    LLM_BREAKER_THRESHOLD,
+    LLM_HEDGE,
+    LLM_HEDGE_AFTER_SECONDS,
+    LLM_MAX_ATTEMPTS,
+    LLM_POOL_SIZE,
+    LLM_TIMEOUT_SECONDS,
+)
+
+FALLBACK_STEPS = frozenset({"intent"})
+_RETRYABLE_CODES = frozenset({408, 429, 500, 502, 503, 504})
+_MIN_SAMPLES = 20  # latencies needed before p95 replaces LLM_HEDGE_AFTER_SECONDS
+
+
+class LLMUnavailable(RuntimeError):
+    """Gemini could not answer (retries exhausted, circuit open or deadline hit)."""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(LLMUnavailable):
+    """The caller's deadline passed (or would pass during backoff) before an answer."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code in _RETRYABLE_CODES
+    import httpx
+
+    return isinstance(exc, (httpx.TransportError, TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    """closed → open after *threshold* consecutive failures → half-open after *cooldown*."""
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN_SECONDS):
+        self.threshold, self.cooldown = threshold, cooldown
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.threshold:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True  # exactly one trial call
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures, self._trial = 0, False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.threshold:
+                if self.failures == self.threshold:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+
+
+class _Latencies:
+    def __init__(self, size: int = 200):
+        self._lock = threading.Lock()
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class Gateway:
+    def __init__(self, api_key: str = GEMINI_API_KEY, base_url: str = GEMINI_BASE_URL,
+                 model: str = GEMINI_MODEL, fallback_model: str = GEMINI_FALLBACK_MODEL,
+                 timeout: float = LLM_TIMEOUT_SECONDS, max_attempts: int = LLM_MAX_ATTEMPTS,
+                 backoff: float = LLM_BACKOFF_SECONDS, hedge: bool = LLM_HEDGE,
+                 hedge_after: float = LLM_HEDGE_AFTER_SECONDS):
+        self.api_key, self.base_url = api_key, base_url
+        self.model, self.fallback_model = model, fallback_model
+        self.timeout, self.max_attempts, self.backoff = timeout, max(1, max_attempts), backoff
+        self.hedge, self.hedge_after = hedge, hedge_after
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=LLM_POOL_SIZE, thread_name_prefix="llm-hedge")
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latency = _Latencies()
+        self._lock = threading.Lock()
+        self._counts = {"calls": 0, "attempts": 0, "retries": 0, "hedged": 0, "hedge_wins": 0,
+                        "fallbacks": 0, "unavailable": 0}
+
+    # ── Client ────────────────────────────────────────────────────
+
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                import httpx
+                from google import genai
+                from google.genai import types
+
+                options = types.HttpOptions(
+                    timeout=int(self.timeout * 1000),
+                    client_args={"limits": httpx.Limits(max_connections=LLM_POOL_SIZE,
+                                                        max_keepalive_connections=LLM_POOL_SIZE,
+                                                        keepalive_expiry=60)},
+                    **({"base_url": self.base_url} if self.base_url else {}),
+                )
+                self._client = genai.Client(api_key=self.api_key, http_options=options)
+            return self._client
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            return self._breakers.setdefault(model, CircuitBreaker())
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[key] += n
+
+    # ── Calls ─────────────────────────────────────────────────────
+
+    def generate(self, prompt: str, json_mode: bool = False, step: str = "",
+                 deadline: Optional[float] = None):
+        """One logical Gemini call; *deadline* is a ``time.monotonic()`` value."""
+        self._count("calls")
+        models = [self.model]
+        if step in FALLBACK_STEPS and self.fallback_model and self.fallback_model != self.model:
+            models.append(self.fallback_model)
+        error: Optional[LLMUnavailable] = None
+        for i, model in enumerate(models):
+            if i:
+                self._count("fallbacks")
+            try:
+                return self._with_retries(model, prompt, json_mode, deadline)
+            except DeadlineExceeded:
+                self._count("unavailable")
+                raise  # no time left for the fallback model either
+            except LLMUnavailable as exc:
+                error = exc
+        self._count("unavailable")
+        raise error  # type: ignore[misc]
+
+    def _with_retries(self, model: str, prompt: str, json_mode: bool, deadline: Optional[float]):
+        breaker = self.breaker(model)
+        last: Optional[BaseException] = None
+        for attempt in range(self.max_attempts):
+            if not breaker.allow():
+                raise LLMUnavailable(f"{model} is unavailable (circuit open)", breaker.retry_after())
+            timeout = self.timeout
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    raise DeadlineExceeded(f"{model}: deadline exceeded") from last
+            if attempt:
+                self._count("retries")
+            started = time.monotonic()
+            try:
+                resp = self._hedged(model, prompt, json_mode, timeout)
+            except Exception as exc:
+                if not is_retryable(exc):
+                    breaker.success()  # a bad request says nothing about the service
+                    raise
+                if deadline is not None and time.monotonic() >= deadline:
+                    # cut off by our own deadline, not a sign the service is down
+                    raise DeadlineExceeded(f"{model}: deadline exceeded") from exc
+                breaker.failure()
+                last = exc
+                if attempt + 1 < self.max_attempts:
+                    delay = random.uniform(0, self.backoff * (2 ** attempt))
+                    if deadline is not None and time.monotonic() + delay >= deadline:
+                        raise DeadlineExceeded(f"{model}: deadline exceeded ({exc})") from exc
+                    time.sleep(delay)
+                continue
+            breaker.success()
+            self._latency.add(time.monotonic() - started)
+            return resp
+        raise LLMUnavailable(f"{model} is unavailable: {last}", self.backoff) from last
+
+    def _hedge_delay(self) -> float:
+        p95 = self._latency.quantile(0.95) if len(self._latency) >= _MIN_SAMPLES else None
+        return p95 if p95 is not None else self.hedge_after
+
+    def _hedged(self, model: str, prompt: str, json_mode: bool, timeout: float):
+        if not self.hedge:
+            return self._once(model, prompt, json_mode, timeout)
+        first = self._pool.submit(self._once, model, prompt, json_mode, timeout)
+        done, _ = wait([first], timeout=min(self._hedge_delay(), timeout))
+        if done:
+            return first.result()
+        self._count("hedged")
+        second = self._pool.submit(self._once, model, prompt, json_mode, timeout)
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = error or future.exception()
+        raise error  # type: ignore[misc]
+
+    def _once(self, model: str, prompt: str, json_mode: bool, timeout: float):
+        from google.genai import types
+
+        self._count("attempts")
+        config = types.GenerateContentConfig(
+            http_options=types.HttpOptions(timeout=max(1, int(timeout * 1000))),
+            **({"response_mime_type": "application/json"} if json_mode else {}),
+        )
+        return self.client().models.generate_content(model=model, contents=prompt, config=config)
+
+    # ── Metrics ───────────────────────────────────────────────────
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+            breakers = {m: {"state": b.state, "failures": b.failures, "trips": b.trips}
+                        for m, b in self._breakers.items()}
+        p50, p95 = self._latency.quantile(0.5), self._latency.quantile(0.95)
+        return {
+            **counts,
+            "model": self.model,
+            "fallback_model": self.fallback_model,
+            "hedge": self.hedge,
+            "latency_ms": {
+                "p50": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95": round(p95 * 1000, 1) if p95 is not None else None,
+            },
+            "breakers": breakers,
+        }
+
+
+gateway = Gateway()
+
+
+if __name__ == "__main__":
+    import argparse
+    import statistics
+
+    from agent.gemini_standin import GeminiStandIn
+
+    parser = argparse.ArgumentParser(description="Benchmark the gateway against the local Gemini stand-in.")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--tail", type=float, default=0.05, help="fraction of slow calls")
+    parser.add_argument("--tail-latency", type=float, default=1.0)
+    parser.add_argument("--fail-rate", type=float, default=0.05, help="fraction of calls answered 503")
+    args = parser.parse_args()
+
+    def run(hedge: bool, standin: GeminiStandIn) -> None:
+        gw = Gateway(api_key="standin", base_url=standin.base_url, hedge=hedge,
+                     backoff=0.05, hedge_after=args.latency * 4)
+        latencies, errors = [], 0
+
+        def one(i: int) -> None:
+            nonlocal errors
+            t0 = time.perf_counter()
+            try:
+                gw.generate(f"benchmark prompt {i}")
+                latencies.append(time.perf_counter() - t0)
+            except LLMUnavailable:
+                errors += 1
+
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(one, range(args.calls)))
+        if not latencies:
+            print(f"hedge={'on ' if hedge else 'off'}  every call failed")
+            return
+        latencies.sort()
+        q = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000  # noqa: E731
+        s = gw.stats()
+        print(f"hedge={'on ' if hedge else 'off'}  p50 {q(0.5):7.1f} ms  p95 {q(0.95):7.1f} ms  "
+              f"p99 {q(0.99):7.1f} ms  mean {statistics.mean(latencies) * 1000:7.1f} ms  "
+              f"errors {errors}  attempts {s['attempts']}  retries {s['retries']}  "
+              f"hedged {s['hedged']} (won {s['hedge_wins']})")
+
+    with GeminiStandIn(latency=args.latency, jitter=args.jitter, tail=args.tail,
+                       tail_latency=args.tail_latency, fail_rate=args.fail_rate) as standin:
+        run(False, standin)
+        run(True, standin)
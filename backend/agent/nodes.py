@@ -8,38 +8,51 @@ import json
 import os
 from typing import Any, Dict, List
 
-from google import genai
-from google.genai import types
-from dotenv import load_dotenv
-
+from agent import budget, context, idempotency, llm, renderer
+from agent.singleflight import gemini_flight, make_key, sql_flight
+from agent.examples import example_store, few_shot_block
+from agent.profiler import summarize_results
 from agent.state import AgentState
-from mcp.tools.database import query_database, get_schema, QUERY_DATABASE_SCHEMA, GET_SCHEMA_SCHEMA
+from db import sqlrewrite
+from mcp.tools.database import query_database, get_schema, schema_catalog, QUERY_DATABASE_SCHEMA, GET_SCHEMA_SCHEMA
 from mcp.tools.email import send_summary_email
 from mcp.tools.slack import notify_slack_channel
 from mcp.tools.report import generate_report
+from mcp.tools.search import search_crm_text
+from mcp.tools.similar import find_similar_cases
 from mcp.validator import validate_tool_call, TOOL_SCHEMAS
-from config import GEMINI_API_KEY, GEMINI_MODEL, MAX_ROWS
-
-load_dotenv()
+from session import usage
+from config import COALESCE, GEMINI_MODEL, MAX_ROWS, RESPONSE_MODE
 
-# ── Gemini client singleton ───────────────────────────────────────
+# ── Gemini calls ──────────────────────────────────────────────────
 
-_client = None
+def _generate(prompt: str, json_mode: bool = False, step: str = ""):
+    """One Gemini call through the gateway (timeouts, retries, hedging,
+    fallback — see ``agent.llm``); identical concurrent prompts share a
+    single request."""
+    def call():
+        resp = llm.gateway.generate(prompt, json_mode=json_mode, step=step, deadline=context.deadline())
+        usage.ledger.record_llm(resp)  # once per real call, against the request that made it
+        return resp
 
-def _get_client() -> genai.Client:
-    global _client
-    if _client is None:
-        _client = genai.Client(api_key=GEMINI_API_KEY)
-    return _client
+    if not COALESCE:
+        return call()
+    return gemini_flight.do(make_key(GEMINI_MODEL, json_mode, step, prompt), call)
 
 
 def _schema_doc() -> str:
     """Get a compact schema description for prompts."""
-    result = get_schema()
+    result = schema_catalog()
     schema = result.get("schema", {})
+    summaries = result.get("summary_tables", {})
     lines = []
     for table, cols in schema.items():
-        lines.append(f"  - {table}: {', '.join(cols)}")
+        if table not in summaries:
+            lines.append(f"  - {table}: {', '.join(cols)}")
+    if summaries:
+        lines.append("Precomputed summary tables (prefer these over GROUP BY on the base tables):")
+        for table, desc in summaries.items():
+            lines.append(f"  - {table}: {', '.join(schema[table])} — {desc}")
     return "\n".join(lines)
 
 
@@ -71,12 +84,8 @@ User message: {state.user_message}
 
 Respond with JSON only."""
 
-    client = _get_client()
-    resp = client.models.generate_content(
-        model=GEMINI_MODEL,
-        contents=prompt,
-        config=types.GenerateContentConfig(response_mime_type="application/json"),
-    )
+    state.llm_calls += 1
+    resp = _generate(prompt, json_mode=True, step="intent")
 
     try:
         payload = json.loads(resp.text)
@@ -100,6 +109,8 @@ def tool_selection_node(state: AgentState) -> AgentState:
     state.add_event("tool_selection", "processing", "Selecting tools and building parameters…")
 
     schema_doc = _schema_doc()
+    if not state.few_shot_examples:
+        state.few_shot_examples = example_store.nearest(state.user_message, tenant_id=state.tenant_id)
 
     prompt = f"""You are a CRM copilot tool planner. Based on the user's request,
 select the appropriate tools and generate the correct arguments for each.
@@ -125,6 +136,10 @@ SQL rules:
 - Always include LIMIT {MAX_ROWS} if no limit specified
 - Table names "Case" and "Order" must be double-quoted in SQL
 - Use correct column names from the schema above
+- For free-text matching (e.g. "cases mentioning X") use search_crm_text instead of LIKE '%X%'
+- For totals / counts / workload questions, query a precomputed summary table if one fits
+
+{few_shot_block(state.few_shot_examples)}
 
 User intent: {state.intent_detail}
 User message: {state.user_message}
@@ -132,12 +147,8 @@ User message: {state.user_message}
 
 Respond with JSON only."""
 
-    client = _get_client()
-    resp = client.models.generate_content(
-        model=GEMINI_MODEL,
-        contents=prompt,
-        config=types.GenerateContentConfig(response_mime_type="application/json"),
-    )
+    state.llm_calls += 1
+    resp = _generate(prompt, json_mode=True, step="tool_selection")
 
     try:
         payload = json.loads(resp.text)
@@ -151,6 +162,7 @@ Respond with JSON only."""
     tool_names = [t["name"] for t in state.selected_tools]
     state.add_event("tool_selection", "success", f"Selected: {', '.join(tool_names)}", {
         "tools": state.selected_tools,
+        "few_shot_examples": len(state.few_shot_examples),
     })
     return state
 
@@ -199,18 +211,42 @@ TOOL_FUNCTIONS = {
     "send_summary_email": lambda args: send_summary_email(**args),
     "notify_slack_channel": lambda args: notify_slack_channel(**args),
     "generate_report": lambda args: generate_report(**args),
+    "search_crm_text": lambda args: search_crm_text(**args),
+    "find_similar_cases": lambda args: find_similar_cases(**args),
 }
+# Side-effecting tools replay their earlier result instead of re-running on retry
+TOOL_FUNCTIONS = {name: idempotency.wrap(name, fn) for name, fn in TOOL_FUNCTIONS.items()}
+
+
+def _coalesced_query(args: Dict[str, Any]) -> Dict[str, Any]:
+    """query_database where identical concurrent statements run once."""
+    sql = args.get("sql", "")
+    if not COALESCE:
+        return query_database(**args)
+    return dict(sql_flight.do(make_key(context.tenant_id(), sqlrewrite.canonical(sql)), lambda: query_database(**args)))
+
+
+TOOL_FUNCTIONS["query_database"] = _coalesced_query
 
 
 def execution_node(state: AgentState) -> AgentState:
     """Execute validated tool calls and collect results."""
     state.add_event("execution", "processing", "Executing tools…")
     state.tool_results = []
+    last_query_sql = ""
 
-    for tool_call in state.selected_tools:
+    skipped: List[str] = []
+
+    for i, tool_call in enumerate(state.selected_tools):
         name = tool_call.get("name", "")
         args = tool_call.get("arguments", {})
         fn = TOOL_FUNCTIONS.get(name)
+        if budget.expired():
+            state.degrade(budget.PARTIAL_RESULTS)
+            skipped = [t.get("name", "") for t in state.selected_tools[i:]]
+            break
+        if name == "generate_report" and not args.get("sql") and last_query_sql:
+            args = {**args, "sql": last_query_sql}  # report on the rows just queried
 
         if fn is None:
             result = {"success": False, "error": f"No executor for tool '{name}'"}
@@ -221,16 +257,29 @@ def execution_node(state: AgentState) -> AgentState:
                 result = {"success": False, "error": str(exc)}
 
         state.tool_results.append({"tool": name, "result": result})
+        if isinstance(result, dict) and result.get("deadline_exceeded"):
+            state.degrade(budget.PARTIAL_RESULTS)
 
         # Track SQL for display
         if name == "query_database" and isinstance(result, dict):
             state.sql_used = result.get("sql", args.get("sql", ""))
+            if result.get("success"):
+                last_query_sql = state.sql_used
 
     all_ok = all(
         r.get("result", {}).get("success", False) for r in state.tool_results
     )
 
-    if all_ok:
+    if skipped:
+        state.skipped_tools = skipped
+    if all_ok and skipped:
+        state.add_event("execution", "success",
+                        f"Executed {len(state.tool_results)} of {len(state.selected_tools)} tool(s) — "
+                        f"time budget exhausted", {
+            "results": _safe_results(state.tool_results),
+            "skipped": skipped,
+        })
+    elif all_ok:
         state.add_event("execution", "success", f"Executed {len(state.tool_results)} tool(s) successfully", {
             "results": _safe_results(state.tool_results),
         })
@@ -270,28 +319,43 @@ def response_node(state: AgentState) -> AgentState:
     """Generate a natural-language reply summarising tool results."""
     state.add_event("response", "processing", "Generating response…")
 
-    # Build a compact summary of all tool results
-    result_summary = json.dumps(state.tool_results, ensure_ascii=False, default=str)
-    if len(result_summary) > 3000:
-        result_summary = result_summary[:3000] + "…(truncated)"
+    if not budget.allows_llm_response():
+        state.degrade(budget.LOCAL_RESPONSE)
+    complete = RESPONSE_MODE == "template" or budget.LOCAL_RESPONSE in state.degradations
+    if RESPONSE_MODE != "llm" or complete:
+        text = renderer.render(state, complete=complete)
+        if text is not None:
+            return _respond(state, text, "template")
+
+    # Column profiles + sample rows: size independent of the row count
+    result_summary = json.dumps(summarize_results(state.tool_results), ensure_ascii=False, default=str)
 
     prompt = f"""You are a CRM copilot. Summarise the tool execution results for the user.
 Be concise (2-4 sentences). Use Thai language if the user asked in Thai, else English.
 Do NOT expose internal implementation details.
 
 User question: {state.user_message}
-Tool results: {result_summary}
+Tool results (per-column statistics over all returned rows, plus sample rows): {result_summary}
 {f'Note: auto-recovered from error via retry.' if state.had_retry else ''}
 
 Respond with plain text only (no JSON)."""
 
-    client = _get_client()
-    resp = client.models.generate_content(
-        model=GEMINI_MODEL,
-        contents=prompt,
-    )
-    state.agent_response = resp.text.strip()
-    state.add_event("response", "success", "Response generated", {
-        "response": state.agent_response,
-    })
+    state.llm_calls += 1
+    try:
+        resp = _generate(prompt, step="response")
+    except llm.DeadlineExceeded:
+        state.degrade(budget.LOCAL_RESPONSE)
+        return _respond(state, renderer.render(state, complete=True), "template")
+    return _respond(state, resp.text.strip())
+
+
+def _respond(state: AgentState, text: str, rendered: str = "") -> AgentState:
+    if budget.PARTIAL_RESULTS in state.degradations:
+        note = renderer.partial_note(state)
+        text = f"{text} {note}" if state.tool_results else note
+    state.agent_response = text
+    data: Dict[str, Any] = {"response": state.agent_response}
+    if rendered:
+        data["rendered"] = rendered
+    state.add_event("response", "success", "Response generated", data)
     return state
@@ -0,0 +1,104 @@
+"""Column profiles of tool results for the response prompt.
+
+Instead of a JSON dump cut at a fixed length (which can end mid-row and
+hide most of the data), ``response_node`` gets, per tool result, a profile
+of every column — non-null count, distinct count, min / max / mean for
+numbers, date range for ISO dates, top categories for text — plus a few
+sample rows with long strings clipped.  Stats are computed with NumPy over
+whole columns, and the prompt size depends on the column count, not the
+row count.
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List
+
+import numpy as np
+
+SAMPLE_ROWS = 3
+TOP_CATEGORIES = 5
+MAX_COLUMNS = 30
+MAX_TEXT = 80
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+def _clip(value: Any) -> Any:
+    if isinstance(value, str) and len(value) > MAX_TEXT:
+        return value[:MAX_TEXT] + "…"
+    return value
+
+
+def profile_column(values: List[Any]) -> Dict[str, Any]:
+    """Stats for one column of values (``None`` = null)."""
+    present = [v for v in values if v is not None]
+    out: Dict[str, Any] = {"non_null": len(present)}
+    if not present:
+        out["type"] = "empty"
+        return out
+
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        arr = np.asarray(present, dtype=np.float64)
+        out.update(
+            type="number",
+            distinct=int(np.unique(arr).size),
+            min=float(arr.min()),
+            max=float(arr.max()),
+            mean=round(float(arr.mean()), 4),
+            sum=float(arr.sum()),
+        )
+        return out
+
+    arr = np.asarray([str(v) for v in present])
+    uniq, counts = np.unique(arr, return_counts=True)
+    out["distinct"] = int(uniq.size)
+    if all(_DATE_RE.match(u) for u in uniq):
+        out.update(type="date", min=str(uniq[0]), max=str(uniq[-1]))  # ISO strings sort by time
+        return out
+    out["type"] = "text"
+    if uniq.size < arr.size:  # repeated values → categorical
+        order = np.argsort(-counts, kind="stable")[:TOP_CATEGORIES]
+        out["top"] = [[_clip(str(uniq[i])), int(counts[i])] for i in order]
+    else:
+        lengths = np.char.str_len(arr)
+        out["avg_length"] = round(float(lengths.mean()), 1)
+    return out
+
+
+def profile_rows(columns: List[str], rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Profile of a ``query_database``-style result."""
+    shown = columns[:MAX_COLUMNS]
+    profile = {
+        "row_count": len(rows),
+        "columns": {c: profile_column([r.get(c) for r in rows]) for c in shown},
+        "sample_rows": [{c: _clip(r.get(c)) for c in shown} for r in rows[:SAMPLE_ROWS]],
+    }
+    if len(columns) > len(shown):
+        profile["omitted_columns"] = len(columns) - len(shown)
+    return profile
+
+
+def summarize_results(tool_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Compact, size-bounded view of ``state.tool_results`` for the LLM."""
+    out = []
+    for r in tool_results:
+        result = r.get("result", {})
+        if not isinstance(result, dict):
+            out.append({"tool": r.get("tool"), "result": _clip(str(result))})
+            continue
+        entry: Dict[str, Any] = {"tool": r.get("tool")}
+        for key, value in result.items():
+            if key == "rows" and isinstance(value, list):
+                columns = result.get("columns") or (list(value[0]) if value else [])
+                entry["profile"] = profile_rows(columns, value)
+            elif key == "results" and isinstance(value, list):
+                entry["result_count"] = len(value)
+                entry["results_sample"] = [
+                    {k: _clip(v) for k, v in item.items()} for item in value[:SAMPLE_ROWS]
+                ]
+            elif key == "schema" and isinstance(value, dict):
+                entry["schema"] = value
+            elif key != "columns":
+                entry[key] = _clip(value) if not isinstance(value, (list, dict)) else _clip(str(value))
+        out.append(entry)
+    return out
@@ -0,0 +1,218 @@
+"""Template-based response rendering for result shapes we understand.
+
+``response_node`` asks Gemini to summarise tool results.  For the common
+shapes — one query result (a single value, or N rows from one table), a
+schema listing, search / similarity hits, report links and email / Slack delivery
+confirmations — the summary is built locally from the result
+metadata instead (row count, most common values, numeric range).  Anything
+else (failed tools, several data tools in one answer, no tools at all)
+returns ``None`` and the LLM writes the reply.
+
+The reply is Thai when the user wrote Thai, English otherwise — the same
+rule the LLM prompt follows.
+"""
+from __future__ import annotations
+
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from agent.state import AgentState
+from config import MAX_ROWS
+
+_THAI_RE = re.compile(r"[\u0E00-\u0E7F]")
+_FROM_RE = re.compile(r'\bFROM\s+"?(\w+)"?', re.IGNORECASE)
+
+_DATA_TOOLS = {"query_database", "get_schema", "search_crm_text", "find_similar_cases"}
+_MAX_TOP_VALUES = 3
+_MAX_TEXT_LEN = 40  # longer strings are free text, not categories
+
+
+def is_thai(text: str) -> bool:
+    return bool(_THAI_RE.search(text or ""))
+
+
+def _fmt(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
+
+def _top_values(rows: List[Dict[str, Any]], columns: List[str]) -> List[tuple]:
+    """``(column, [(value, count), …])`` for categorical columns that repeat."""
+    out = []
+    for col in columns:
+        if col.lower() == "id" or col.lower().endswith("id"):
+            continue
+        values = [r.get(col) for r in rows]
+        if not all(isinstance(v, str) and len(v) <= _MAX_TEXT_LEN for v in values if v is not None):
+            continue
+        counts = Counter(v for v in values if v is not None)
+        if counts and len(counts) < len(rows):
+            out.append((col, counts.most_common(_MAX_TOP_VALUES)))
+    return out[:2]
+
+
+def _numeric_range(rows: List[Dict[str, Any]], columns: List[str]) -> Optional[tuple]:
+    for col in columns:
+        values = [r.get(col) for r in rows if r.get(col) is not None]
+        if values and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            return col, min(values), max(values)
+    return None
+
+
+# ── Per-tool renderers ────────────────────────────────────────────
+
+def _query(result: Dict[str, Any], thai: bool) -> str:
+    rows = result.get("rows", [])
+    columns = result.get("columns", [])
+    m = _FROM_RE.search(result.get("sql", ""))
+    table = m.group(1) if m else ""
+    if not rows:
+        return "ไม่พบข้อมูลที่ตรงกับเงื่อนไข" if thai else "No matching records were found."
+    if len(rows) == 1 and len(columns) == 1:
+        col, value = columns[0], rows[0][columns[0]]
+        return f"ผลลัพธ์ {col}: {_fmt(value)}" if thai else f"The result is {_fmt(value)} ({col})."
+    n = len(rows)
+    if thai:
+        parts = [f"พบข้อมูล {n:,} รายการ" + (f" จากตาราง {table}" if table else "")]
+    else:
+        parts = [f"Found {n:,} record{'s' if n != 1 else ''}" + (f" from {table}" if table else "") + "."]
+    if n == 1:
+        shown = {k: v for k, v in rows[0].items() if v not in (None, "")}
+        preview = ", ".join(f"{k}: {_fmt(v)}" for k, v in list(shown.items())[:4])
+        parts.append(f"({preview})")
+    for col, top in _top_values(rows, columns):
+        values = ", ".join(f"{v} ({c})" for v, c in top)
+        parts.append(f"{col} ที่พบบ่อย: {values}" if thai else f"Most common {col}: {values}.")
+    rng = _numeric_range(rows, columns)
+    if rng and n > 1:
+        col, lo, hi = rng
+        parts.append(f"{col} อยู่ระหว่าง {_fmt(lo)} ถึง {_fmt(hi)}" if thai
+                     else f"{col} ranges from {_fmt(lo)} to {_fmt(hi)}.")
+    if n >= MAX_ROWS:
+        parts.append("(แสดงเฉพาะบางส่วน)" if thai else "(Results were limited.)")
+    return " ".join(parts)
+
+
+def _schema(result: Dict[str, Any], thai: bool) -> str:
+    tables = [t for t in result.get("schema", {}) if not t.startswith("agg_")]
+    if thai:
+        return f"ฐานข้อมูลมี {len(tables)} ตาราง: {', '.join(tables)}"
+    return f"The database has {len(tables)} tables: {', '.join(tables)}."
+
+
+def _search(result: Dict[str, Any], thai: bool) -> str:
+    hits = result.get("results", [])
+    query = result.get("query", "")
+    if not hits:
+        return f"ไม่พบข้อความที่ตรงกับ \"{query}\"" if thai else f"No records mention \"{query}\"."
+    tables = Counter(h.get("table") for h in hits)
+    where = ", ".join(f"{t} ({c})" for t, c in tables.most_common())
+    best = hits[0].get("title") or hits[0].get("id")
+    if thai:
+        return f"พบ {len(hits)} รายการที่ตรงกับ \"{query}\" ใน {where} รายการที่ตรงที่สุด: {best}"
+    return f"Found {len(hits)} matches for \"{query}\" in {where}. Best match: {best}."
+
+
+def _similar(result: Dict[str, Any], thai: bool) -> str:
+    rows = result.get("rows", [])
+    ref = result.get("case_id")
+    if not rows:
+        return "ไม่พบเคสที่คล้ายกัน" if thai else "No similar cases were found."
+    best = rows[0]
+    label = best.get("Subject") or best.get("Id")
+    if thai:
+        return (f"พบ {len(rows)} เคสที่คล้าย{' กับ ' + ref if ref else ''} "
+                f"ใกล้เคียงที่สุด: {label} (ความคล้าย {best.get('similarity')})")
+    return (f"Found {len(rows)} similar case{'s' if len(rows) != 1 else ''}{' to ' + ref if ref else ''}. "
+            f"Closest: {label} (similarity {best.get('similarity')}).")
+
+
+def _email(result: Dict[str, Any], thai: bool) -> str:
+    sim = (" (จำลอง)" if thai else " (simulated)") if result.get("simulated") else ""
+    if thai:
+        return f"จัดคิวส่งอีเมล \"{result.get('subject', '')}\" ถึง {result.get('to', '')} แล้ว{sim}"
+    return f"Email \"{result.get('subject', '')}\" to {result.get('to', '')} queued for delivery{sim}."
+
+
+def _slack(result: Dict[str, Any], thai: bool) -> str:
+    sim = (" (จำลอง)" if thai else " (simulated)") if result.get("simulated") else ""
+    if thai:
+        return f"จัดคิวแจ้งเตือนไปที่ {result.get('channel', '')} แล้ว{sim}"
+    return f"Message to {result.get('channel', '')} queued for delivery{sim}."
+
+
+def _report(result: Dict[str, Any], thai: bool) -> str:
+    title, fmt = result.get("title", ""), str(result.get("format", "")).upper()
+    url = result.get("download_url", "")
+    if thai:
+        return f"กำลังสร้างรายงาน \"{title}\" ({fmt}) ดาวน์โหลดได้ที่ {url}"
+    return f"Report \"{title}\" ({fmt}) is being generated; download it from {url}."
+
+
+_RENDERERS: Dict[str, Callable[[Dict[str, Any], bool], str]] = {
+    "query_database": _query,
+    "get_schema": _schema,
+    "search_crm_text": _search,
+    "find_similar_cases": _similar,
+    "send_summary_email": _email,
+    "notify_slack_channel": _slack,
+    "generate_report": _report,
+}
+
+
+def _failure(result: Dict[str, Any], thai: bool) -> str:
+    error = result.get("error", "unknown error")
+    return f"ไม่สามารถดำเนินการได้: {error}" if thai else f"The request could not be completed: {error}"
+
+
+def render(state: AgentState, complete: bool = False) -> Optional[str]:
+    """Local reply for *state*, or ``None`` when the LLM should write it.
+
+    With *complete* (``RESPONSE_MODE=template``) every state gets a reply:
+    failures and multi-tool answers are rendered part by part.
+    """
+    results = state.tool_results
+    thai = is_thai(state.user_message)
+    if not complete:
+        if not results or not all(r.get("result", {}).get("success", False) for r in results):
+            return None
+        if sum(1 for r in results if r.get("tool") in _DATA_TOOLS) > 1:
+            return None
+        if any(r.get("tool") not in _RENDERERS for r in results):
+            return None
+    if not results:
+        if state.error_message:
+            return _failure({"error": state.error_message}, thai)
+        return ("ไม่พบเครื่องมือที่ตอบคำถามนี้ได้" if thai
+                else "I couldn't find a tool that answers this request.")
+    parts = [
+        _RENDERERS[r["tool"]](r["result"], thai)
+        if r.get("result", {}).get("success") and r.get("tool") in _RENDERERS
+        else _failure(r.get("result", {}), thai)
+        for r in results
+    ]
+    if state.had_retry:
+        parts.append("(แก้ไขข้อผิดพลาดอัตโนมัติแล้ว)" if thai else "(Recovered automatically after a retry.)")
+    return " ".join(parts)
+
+
+def partial_note(state: AgentState) -> str:
+    """What to tell the user when the request's time budget cut it short.
+
+    Appended to the reply when some tools did run; the whole reply otherwise.
+    """
+    thai = is_thai(state.user_message)
+    skipped = ", ".join(state.skipped_tools)
+    if not state.tool_results:
+        if thai:
+            return "หมดเวลาก่อนตอบคำถามนี้ — ลองใหม่อีกครั้งหรือระบุคำถามให้แคบลง"
+        return "I ran out of time before I could answer this — please try again or narrow the question."
+    if thai:
+        return f"(ผลลัพธ์บางส่วน — หมดเวลาก่อนเรียก {skipped})" if skipped else "(ผลลัพธ์บางส่วน — หมดเวลา)"
+    if skipped:
+        return f"(Partial results: the time budget ran out before {skipped} ran.)"
+    return "(Partial results: the time budget ran out.)"
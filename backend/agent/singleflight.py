@@ -0,0 +1,134 @@
+"""Single-flight coalescing of identical in-flight work.
+
+When several callers ask for the same thing at the same time (a dashboard
+refresh, many users clicking the same preset scenario), only the first
+caller does the work; the others wait for and share its result.  Nothing is
+cached after the work finishes — this only merges *concurrent* duplicates.
+
+* :class:`SingleFlight` — thread-based, for blocking calls (Gemini prompts,
+  ``query_database`` statements); used from worker threads.
+* :class:`EventFlight` — one in-flight agent pipeline whose step events are
+  fanned out to every waiting caller (see ``agent.graph``).
+
+Counters for all flights are exposed at ``GET /api/metrics/coalescing``.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+def make_key(*parts: Any) -> str:
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Coalesce concurrent blocking calls that share a key."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.executed += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"executed": self.executed, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+class EventFlight:
+    """An in-flight pipeline run: its events so far, live subscribers and result.
+
+    Lives on the event loop; not thread-safe.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.events: List[Dict[str, Any]] = []
+        self._queues: List[asyncio.Queue] = []
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    async def publish(self, event: Dict[str, Any]) -> None:
+        self.events.append(event)
+        for queue in self._queues:
+            queue.put_nowait(event)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Queue pre-filled with the events so far; ends with a sentinel."""
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self.events:
+            queue.put_nowait(event)
+        if self.result.done():
+            queue.put_nowait(_DONE)
+        self._queues.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        if queue in self._queues:
+            self._queues.remove(queue)
+
+    def finish(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        if error is not None:
+            self.result.set_exception(error)
+            self.result.exception()  # mark retrieved: followers may not exist
+        else:
+            self.result.set_result(result)
+        for queue in self._queues:
+            queue.put_nowait(_DONE)
+
+    @staticmethod
+    def is_done(item: Any) -> bool:
+        return item is _DONE
+
+
+class PipelineStats:
+    def __init__(self) -> None:
+        self.executed = 0
+        self.shared = 0
+        self.detached = 0  # followers that had to run their own pipeline
+
+    def stats(self) -> Dict[str, Any]:
+        return {"executed": self.executed, "shared": self.shared, "detached": self.detached}
+
+
+gemini_flight = SingleFlight("gemini")
+sql_flight = SingleFlight("sql")
+pipeline_stats = PipelineStats()
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "pipeline": pipeline_stats.stats(),
+        "gemini": gemini_flight.stats(),
+        "sql": sql_flight.stats(),
+    }
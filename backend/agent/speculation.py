@@ -0,0 +1,128 @@
+"""Speculative planning — run tool selection alongside intent classification.
+
+``tool_selection_node`` mostly plans from the raw ``user_message``; the
+intent detail is extra context.  With ``AGENT_SPECULATIVE_PLANNING=1`` the
+planner starts on a copy of the state (intent detail = the message itself)
+at the same time as ``intent_node``, so the two Gemini calls overlap.  Once
+the intent is known the speculative plan is
+
+* accepted — its events are appended after the intent events, so the UI sees
+  the usual intent → tool_selection order; or
+* rejected when the intent contradicts it: intent ``unknown``, a plan with
+  no tools, or tools that share nothing with the intent's suggested tools.
+  The pipeline then plans again, as it would have without speculation.
+
+A rejected plan has cost one extra Gemini call.  ``GET
+/api/metrics/speculation`` reports the accept rate and the latency saved on
+accepted plans (planner time that overlapped the intent call), to decide
+whether the mode should be the default.
+"""
+from __future__ import annotations
+
+import asyncio
+import copy
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from agent.nodes import tool_selection_node
+from agent.state import AgentState
+
+_lock = threading.Lock()
+_stats: Dict[str, Any] = {"started": 0, "accepted": 0, "rejected": {}, "failed": 0, "saved_ms": 0.0}
+
+
+class Speculation:
+    """A tool-selection run started before the intent was known."""
+
+    def __init__(self, state: AgentState):
+        self.state = copy.deepcopy(state)
+        self.state.intent_detail = state.user_message
+        self.first_event = len(self.state.events)
+        self.started = self.finished = time.perf_counter()
+        self.task = asyncio.ensure_future(asyncio.to_thread(self._plan))
+        self.task.add_done_callback(lambda t: t.cancelled() or t.exception())  # rejected plans may fail unobserved
+        with _lock:
+            _stats["started"] += 1
+
+    def _plan(self) -> AgentState:
+        try:
+            return tool_selection_node(self.state)
+        finally:
+            self.finished = time.perf_counter()
+
+    def _contradiction(self, state: AgentState) -> str:
+        tools = {t.get("name") for t in self.state.selected_tools}
+        if not tools:
+            return "no_tools"
+        suggested = next((set((e.data or {}).get("suggested_tools") or []) for e in reversed(state.events)
+                          if e.step_name == "intent" and e.status == "success"), set())
+        if suggested and not tools & suggested:
+            return "tools_mismatch"
+        return ""
+
+    async def resolve(self, state: AgentState, intent_finished: float) -> bool:
+        """Adopt the speculative plan into *state*, whose intent was classified
+        at *intent_finished* (``time.perf_counter()``); ``False`` if the plan
+        was rejected or failed and the caller must plan again."""
+        state.llm_calls += 1  # spent either way
+        if state.intent == "unknown":
+            return self._reject("unknown_intent")  # no need to wait for the planner
+        try:
+            await asyncio.shield(self.task)
+        except Exception:  # LLMUnavailable / DeadlineExceeded: plan again the normal way
+            return self._fail()
+
+        reason = self._contradiction(state)
+        if reason:
+            return self._reject(reason)
+
+        events = self.state.events[self.first_event:]
+        for event in events:
+            if event.step_name == "tool_selection" and event.status == "success":
+                event.data = {**(event.data or {}), "speculative": True}
+        state.events.extend(events)
+        state.selected_tools = self.state.selected_tools
+        state.few_shot_examples = self.state.few_shot_examples
+        with _lock:
+            _stats["accepted"] += 1
+            # sequential planning would have started at intent_finished
+            _stats["saved_ms"] += max(0.0, min(self.finished, intent_finished) - self.started) * 1000
+        return True
+
+    def abandon(self) -> None:
+        """The run stopped planning (time budget spent); the plan is not used."""
+        self._fail()
+
+    def _reject(self, reason: str) -> bool:
+        with _lock:
+            _stats["rejected"][reason] = _stats["rejected"].get(reason, 0) + 1
+        return False
+
+    def _fail(self) -> bool:
+        with _lock:
+            _stats["failed"] += 1
+        return False
+
+
+def start(state: AgentState) -> Optional[Speculation]:
+    """Start planning *state*'s message now (first attempt only)."""
+    if state.retry_count or state.selected_tools:
+        return None
+    return Speculation(state)
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        started, accepted = _stats["started"], _stats["accepted"]
+        rejected = dict(_stats["rejected"])
+        return {
+            "started": started,
+            "accepted": accepted,
+            "rejected": sum(rejected.values()),
+            "rejected_by_reason": rejected,
+            "failed": _stats["failed"],
+            "accept_rate": round(accepted / started, 3) if started else 0.0,
+            "saved_ms_total": round(_stats["saved_ms"], 1),
+            "saved_ms_per_accept": round(_stats["saved_ms"] / accepted, 1) if accepted else 0.0,
+        }
@@ -12,6 +12,7 @@ class StepEvent:
     status: str             # pending | processing | success | failed | retry
     detail: str = ""        # human-readable 1-liner
     data: Optional[Dict[str, Any]] = None   # payload (tool result, validation, etc.)
+    degradations: List[str] = field(default_factory=list)  # applied so far (see agent.budget)
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -19,6 +20,7 @@ class StepEvent:
             "status": self.status,
             "detail": self.detail,
             "data": self.data or {},
+            "degradations": self.degradations,
         }
 
 
@@ -27,6 +29,8 @@ class AgentState:
     """Accumulated state that flows through every LangGraph node."""
     user_message: str = ""
     session_id: str = ""
+    request_id: str = ""
+    tenant_id: str = ""     # CRM database the tools read ("" = default, see db.tenants)
 
     # Populated by intent node
     intent: str = ""
@@ -35,6 +39,10 @@ class AgentState:
     # Populated by tool selector
     selected_tools: List[Dict[str, Any]] = field(default_factory=list)
     # each: {"name": str, "arguments": dict}
+    few_shot_examples: List[Dict[str, Any]] = field(default_factory=list)
+    plan_template_id: Optional[int] = None  # set when the plan came from a template
+    fast_path: str = ""                     # fast-path rule that answered, if any
+    coalesced_from: str = ""                # request_id of the identical run this shared
 
     # Populated by validator
     validation_results: List[Dict[str, Any]] = field(default_factory=list)
@@ -42,6 +50,7 @@ class AgentState:
 
     # Populated by executor
     tool_results: List[Dict[str, Any]] = field(default_factory=list)
+    skipped_tools: List[str] = field(default_factory=list)  # not run: time budget exhausted
 
     # Populated by responder
     agent_response: str = ""
@@ -52,26 +61,39 @@ class AgentState:
     max_retries: int = 2
     error_message: str = ""
     had_retry: bool = False
+    llm_calls: int = 0
+    degradations: List[str] = field(default_factory=list)
 
     # Events for UI streaming
     events: List[StepEvent] = field(default_factory=list)
 
     def add_event(self, step_name: str, status: str, detail: str = "", data: Any = None) -> None:
-        self.events.append(StepEvent(step_name, status, detail, data))
+        self.events.append(StepEvent(step_name, status, detail, data, list(self.degradations)))
+
+    def degrade(self, name: str) -> None:
+        if name not in self.degradations:
+            self.degradations.append(name)
 
     def to_dict(self) -> Dict[str, Any]:
         return {
             "user_message": self.user_message,
+            "request_id": self.request_id,
             "intent": self.intent,
             "intent_detail": self.intent_detail,
             "selected_tools": self.selected_tools,
             "validation_results": self.validation_results,
             "validation_passed": self.validation_passed,
             "tool_results": self.tool_results,
+            "skipped_tools": self.skipped_tools,
             "agent_response": self.agent_response,
             "sql_used": self.sql_used,
             "retry_count": self.retry_count,
             "had_retry": self.had_retry,
+            "llm_calls": self.llm_calls,
+            "plan_template_id": self.plan_template_id,
+            "fast_path": self.fast_path,
+            "coalesced_from": self.coalesced_from,
+            "degradations": self.degradations,
             "error_message": self.error_message,
             "events": [e.to_dict() for e in self.events],
         }
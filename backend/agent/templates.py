@@ -0,0 +1,402 @@
+"""Parameterized plan templates — reuse a plan for questions that differ
+only in their literals.
+
+After a request succeeds without a retry, the literals in the user message
+(quoted strings, record ids like ``USR-005``, ISO dates, numbers, and words
+that the plan uses as SQL string values such as ``Escalated``) are located
+in the planned ``tool_calls``.  Those that appear become slots; the message
+becomes a regex with one capture group per slot and the plan a JSON
+template.
+
+"show 10 latest Closed cases" then matches the template learned from
+"show 5 latest Escalated cases", the new literals are bound into the stored
+plan, and ``intent_node`` / ``tool_selection_node`` are skipped.  Bound plans
+still go through ``validation_node`` and ``query_database``'s SQL checks.
+
+No LLM sees a bound plan, so learning is conservative:
+
+* a number becomes a slot only if it occurs exactly once in the plan — in
+  ``substr(CreatedDate, 1, 7) … LIMIT 7`` the ``7`` could be either, and the
+  run is not learned;
+* a word slot stores the distinct values of the column it is compared with;
+  a match binds the stored spelling of the value (``escalated`` →
+  ``Escalated``, SQLite's ``=`` is case-sensitive) and a word outside that
+  set (``my``) does not match.
+
+Templates are kept per tenant (``db.tenants``): a plan learned on one
+tenant's database — or its email / Slack recipients — is never replayed for
+another.
+"""
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent import context
+from agent.state import AgentState
+from config import AGENT_STORE_PATH
+from db import tenants
+from db.tenants import DEFAULT_TENANT
+
+# Literal kinds in priority order (earlier kinds win overlapping spans).
+_LITERAL_PATTERNS: List[Tuple[str, str]] = [
+    ("str", r"'[^']*'|\"[^\"]*\""),
+    ("id", r"\b[A-Za-z]+[-_]\d+\b"),
+    ("date", r"\b\d{4}-\d{2}-\d{2}\b"),
+    ("num", r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])"),
+]
+_SLOT_REGEX = {
+    "str": r"(?:'([^']*)'|\"([^\"]*)\")",
+    "id": r"([A-Za-z]+[-_]\d+)",
+    "date": r"(\d{4}-\d{2}-\d{2})",
+    "num": r"(\d+(?:\.\d+)?)",
+    "word": r"(\w+)",
+}
+_SQL_STRING_RE = re.compile(r"'((?:[^']|'')*)'")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_TABLE_RE = re.compile(
+    r"\b(?:FROM|JOIN)\s+\"?(\w+)\"?(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|GROUP|ORDER|LIMIT|LEFT|INNER|CROSS)\b)(\w+))?",
+    re.IGNORECASE,
+)
+_MAX_CHOICES = 200  # a word slot's column may have at most this many distinct values
+
+
+class _Ambiguous(ValueError):
+    """A literal cannot be mapped to one place in the plan."""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plan_template (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tenant_id TEXT NOT NULL DEFAULT 'default',
+    pattern TEXT NOT NULL,
+    slots TEXT NOT NULL,
+    plan TEXT NOT NULL,
+    intent TEXT NOT NULL,
+    choices TEXT NOT NULL DEFAULT '{}',  -- word slot id -> allowed values
+    hits INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    UNIQUE (tenant_id, pattern)
+);
+"""
+
+# Stores created before templates were kept per tenant: their rows belong to the default tenant.
+_MIGRATE = """
+ALTER TABLE plan_template RENAME TO plan_template_untenanted;
+{create}
+INSERT INTO plan_template (id, pattern, slots, plan, intent, hits, created)
+    SELECT id, pattern, slots, plan, intent, hits, created FROM plan_template_untenanted;
+DROP TABLE plan_template_untenanted;
+"""
+
+
+@dataclass
+class Literal:
+    kind: str
+    value: str
+    start: int
+    end: int
+
+
+@dataclass
+class PlanTemplate:
+    id: int
+    tenant_id: str
+    pattern: str
+    slots: List[str]  # kind per slot
+    plan: str         # JSON with {{slot:N}} placeholders
+    intent: str
+    regex: "re.Pattern[str]"
+    choices: Dict[str, List[str]]  # word slot id -> allowed values, stored spelling
+
+
+def _sql_strings(tool_calls: List[Dict[str, Any]]) -> set:
+    values = set()
+    for call in tool_calls:
+        sql = call.get("arguments", {}).get("sql")
+        if isinstance(sql, str):
+            values.update(v.replace("''", "'") for v in _SQL_STRING_RE.findall(sql))
+    return values
+
+
+def extract_literals(message: str, plan_strings: set) -> List[Literal]:
+    """Non-overlapping literals in *message*, ordered by position."""
+    taken: List[Literal] = []
+
+    def free(a: int, b: int) -> bool:
+        return all(b <= lit.start or a >= lit.end for lit in taken)
+
+    for kind, pattern in _LITERAL_PATTERNS:
+        for m in re.finditer(pattern, message):
+            if free(m.start(), m.end()):
+                value = m.group(0)[1:-1] if kind == "str" else m.group(0)
+                taken.append(Literal(kind, value, m.start(), m.end()))
+    for m in _WORD_RE.finditer(message):
+        if m.group(0) in plan_strings and free(m.start(), m.end()):
+            taken.append(Literal("word", m.group(0), m.start(), m.end()))
+    return sorted(taken, key=lambda lit: lit.start)
+
+
+def _sql_literal_sub(sql: str, value: str, kind: str, placeholder: str) -> Tuple[str, int]:
+    """Replace *value* where it occurs as a SQL literal of the right kind;
+    returns the new SQL and the number of replacements."""
+    if kind == "num":
+        # numbers outside string literals only
+        parts = re.split(r"('(?:[^']|'')*')", sql)
+        pat = re.compile(rf"(?<![\w.]){re.escape(value)}(?![\w.])")
+        out, n = [], 0
+        for p in parts:
+            if not p.startswith("'"):
+                p, k = pat.subn(placeholder, p)
+                n += k
+            out.append(p)
+        return "".join(out), n
+    quoted = "'" + value.replace("'", "''") + "'"
+    return sql.replace(quoted, f"'{placeholder}'"), sql.count(quoted)
+
+
+def _templatize_plan(tool_calls: List[Dict[str, Any]], literals: List[Literal]) -> Tuple[str, List[int]]:
+    """Plan JSON with placeholders, and the indexes of literals that became slots.
+
+    Raises :class:`_Ambiguous` when a number occurs more than once in the plan.
+    """
+    used: List[int] = []
+    counts = [0] * len(literals)
+    calls = json.loads(json.dumps(tool_calls))
+    for call in calls:
+        args = call.get("arguments", {})
+        for key, val in list(args.items()):
+            if not isinstance(val, str):
+                continue
+            new = val
+            for i, lit in enumerate(literals):
+                ph = f"{{{{slot:{i}}}}}"
+                if key == "sql":
+                    new, n = _sql_literal_sub(new, lit.value, lit.kind, ph)
+                elif lit.kind == "num":
+                    new, n = re.subn(rf"(?<![\w.]){re.escape(lit.value)}(?![\w.])", ph, new)
+                else:
+                    n = new.count(lit.value)
+                    new = new.replace(lit.value, ph)
+                counts[i] += n
+                if n and i not in used:
+                    used.append(i)
+            args[key] = new
+    for i, lit in enumerate(literals):
+        if lit.kind == "num" and counts[i] > 1:
+            raise _Ambiguous(f"{lit.value} occurs {counts[i]} times in the plan")
+    return json.dumps(calls, ensure_ascii=False), used
+
+
+def _word_choices(tool_calls: List[Dict[str, Any]], value: str, tenant_id: str) -> List[str]:
+    """Distinct values of the column(s) *value* is compared with in the plan's SQL.
+
+    Raises :class:`_Ambiguous` when the column cannot be found, has too many
+    values, or does not contain *value*.
+    """
+    quoted = re.escape("'" + value.replace("'", "''") + "'")
+    compared = re.compile(
+        rf"(?:\"?(\w+)\"?\.)?\"?(\w+)\"?\s*(?:=|!=|<>|\bIN\s*\((?:[^)]*?,\s*)?)\s*{quoted}", re.IGNORECASE
+    )
+    choices: set = set()
+    try:
+        with tenants.registry.get(tenant_id).pool.connection() as conn:
+            for call in tool_calls:
+                sql = call.get("arguments", {}).get("sql")
+                if not isinstance(sql, str):
+                    continue
+                aliases: Dict[str, str] = {}
+                for table, alias in _TABLE_RE.findall(sql):
+                    aliases[table.lower()] = table
+                    if alias:
+                        aliases[alias.lower()] = table
+                for qualifier, column in compared.findall(sql):
+                    tables = [aliases[qualifier.lower()]] if qualifier else sorted(set(aliases.values()))
+                    for table in tables:
+                        if qualifier and qualifier.lower() not in aliases:
+                            continue
+                        have = {r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')}
+                        if column not in have:
+                            continue
+                        rows = conn.execute(
+                            f'SELECT DISTINCT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL LIMIT ?',
+                            (_MAX_CHOICES + 1,),
+                        ).fetchall()
+                        if len(rows) > _MAX_CHOICES:
+                            raise _Ambiguous(f"{table}.{column} has too many values")
+                        choices.update(str(r[0]) for r in rows)
+    except (sqlite3.Error, KeyError) as exc:  # KeyError: UnknownTenant
+        raise _Ambiguous(str(exc)) from exc
+    if value not in choices:
+        raise _Ambiguous(f"no column compared with '{value}'")
+    return sorted(choices)
+
+
+def _pattern(message: str, literals: List[Literal], slots: List[int]) -> Tuple[str, List[str]]:
+    """Regex source for *message* with slot literals as capture groups."""
+    out, pos, kinds = [], 0, []
+    for i, lit in enumerate(literals):
+        if i not in slots:
+            continue
+        out.append(re.escape(message[pos:lit.start]))
+        out.append(_SLOT_REGEX[lit.kind])
+        kinds.append(lit.kind)
+        pos = lit.end
+    out.append(re.escape(message[pos:]))
+    # tolerate whitespace differences
+    source = re.sub(r"(\\ )+", r"\\s+", "".join(out))
+    return r"\s*" + source + r"\s*", kinds
+
+
+def _bind(plan: str, values: List[str], kinds: List[str], slot_ids: List[int]) -> List[Dict[str, Any]]:
+    calls = json.loads(plan)
+    for call in calls:
+        args = call.get("arguments", {})
+        for key, val in list(args.items()):
+            if not isinstance(val, str):
+                continue
+            for slot_id, value, kind in zip(slot_ids, values, kinds):
+                ph = f"{{{{slot:{slot_id}}}}}"
+                if key == "sql" and kind != "num":
+                    value = value.replace("'", "''")
+                val = val.replace(ph, value)
+            args[key] = val
+    return calls
+
+
+def _canonical(word: str, choices: List[str]) -> Optional[str]:
+    """*word* as spelled in *choices* (exact match first, then ignoring case)."""
+    if word in choices:
+        return word
+    folded = word.casefold()
+    return next((c for c in choices if c.casefold() == folded), None)
+
+
+class PlanTemplateStore:
+    """Learns and matches plan templates; persisted in ``AGENT_STORE_PATH``."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._templates: Optional[List[PlanTemplate]] = None
+        self._migrated = False
+
+    def _conn(self) -> sqlite3.Connection:
+        AGENT_STORE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(AGENT_STORE_PATH, timeout=5)
+        conn.executescript(_SCHEMA)
+        if not self._migrated:
+            cols = {r[1] for r in conn.execute("PRAGMA table_info(plan_template)")}
+            if "tenant_id" not in cols:
+                conn.executescript(_MIGRATE.format(create=_SCHEMA))
+            elif "choices" not in cols:  # templates learned before word slots stored their values
+                conn.execute("ALTER TABLE plan_template ADD COLUMN choices TEXT NOT NULL DEFAULT '{}'")
+            self._migrated = True
+        return conn
+
+    def _load(self) -> List[PlanTemplate]:
+        if self._templates is None:
+            with self._conn() as conn:
+                rows = conn.execute(
+                    "SELECT id, tenant_id, pattern, slots, plan, intent, choices FROM plan_template "
+                    "ORDER BY hits DESC, id DESC"
+                ).fetchall()
+            self._templates = [
+                PlanTemplate(i, t, p, json.loads(s), plan, intent, re.compile(p, re.IGNORECASE), json.loads(c))
+                for i, t, p, s, plan, intent, c in rows
+            ]
+        return self._templates
+
+    def learn(self, state: AgentState) -> Optional[int]:
+        """Store a template from a run that succeeded on the first attempt."""
+        ok = bool(state.tool_results) and all(
+            r.get("result", {}).get("success", False) for r in state.tool_results
+        )
+        if not ok or state.had_retry or not state.selected_tools:
+            return None
+        tenant_id = state.tenant_id or DEFAULT_TENANT
+        literals = extract_literals(state.user_message, _sql_strings(state.selected_tools))
+        try:
+            plan, used = _templatize_plan(state.selected_tools, literals)
+            used.sort()
+            choices = {str(i): _word_choices(state.selected_tools, literals[i].value, tenant_id)
+                       for i in used if literals[i].kind == "word"}
+        except _Ambiguous:
+            return None
+        pattern, kinds = _pattern(state.user_message, literals, used)
+        slots = [f"{k}:{i}" for k, i in zip(kinds, used)]
+        with self._lock:
+            with self._conn() as conn:
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO plan_template (tenant_id, pattern, slots, plan, intent, choices, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (tenant_id, pattern, json.dumps(slots), plan, state.intent or "query_data",
+                     json.dumps(choices, ensure_ascii=False), time.time()),
+                )
+            self._templates = None
+        return cur.lastrowid if cur.rowcount else None
+
+    def match(self, message: str, tenant_id: Optional[str] = None
+              ) -> Optional[Tuple[PlanTemplate, List[Dict[str, Any]]]]:
+        """Find one of the tenant's templates (default: the current request's)
+        for *message* and return it with the bound plan."""
+        if tenant_id is None:
+            tenant_id = context.tenant_id()
+        tenant_id = tenant_id or DEFAULT_TENANT
+        with self._lock:
+            templates = [t for t in self._load() if t.tenant_id == tenant_id]
+        for tpl in templates:
+            m = tpl.regex.fullmatch(message)
+            if not m:
+                continue
+            groups = m.groups()
+            values, kinds, slot_ids, gi = [], [], [], 0
+            for slot in tpl.slots:
+                kind, slot_id = slot.split(":")
+                if kind == "str":  # two alternative groups: '…' or "…"
+                    value = groups[gi] if groups[gi] is not None else groups[gi + 1]
+                    gi += 2
+                else:
+                    value = groups[gi]
+                    gi += 1
+                if kind == "word":
+                    value = _canonical(value, tpl.choices.get(slot_id) or [])
+                    if value is None:
+                        break
+                values.append(value)
+                kinds.append(kind)
+                slot_ids.append(int(slot_id))
+            if len(values) < len(tpl.slots):
+                continue  # a word outside its column's values
+            try:
+                plan = _bind(tpl.plan, values, kinds, slot_ids)
+            except (ValueError, TypeError):
+                continue
+            with self._lock, self._conn() as conn:
+                conn.execute("UPDATE plan_template SET hits = hits + 1 WHERE id = ?", (tpl.id,))
+            return tpl, plan
+        return None
+
+    def stats(self, limit: int = 20) -> Dict[str, Any]:
+        """Stored templates ranked by hits."""
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT id, tenant_id, pattern, slots, intent, hits FROM plan_template "
+                "ORDER BY hits DESC, id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+            total, hits = conn.execute("SELECT COUNT(*), IFNULL(SUM(hits), 0) FROM plan_template").fetchone()
+        return {
+            "templates": total,
+            "total_hits": hits,
+            "top": [
+                {"id": i, "tenant_id": t, "pattern": p, "slots": json.loads(s), "intent": intent, "hits": h}
+                for i, t, p, s, intent, h in rows
+            ],
+        }
+
+
+plan_templates = PlanTemplateStore()
@@ -11,18 +11,143 @@ load_dotenv()
 # ── Paths ──────────────────────────────────────────────────────────
 BASE_DIR = Path(__file__).resolve().parent.parent
 DB_PATH = Path(os.getenv("CRM_DB_PATH", str(BASE_DIR / "data" / "crmarena_data.db")))
+# Derived copy with advisor indexes (see db.advisor).  Point CRM_DB_PATH at it
+# and CRM_SOURCE_DB_PATH at the original, which is never modified.
+SOURCE_DB_PATH = Path(os.getenv("CRM_SOURCE_DB_PATH", str(DB_PATH)))
+OPTIMIZED_DB_PATH = Path(os.getenv("OPTIMIZED_DB_PATH", str(BASE_DIR / "data" / "crmarena_data.optimized.db")))
+# How often the server checks the source for changes to fold into the summary tables
+AGG_REFRESH_SECONDS = float(os.getenv("AGG_REFRESH_SECONDS", "60"))
+# Serve reads from a shared in-memory copy of DB_PATH (see db.memory).
+DB_IN_MEMORY = os.getenv("CRM_DB_IN_MEMORY", "0") == "1"
+DB_RELOAD_CHECK_SECONDS = float(os.getenv("CRM_DB_RELOAD_CHECK", "5"))
+# Connections to the CRM DB kept open and shared by the tools (see db.pool),
+# and how long a caller waits for a free one
+DB_POOL_SIZE = int(os.getenv("CRM_DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("CRM_DB_POOL_TIMEOUT", "10"))
+# How long the schema catalog used in prompts / fast-path grammar is reused
+SCHEMA_CACHE_SECONDS = float(os.getenv("SCHEMA_CACHE_SECONDS", "300"))
+
+# ── Tenants ────────────────────────────────────────────────────────
+# Tenant "<id>" reads TENANT_DB_DIR/<id>.db; the default tenant reads
+# CRM_DB_PATH (see db.tenants).  Open tenants beyond TENANT_MAX_OPEN, or
+# idle longer than TENANT_IDLE_SECONDS, are closed least recently used first.
+TENANT_DB_DIR = Path(os.getenv("TENANT_DB_DIR", str(BASE_DIR / "data" / "tenants")))
+TENANT_MAX_OPEN = int(os.getenv("TENANT_MAX_OPEN", "64"))
+TENANT_IDLE_SECONDS = float(os.getenv("TENANT_IDLE_SECONDS", "600"))
+TENANT_POOL_SIZE = int(os.getenv("TENANT_POOL_SIZE", "2"))
+# query_database results reused per tenant (0 disables)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_SECONDS = float(os.getenv("RESULT_CACHE_SECONDS", "60"))
+
+# ── Search ─────────────────────────────────────────────────────────
+FTS_DB_PATH = Path(os.getenv("FTS_DB_PATH", str(BASE_DIR / "data" / "crm_fts.db")))
+FTS_REFRESH_SECONDS = float(os.getenv("FTS_REFRESH_SECONDS", "60"))
+SIMILAR_INDEX_DIR = Path(os.getenv("SIMILAR_INDEX_DIR", str(BASE_DIR / "data" / "similar_cases")))
+# Hashed feature width for similar-case vectors.  Words and character
+# n-grams share these buckets, so a narrow index collides heavily and ranks
+# poorly; each case costs dim × 4 bytes on disk (and in RAM while building).
+SIMILAR_DIM = int(os.getenv("SIMILAR_DIM", "1024"))
+
+# ── Reports ────────────────────────────────────────────────────────
+REPORTS_DIR = Path(os.getenv("REPORTS_DIR", str(BASE_DIR / "data" / "reports")))
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))  # render processes
+
+# ── Delivery (outbox for email / Slack tools) ──────────────────────
+OUTBOX_PATH = Path(os.getenv("OUTBOX_PATH", str(BASE_DIR / "data" / "outbox.db")))
+EMAIL_TRANSPORT = os.getenv("EMAIL_TRANSPORT", "simulated")  # simulated | smtp
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "1025"))
+SMTP_FROM = os.getenv("SMTP_FROM", "crm-copilot@localhost")
+SLACK_TRANSPORT = os.getenv("SLACK_TRANSPORT", "simulated")  # simulated | webhook
+SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL", "")
+DELIVERY_BATCH_SIZE = int(os.getenv("DELIVERY_BATCH_SIZE", "20"))
+DELIVERY_MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", "5"))
+DELIVERY_BACKOFF_SECONDS = float(os.getenv("DELIVERY_BACKOFF_SECONDS", "2"))
+DELIVERY_LEASE_SECONDS = float(os.getenv("DELIVERY_LEASE_SECONDS", "120"))  # claim before others may retake it
+EMAIL_RATE_PER_MINUTE = float(os.getenv("EMAIL_RATE_PER_MINUTE", "60"))
+SLACK_RATE_PER_MINUTE = float(os.getenv("SLACK_RATE_PER_MINUTE", "30"))
 
 # ── LLM ────────────────────────────────────────────────────────────
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Cheaper model the intent step falls back to when GEMINI_MODEL is failing ("" disables)
+GEMINI_FALLBACK_MODEL = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-2.5-flash-lite")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "")  # e.g. the local stand-in (agent.gemini_standin)
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))  # per attempt
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", "0.5"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))  # keep-alive connections to Gemini
+# Send a second copy of a call still running after the observed p95 latency
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "5"))  # until p95 is known
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))  # consecutive failures
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
 
 # ── Agent ──────────────────────────────────────────────────────────
 MAX_ROWS = int(os.getenv("AGENT_MAX_ROWS", "50"))
 MAX_RETRIES = int(os.getenv("AGENT_MAX_RETRIES", "2"))
+AGENT_STORE_PATH = Path(os.getenv("AGENT_STORE_PATH", str(BASE_DIR / "data" / "agent_store.db")))
+FEW_SHOT_K = int(os.getenv("AGENT_FEW_SHOT_K", "3"))  # 0 disables example retrieval
+PLAN_TEMPLATES = os.getenv("AGENT_PLAN_TEMPLATES", "1") == "1"
+FAST_PATH = os.getenv("AGENT_FAST_PATH", "1") == "1"
+# llm: always ask Gemini · auto: local template when the result shape allows · template: never ask
+RESPONSE_MODE = os.getenv("AGENT_RESPONSE_MODE", "auto")
+# Repeat side-effect calls (same session + args) replay the earlier result
+# within one request, or within this many seconds across requests.
+IDEMPOTENCY_WINDOW_SECONDS = float(os.getenv("AGENT_IDEMPOTENCY_WINDOW", "300"))
+# Share one in-flight pipeline / Gemini call / SQL statement between identical concurrent requests
+COALESCE = os.getenv("AGENT_COALESCE", "1") == "1"
+# Time budget per chat request (0 = none) and the budget left below which the
+# pipeline stops retrying / renders the reply locally instead of asking Gemini
+REQUEST_BUDGET_SECONDS = float(os.getenv("AGENT_REQUEST_BUDGET", "20"))
+RETRY_MIN_SECONDS = float(os.getenv("AGENT_RETRY_MIN_SECONDS", "8"))
+RESPONSE_LLM_MIN_SECONDS = float(os.getenv("AGENT_RESPONSE_LLM_MIN_SECONDS", "4"))
+# Save the pipeline state after every node so a dropped run can be resumed (agent.checkpoints)
+CHECKPOINTS = os.getenv("AGENT_CHECKPOINTS", "1") == "1"
+CHECKPOINT_TTL_SECONDS = float(os.getenv("AGENT_CHECKPOINT_TTL", "86400"))
+# Start tool planning alongside intent classification (agent.speculation)
+SPECULATIVE_PLANNING = os.getenv("AGENT_SPECULATIVE_PLANNING", "0") == "1"
+
+# ── Startup ────────────────────────────────────────────────────────
+# Warm the Gemini client, schema catalog and DB in the background after the
+# port opens (see warmup); 0 leaves everything to the first request.
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+
+# ── Batch ──────────────────────────────────────────────────────────
+# POST /api/chat/batch and python -m agent.batch: items run at once / items per batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+# ── MCP server ─────────────────────────────────────────────────────
+# python -m mcp.crm_server: transport (stdio | streamable-http), worker
+# threads for the blocking tools, and per-tool concurrency limits
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "stdio")
+MCP_HOST = os.getenv("MCP_HOST", "127.0.0.1")
+MCP_PORT = int(os.getenv("MCP_PORT", "8040"))
+MCP_WORKERS = int(os.getenv("MCP_WORKERS", "16"))
+MCP_TOOL_CONCURRENCY = os.getenv("MCP_TOOL_CONCURRENCY", "query_database=8,generate_report=2,find_similar_cases=4")
+MCP_TOOL_CONCURRENCY_DEFAULT = int(os.getenv("MCP_TOOL_CONCURRENCY_DEFAULT", "4"))
 
 # ── Session ────────────────────────────────────────────────────────
 SESSION_TIMEOUT_SECONDS = int(os.getenv("SESSION_TIMEOUT", "300"))  # 5 min
 MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "20"))
 
+# ── Usage ──────────────────────────────────────────────────────────
+# Token budgets (0 = unlimited): per session, and for all sessions per UTC
+# day.  When one is spent: reject (HTTP 429) or fast_path (answer without Gemini).
+USAGE_SESSION_TOKEN_BUDGET = int(os.getenv("USAGE_SESSION_TOKEN_BUDGET", "0"))
+USAGE_GLOBAL_TOKEN_BUDGET = int(os.getenv("USAGE_GLOBAL_TOKEN_BUDGET", "0"))
+USAGE_BUDGET_ACTION = os.getenv("USAGE_BUDGET_ACTION", "fast_path")  # reject | fast_path
+# USD per million tokens, for the cost estimate (GEMINI_MODEL list prices)
+USAGE_PROMPT_COST_PER_1M = float(os.getenv("USAGE_PROMPT_COST_PER_1M", "0.30"))
+USAGE_RESPONSE_COST_PER_1M = float(os.getenv("USAGE_RESPONSE_COST_PER_1M", "2.50"))
+# The ledger is written to AGENT_STORE_PATH every this many changed rows / seconds
+USAGE_FLUSH_ROWS = int(os.getenv("USAGE_FLUSH_ROWS", "50"))
+USAGE_FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", "10"))
+
 # ── Rate Limiting ──────────────────────────────────────────────────
 RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT", "10"))
+
+# ── Query Log ──────────────────────────────────────────────────────
+QUERY_LOG_PATH = Path(os.getenv("QUERY_LOG_PATH", str(BASE_DIR / "data" / "query_log.db")))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))  # log statements at/over this
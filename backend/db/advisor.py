@@ -0,0 +1,316 @@
+"""Offline index advisor for the CRM database.
+
+Reads the query shapes recorded by :mod:`db.querylog` (plus the scenario
+workload in :mod:`db.workload`), proposes composite / covering indexes for
+their filter, join, group and sort columns, keeps only those that
+``EXPLAIN QUERY PLAN`` shows the planner actually using, and builds them into
+a derived copy of the database at ``OPTIMIZED_DB_PATH`` together with the
+summary tables from :mod:`db.aggregates`.  The source file is opened
+read-only and never modified.
+
+CLI::
+
+    python -m db.advisor                 # propose, verify, build the copy
+    python -m db.advisor --dry-run       # only print proposals
+    python -m db.advisor --benchmark     # build, then time scenarios before/after
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import OPTIMIZED_DB_PATH, SOURCE_DB_PATH
+from db import aggregates, querylog
+from db.workload import SCENARIO_SQL
+
+MAX_INDEX_COLUMNS = 5
+
+_CLAUSE_RE = re.compile(
+    r"\b(WHERE|GROUP\s+BY|ORDER\s+BY|HAVING|LIMIT|ON)\b", re.IGNORECASE
+)
+_TABLE_REF_RE = re.compile(
+    r"\b(?:FROM|JOIN)\s+\"?(\w+)\"?(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE
+)
+_COLUMN_RE = re.compile(r"(?:\"?(\w+)\"?\.)?\"?([A-Za-z_]\w*)\"?")
+_PREDICATE_RE = re.compile(
+    r"(?:\"?(\w+)\"?\.)?\"?([A-Za-z_]\w*)\"?\s*"
+    r"(=|==|!=|<>|>=|<=|>|<|\bIN\b|\bLIKE\b|\bBETWEEN\b|\bIS\b)",
+    re.IGNORECASE,
+)
+_JOIN_EQ_RE = re.compile(
+    r"(?:\"?(\w+)\"?\.)?\"?([A-Za-z_]\w*)\"?\s*=\s*(?:\"?(\w+)\"?\.)?\"?([A-Za-z_]\w*)\"?"
+)
+_STAR_RE = re.compile(r"(?:^|[,\s])(?:\"?\w+\"?\.)?\*(?=\s*(?:,|$))")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_KEYWORDS = {
+    "where", "join", "on", "group", "order", "limit", "left", "right", "inner",
+    "outer", "cross", "natural", "using", "having", "union", "select", "as",
+}
+
+
+@dataclass
+class Candidate:
+    """A proposed index and the queries it is meant to serve."""
+    table: str
+    columns: Tuple[str, ...]
+    queries: List[str] = field(default_factory=list)
+    verified: bool = False
+
+    @property
+    def name(self) -> str:
+        cols = "_".join(c.lower() for c in self.columns)
+        name = f"ix_{self.table.lower()}_{cols}"
+        if len(name) <= 60:
+            return name
+        # too long: shorten, but keep distinct column lists distinct
+        key = "\0".join((self.table, *self.columns))
+        digest = hashlib.sha1(key.encode()).hexdigest()[:8]
+        return f"{name[:51]}_{digest}"
+
+    def ddl(self) -> str:
+        cols = ", ".join(f'"{c}"' for c in self.columns)
+        return f'CREATE INDEX IF NOT EXISTS "{self.name}" ON "{self.table}" ({cols})'
+
+
+# ── Query analysis ────────────────────────────────────────────────
+
+def _table_columns(conn: sqlite3.Connection) -> Dict[str, List[str]]:
+    tables = [
+        r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+        )
+    ]
+    return {t: [r[1] for r in conn.execute(f'PRAGMA table_info("{t}")')] for t in tables}
+
+
+def _clauses(sql: str) -> Dict[str, str]:
+    """Split *sql* into coarse clauses keyed by keyword (select/where/on/...)."""
+    parts: Dict[str, str] = {"select": ""}
+    pos, key = 0, "select"
+    for m in _CLAUSE_RE.finditer(sql):
+        parts[key] = parts.get(key, "") + " " + sql[pos:m.start()]
+        key = " ".join(m.group(1).lower().split())
+        pos = m.end()
+    parts[key] = parts.get(key, "") + " " + sql[pos:]
+    return parts
+
+
+def _resolve(
+    qualifier: Optional[str],
+    column: str,
+    aliases: Dict[str, str],
+    catalog: Dict[str, List[str]],
+) -> Optional[Tuple[str, str]]:
+    """Map ``[qualifier.]column`` to ``(table, canonical column)`` or ``None``."""
+    if qualifier:
+        table = aliases.get(qualifier.lower())
+        candidates = [table] if table else []
+    else:
+        candidates = list(dict.fromkeys(aliases.values()))
+    for table in candidates:
+        for col in catalog.get(table, []):
+            if col.lower() == column.lower():
+                return table, col
+    return None
+
+
+def analyse(sql: str, catalog: Dict[str, List[str]]) -> Dict[str, Dict[str, List[str]]]:
+    """Per table, collect equality / range / group / order / referenced columns."""
+    body = _STRING_RE.sub("?", sql)
+    table_names = {t.lower(): t for t in catalog}
+    aliases: Dict[str, str] = {}
+    for m in _TABLE_REF_RE.finditer(body):
+        table = table_names.get(m.group(1).lower())
+        if not table:
+            continue
+        aliases[table.lower()] = table
+        alias = m.group(2)
+        if alias and alias.lower() not in _KEYWORDS:
+            aliases[alias.lower()] = table
+
+    usage: Dict[str, Dict[str, List[str]]] = {}
+
+    def add(kind: str, ref: Optional[Tuple[str, str]]) -> None:
+        if ref is None:
+            return
+        cols = usage.setdefault(ref[0], {}).setdefault(kind, [])
+        if ref[1] not in cols:
+            cols.append(ref[1])
+
+    clauses = _clauses(body)
+    for key in ("where", "on", "having"):
+        for m in _PREDICATE_RE.finditer(clauses.get(key, "")):
+            op = m.group(3).upper()
+            kind = "eq" if op in ("=", "==", "IN", "IS") else "range"
+            add(kind, _resolve(m.group(1), m.group(2), aliases, catalog))
+    for m in _JOIN_EQ_RE.finditer(clauses.get("on", "")):
+        add("eq", _resolve(m.group(3), m.group(4), aliases, catalog))
+    for key, kind in (("group by", "group"), ("order by", "order")):
+        for m in _COLUMN_RE.finditer(clauses.get(key, "")):
+            add(kind, _resolve(m.group(1), m.group(2), aliases, catalog))
+    select = re.split(r"\bFROM\b", clauses.get("select", ""), maxsplit=1, flags=re.IGNORECASE)[0]
+    star = bool(_STAR_RE.search(select))
+    for m in _COLUMN_RE.finditer(select):
+        add("select", _resolve(m.group(1), m.group(2), aliases, catalog))
+    for table in usage:
+        usage[table]["star"] = ["*"] if star else []
+    return usage
+
+
+def propose(sql: str, catalog: Dict[str, List[str]]) -> List[Candidate]:
+    """Index candidates for one query: equality → group/order → range, then
+    the remaining referenced columns appended to make the index covering."""
+    out = []
+    for table, use in analyse(sql, catalog).items():
+        cols: List[str] = []
+        for kind in ("eq", "group", "order"):
+            cols += [c for c in use.get(kind, []) if c not in cols]
+        cols += [c for c in use.get("range", [])[:1] if c not in cols]
+        if not cols or cols == ["Id"]:
+            continue
+        if not use.get("star"):
+            extra = [c for c in use.get("select", []) + use.get("range", []) if c not in cols]
+            if len(cols) + len(extra) <= MAX_INDEX_COLUMNS:
+                cols += extra
+        out.append(Candidate(table, tuple(cols[:MAX_INDEX_COLUMNS]), [sql]))
+    return out
+
+
+def _existing_prefixes(conn: sqlite3.Connection, table: str) -> Set[Tuple[str, ...]]:
+    prefixes = set()
+    for idx in conn.execute(f'PRAGMA index_list("{table}")'):
+        cols = tuple(r[2] for r in conn.execute(f'PRAGMA index_info("{idx[1]}")'))
+        for i in range(1, len(cols) + 1):
+            prefixes.add(cols[:i])
+    return prefixes
+
+
+def collect_candidates(conn: sqlite3.Connection, queries: List[str]) -> List[Candidate]:
+    """Merge per-query proposals; drop ones already served by an index."""
+    catalog = _table_columns(conn)
+    merged: Dict[Tuple[str, Tuple[str, ...]], Candidate] = {}
+    for sql in queries:
+        for cand in propose(sql, catalog):
+            key = (cand.table, cand.columns)
+            if key in merged:
+                merged[key].queries.extend(cand.queries)
+            else:
+                merged[key] = cand
+    # A candidate that is a leading prefix of a wider one is served by it.
+    for cand in list(merged.values()):
+        for other in merged.values():
+            if (other is not cand and other.table == cand.table
+                    and other.columns[:len(cand.columns)] == cand.columns):
+                other.queries.extend(cand.queries)
+                del merged[(cand.table, cand.columns)]
+                break
+    existing: Dict[str, Set[Tuple[str, ...]]] = {}
+    kept = []
+    for cand in merged.values():
+        if cand.table not in existing:
+            existing[cand.table] = _existing_prefixes(conn, cand.table)
+        if cand.columns not in existing[cand.table]:
+            kept.append(cand)
+    return kept
+
+
+def verify(conn: sqlite3.Connection, cand: Candidate) -> bool:
+    """Create *cand* on *conn*; keep it only if a target query's plan uses it."""
+    conn.execute(cand.ddl())
+    for sql in cand.queries:
+        try:
+            plan = querylog.explain(conn, sql)
+        except sqlite3.Error:
+            continue
+        used = re.compile(rf"INDEX {re.escape(cand.name)}(?!\w)")  # not a longer index's name
+        if any(used.search(detail) for detail in plan):
+            cand.verified = True
+            return True
+    conn.execute(f'DROP INDEX IF EXISTS "{cand.name}"')
+    return False
+
+
+# ── Build ─────────────────────────────────────────────────────────
+
+def workload_queries() -> List[str]:
+    """Logged slow-query samples plus the scenario workload."""
+    logged = [s["sample_sql"] for s in querylog.top_shapes(limit=200)]
+    return logged + list(SCENARIO_SQL.values())
+
+
+def _open_source(path: Path) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def build_optimized(
+    source: Path = SOURCE_DB_PATH,
+    target: Path = OPTIMIZED_DB_PATH,
+    queries: Optional[List[str]] = None,
+) -> List[Candidate]:
+    """Copy *source* to *target* with verified indexes and summary tables.
+
+    Returns the indexes kept.
+
+    The copy is built beside *target* and swapped in with ``os.replace`` so
+    readers never see a half-built file.
+    """
+    queries = workload_queries() if queries is None else queries
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".building")
+    if tmp.exists():
+        tmp.unlink()
+
+    src = _open_source(source)
+    dst = sqlite3.connect(tmp)
+    try:
+        src.backup(dst)
+        candidates = collect_candidates(dst, queries)
+        kept = [c for c in candidates if verify(dst, c)]
+        dst.execute("ANALYZE")
+        dst.commit()
+    finally:
+        dst.close()
+        src.close()
+    aggregates.refresh(tmp, source)
+    os.replace(tmp, target)
+    return kept
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from db.workload import SUMMARY_SQL, print_comparison, run_benchmark
+
+    parser = argparse.ArgumentParser(description="Propose and build covering indexes.")
+    parser.add_argument("--source", type=Path, default=SOURCE_DB_PATH)
+    parser.add_argument("--target", type=Path, default=OPTIMIZED_DB_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="print proposals only")
+    parser.add_argument("--benchmark", action="store_true", help="time scenarios before/after")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        src = _open_source(args.source)
+        for cand in collect_candidates(src, workload_queries()):
+            print(f"{cand.ddl()};  -- serves {len(cand.queries)} quer(y/ies)")
+        src.close()
+        raise SystemExit(0)
+
+    built = build_optimized(args.source, args.target)
+    print(f"Built {args.target} with {len(built)} verified index(es):")
+    for cand in built:
+        print(f"  {cand.ddl()}")
+
+    if args.benchmark:
+        before = run_benchmark(lambda: _open_source(args.source))
+        after = run_benchmark(lambda: _open_source(args.target))
+        print()
+        print_comparison(before, after, ("source", "optimized"))
+        summary = run_benchmark(lambda: _open_source(args.target), SUMMARY_SQL)
+        print()
+        print("Aggregate questions: GROUP BY on source vs precomputed summary table")
+        print_comparison({k: before[k] for k in SUMMARY_SQL}, summary, ("group by", "summary"))
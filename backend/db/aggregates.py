@@ -0,0 +1,318 @@
+"""Materialised summary tables inside the derived (optimized) CRM database.
+
+The planner keeps writing GROUP BY queries that re-aggregate the whole
+``Order`` / ``Case`` tables for questions like "top 3 customers by order
+total".  This module maintains small ``agg_*`` tables in
+``OPTIMIZED_DB_PATH`` that answer those questions with an index lookup.
+
+Refresh is incremental: the source (``SOURCE_DB_PATH``) is attached
+read-only, rows appended since the last refresh (by ``rowid`` watermark) are
+copied into the derived base tables and folded into the aggregates with
+upserts.  If a source table shrank or rows below the watermark changed
+count, that table and its aggregates are rebuilt from scratch.  In-place
+updates of existing rows are not detected by the watermark — run with
+``--full`` after such edits.
+
+While the server runs on the derived copy, :func:`ensure_fresh` (called by
+the database tools) checks the source file's mtime / size at most every
+``AGG_REFRESH_SECONDS`` and, when it changed, refreshes in a background
+thread — the same scheme as the full-text index.
+
+CLI::
+
+    python -m db.aggregates           # incremental refresh
+    python -m db.aggregates --full    # rebuild everything
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import AGG_REFRESH_SECONDS, DB_PATH, OPTIMIZED_DB_PATH, SOURCE_DB_PATH
+
+# ── Summary table catalog (advertised to the planner) ─────────────
+
+AGGREGATE_TABLES: Dict[str, str] = {
+    "agg_account_order_totals": (
+        "per account; order_total = SUM(Quantity*UnitPrice) of its order items "
+        "(top customers by order value)"
+    ),
+    "agg_case_status_month": (
+        "cases per Status and month = 'YYYY-MM' of CreatedDate "
+        "(case counts by status / month)"
+    ),
+    "agg_agent_workload": (
+        "cases per OwnerId; open_cases = Status != 'Closed' (agent workload)"
+    ),
+}
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS agg_state (
+    source_table TEXT PRIMARY KEY,
+    max_rowid INTEGER NOT NULL,
+    row_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agg_account_order_totals (
+    AccountId TEXT PRIMARY KEY,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    item_count INTEGER NOT NULL DEFAULT 0,
+    order_total REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_agg_account_order_totals_total
+    ON agg_account_order_totals (order_total DESC);
+CREATE TABLE IF NOT EXISTS agg_case_status_month (
+    Status TEXT,
+    month TEXT,
+    case_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (Status, month)
+);
+CREATE TABLE IF NOT EXISTS agg_agent_workload (
+    OwnerId TEXT PRIMARY KEY,
+    total_cases INTEGER NOT NULL DEFAULT 0,
+    open_cases INTEGER NOT NULL DEFAULT 0,
+    escalated_cases INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Each delta statement folds rows with rowid > :wm of its source table into
+# the aggregate.  A full rebuild runs the same statements with :wm = 0 on an
+# emptied aggregate.
+_AGGREGATES: List[Tuple[str, str, List[str], str]] = [
+    (
+        "agg_account_order_totals", "Order", ["AccountId"],
+        """
+        INSERT INTO agg_account_order_totals (AccountId, order_count)
+        SELECT AccountId, COUNT(*) FROM main."Order"
+        WHERE rowid > :wm GROUP BY AccountId
+        ON CONFLICT (AccountId) DO UPDATE SET
+            order_count = order_count + excluded.order_count
+        """,
+    ),
+    (
+        "agg_account_order_totals", "OrderItem", ["OrderId", "Quantity", "UnitPrice"],
+        """
+        INSERT INTO agg_account_order_totals (AccountId, item_count, order_total)
+        SELECT o.AccountId, COUNT(*), TOTAL(oi.Quantity * oi.UnitPrice)
+        FROM main.OrderItem oi JOIN main."Order" o ON o.Id = oi.OrderId
+        WHERE oi.rowid > :wm GROUP BY o.AccountId
+        ON CONFLICT (AccountId) DO UPDATE SET
+            item_count = item_count + excluded.item_count,
+            order_total = order_total + excluded.order_total
+        """,
+    ),
+    (
+        "agg_case_status_month", "Case", ["Status", "CreatedDate"],
+        """
+        INSERT INTO agg_case_status_month (Status, month, case_count)
+        SELECT Status, substr(CreatedDate, 1, 7), COUNT(*) FROM main."Case"
+        WHERE rowid > :wm GROUP BY 1, 2
+        ON CONFLICT (Status, month) DO UPDATE SET
+            case_count = case_count + excluded.case_count
+        """,
+    ),
+    (
+        "agg_agent_workload", "Case", ["OwnerId", "Status"],
+        """
+        INSERT INTO agg_agent_workload (OwnerId, total_cases, open_cases, escalated_cases)
+        SELECT OwnerId, COUNT(*),
+               SUM(Status IS NOT 'Closed'), SUM(Status = 'Escalated')
+        FROM main."Case" WHERE rowid > :wm GROUP BY OwnerId
+        ON CONFLICT (OwnerId) DO UPDATE SET
+            total_cases = total_cases + excluded.total_cases,
+            open_cases = open_cases + excluded.open_cases,
+            escalated_cases = escalated_cases + excluded.escalated_cases
+        """,
+    ),
+]
+
+
+def _columns(conn: sqlite3.Connection, schema: str, table: str) -> List[str]:
+    return [r[1] for r in conn.execute(f'PRAGMA {schema}.table_info("{table}")')]
+
+
+def _supported(conn: sqlite3.Connection) -> List[Tuple[str, str, List[str], str]]:
+    """Aggregates whose source columns exist in this dataset."""
+    out = []
+    for agg in _AGGREGATES:
+        _, table, cols, _ = agg
+        have = set(_columns(conn, "src", table))
+        if have and set(cols) <= have:
+            out.append(agg)
+    return out
+
+
+def _table_state(conn: sqlite3.Connection, schema: str, table: str) -> Tuple[int, int]:
+    row = conn.execute(f'SELECT IFNULL(MAX(rowid), 0), COUNT(*) FROM {schema}."{table}"').fetchone()
+    return row[0], row[1]
+
+
+def _plan(conn: sqlite3.Connection, table: str, full: bool) -> Tuple[str, int]:
+    """Decide how to bring *table* up to date: ``(mode, watermark)``.
+
+    ``build`` means the base table is already in sync (a fresh copy) and
+    only the aggregates need computing.
+    """
+    stored = conn.execute(
+        "SELECT max_rowid, row_count FROM agg_state WHERE source_table = ?", (table,)
+    ).fetchone()
+    max_rowid, count = _table_state(conn, "src", table)
+    if stored is None and _table_state(conn, "main", table) == (max_rowid, count):
+        return "build", 0
+    if full or stored is None:
+        return "rebuild", 0
+    if (max_rowid, count) == tuple(stored):
+        return "unchanged", stored[0]
+    below = conn.execute(
+        f'SELECT COUNT(*) FROM src."{table}" WHERE rowid <= ?', (stored[0],)
+    ).fetchone()[0]
+    if below == stored[1] and max_rowid >= stored[0]:
+        return "append", stored[0]
+    return "rebuild", 0
+
+
+def refresh(
+    target: Path = OPTIMIZED_DB_PATH,
+    source: Path = SOURCE_DB_PATH,
+    full: bool = False,
+) -> Dict[str, str]:
+    """Bring base tables and ``agg_*`` tables in *target* up to date.
+
+    Returns ``{source_table: "unchanged" | "append" | "build" | "rebuild"}``.  All
+    changes are applied in one transaction, so readers see either the old or
+    the new state.
+    """
+    conn = sqlite3.connect(f"file:{target}", uri=True, isolation_level=None, timeout=30)
+    try:
+        conn.execute("ATTACH DATABASE ? AS src", (f"file:{source}?mode=ro",))
+        conn.executescript(_DDL)
+        aggregates = _supported(conn)
+        tables = list(dict.fromkeys(t for _, t, _, _ in aggregates))
+
+        conn.execute("BEGIN IMMEDIATE")
+        modes = {t: _plan(conn, t, full) for t in tables}
+        rebuilt_aggs = set()
+        for name, table, _, _ in aggregates:
+            if modes[table][0] in ("build", "rebuild"):
+                rebuilt_aggs.add(name)
+
+        # 1. Sync derived base tables with the source, keeping source rowids
+        #    so the watermarks apply to both.
+        for table, (mode, wm) in modes.items():
+            if mode in ("build", "unchanged"):
+                continue
+            if mode == "rebuild":
+                conn.execute(f'DELETE FROM main."{table}"')
+            cols = ", ".join(f'"{c}"' for c in _columns(conn, "src", table))
+            conn.execute(
+                f'INSERT INTO main."{table}" (rowid, {cols}) '
+                f'SELECT rowid, {cols} FROM src."{table}" WHERE rowid > ?',
+                (wm,),
+            )
+
+        # 2. Fold new rows into aggregates (or rebuild them).
+        for name in rebuilt_aggs:
+            conn.execute(f"DELETE FROM {name}")
+        for name, table, _, sql in aggregates:
+            mode, wm = modes[table]
+            if name in rebuilt_aggs:
+                conn.execute(sql, {"wm": 0})
+            elif mode == "append":
+                conn.execute(sql, {"wm": wm})
+
+        for table in tables:
+            max_rowid, count = _table_state(conn, "src", table)
+            conn.execute(
+                "INSERT OR REPLACE INTO agg_state (source_table, max_rowid, row_count) "
+                "VALUES (?, ?, ?)",
+                (table, max_rowid, count),
+            )
+        conn.execute("COMMIT")
+        return {t: m for t, (m, _) in modes.items()}
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def present(tables: List[str]) -> Dict[str, str]:
+    """Descriptions of the summary tables that exist in *tables*."""
+    return {t: d for t, d in AGGREGATE_TABLES.items() if t in tables}
+
+
+def _serving(db_path: Path) -> bool:
+    return OPTIMIZED_DB_PATH.exists() and db_path.resolve() == OPTIMIZED_DB_PATH.resolve()
+
+
+def _source_stamp() -> Tuple[int, int]:
+    st = os.stat(SOURCE_DB_PATH)
+    return st.st_mtime_ns, st.st_size
+
+
+_state_lock = threading.Lock()
+_refreshing = False
+_last_check = 0.0
+_refreshed_stamp: Optional[Tuple[int, int]] = None  # source mtime / size last folded in
+
+
+def refresh_if_serving(db_path: Path) -> Dict[str, str]:
+    """Incrementally refresh when *db_path* is the derived copy; else no-op."""
+    global _refreshed_stamp
+    if not _serving(db_path):
+        return {}
+    stamp = _source_stamp()  # before reading, so changes made meanwhile are caught next time
+    modes = refresh(OPTIMIZED_DB_PATH, SOURCE_DB_PATH)
+    _refreshed_stamp = stamp
+    return modes
+
+
+def _refresh_in_background(db_path: Path) -> None:
+    global _refreshing
+    try:
+        refresh_if_serving(db_path)
+    except (sqlite3.Error, OSError):
+        pass  # retried at the next check
+    finally:
+        with _state_lock:
+            _refreshing = False
+
+
+def ensure_fresh(db_path: Path = DB_PATH) -> bool:
+    """Start a background refresh if the source changed since the last one; never blocks.
+
+    Returns ``True`` while a refresh is running.
+    """
+    global _refreshing, _last_check
+    with _state_lock:
+        now = time.monotonic()
+        if _refreshing or now - _last_check < AGG_REFRESH_SECONDS:
+            return _refreshing
+        _last_check = now
+        try:
+            if not _serving(db_path) or _source_stamp() == _refreshed_stamp:
+                return False
+        except OSError:
+            return False  # source briefly missing (e.g. mid-replace)
+        _refreshing = True
+    threading.Thread(target=_refresh_in_background, args=(db_path,), daemon=True, name="agg-refresh").start()
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Refresh precomputed CRM summary tables.")
+    parser.add_argument("--source", type=Path, default=SOURCE_DB_PATH)
+    parser.add_argument("--target", type=Path, default=OPTIMIZED_DB_PATH)
+    parser.add_argument("--full", action="store_true", help="rebuild instead of incremental")
+    args = parser.parse_args()
+
+    if not args.target.exists():
+        raise SystemExit(f"{args.target} does not exist — build it with `python -m db.advisor`.")
+    for table, mode in refresh(args.target, args.source, args.full).items():
+        print(f"  {table:<12} {mode}")
@@ -0,0 +1,155 @@
+"""In-memory hot copy of the CRM database (opt-in via ``CRM_DB_IN_MEMORY=1``).
+
+The copilot only reads the CRM DB, and the file is small enough for RAM.
+:class:`HotCopy` loads ``DB_PATH`` into a named shared-cache in-memory
+database with the SQLite backup API; worker connections open the same URI
+and read straight from memory.
+
+When the file's mtime or size changes, a new generation is loaded under a
+fresh name in a background thread and swapped in atomically: new connections
+see the new data, connections already open keep reading the old generation
+until they close.  Connections are opened under the same lock as the swap, so
+none can race the old anchor's close and open a dropped generation's name
+(which SQLite would silently create as a new, empty database).  Loads are
+serialized, so concurrent first callers load the file once.
+
+CLI::
+
+    python -m db.memory --benchmark     # scenario queries, file vs memory
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from config import DB_PATH, DB_RELOAD_CHECK_SECONDS
+
+_generations = itertools.count(1)
+
+
+class HotCopy:
+    """A reloadable shared in-memory copy of one SQLite file."""
+
+    def __init__(self, path: Path, check_seconds: float = DB_RELOAD_CHECK_SECONDS):
+        self.path = path
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # one load at a time
+        self._uri: Optional[str] = None
+        self._anchor: Optional[sqlite3.Connection] = None  # keeps the memory DB alive
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._last_check = 0.0
+        self._reloading = False
+
+    def _file_stamp(self) -> Tuple[int, int]:
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    @property
+    def loaded(self) -> bool:
+        return self._uri is not None
+
+    def load(self) -> None:
+        """Load the file into a new generation and swap it in."""
+        with self._load_lock:
+            self._load()
+
+    def _load(self) -> None:
+        stamp = self._file_stamp()
+        uri = f"file:crm_hot_{next(_generations)}?mode=memory&cache=shared"
+        anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        src = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            src.backup(anchor)
+        finally:
+            src.close()
+
+        with self._lock:
+            old, self._anchor = self._anchor, anchor
+            self._uri, self._stamp = uri, stamp
+            self._last_check = time.monotonic()
+        if old is not None:
+            old.close()  # connections opened from it keep the generation alive
+
+    def _reload_in_background(self) -> None:
+        try:
+            self.load()
+        finally:
+            self._reloading = False
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if self._reloading or now - self._last_check < self.check_seconds:
+            return
+        self._last_check = now
+        try:
+            changed = self._file_stamp() != self._stamp
+        except OSError:
+            return  # file briefly missing (e.g. mid-replace) — keep serving
+        if changed:
+            self._reloading = True
+            threading.Thread(target=self._reload_in_background, daemon=True).start()
+
+    def _ensure_loaded(self) -> None:
+        if self._uri is None:
+            with self._load_lock:
+                if self._uri is None:
+                    self._load()
+        else:
+            self._maybe_reload()
+
+    def current(self) -> str:
+        """URI of the generation new connections should read (loading it if needed).
+
+        Only a tag: open connections with :meth:`connect`, which cannot race a swap.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if self._uri is None:
+                raise sqlite3.OperationalError("in-memory CRM database is closed")
+            return self._uri
+
+    def connect(self) -> sqlite3.Connection:
+        """A read-only connection to the current generation."""
+        self._ensure_loaded()
+        with self._lock:
+            if self._uri is None:
+                raise sqlite3.OperationalError("in-memory CRM database is closed")
+            conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._anchor is not None:
+                self._anchor.close()
+            self._anchor = self._uri = None
+
+
+hot_copy = HotCopy(DB_PATH)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from db.workload import print_comparison, run_benchmark
+
+    parser = argparse.ArgumentParser(description="Benchmark file vs in-memory CRM DB.")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    hot_copy.load()
+    print(f"Loaded {DB_PATH} into memory in {(time.perf_counter() - started) * 1000:.1f} ms")
+    if args.benchmark:
+        file_mode = run_benchmark(
+            lambda: sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True), repeat=args.repeat
+        )
+        memory_mode = run_benchmark(hot_copy.connect, repeat=args.repeat)
+        print_comparison(file_mode, memory_mode, ("file", "memory"))
@@ -0,0 +1,161 @@
+"""Bounded pool of read connections to the CRM database.
+
+``query_database`` / ``get_schema`` used to open a fresh connection per call
+and leave it for the garbage collector.  :data:`crm_pool` keeps at most
+``DB_POOL_SIZE`` connections open and hands them out one caller at a time;
+a caller that finds every connection busy waits up to ``DB_POOL_TIMEOUT``
+seconds, then gets :class:`PoolTimeout` (an ``sqlite3.OperationalError``, so
+the tools report it like any other database error).
+
+Connections are tagged with what they point at — the file's mtime / size,
+or the hot copy's generation with ``CRM_DB_IN_MEMORY=1`` — and an idle
+connection whose tag is stale is closed instead of reused, so a replaced
+file or reloaded hot copy is picked up on the next call.
+
+``python -m db.pool`` benchmarks pooled vs per-call connections.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from config import DB_IN_MEMORY, DB_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT_SECONDS
+from db.memory import hot_copy
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """No connection became free within the pool timeout."""
+
+
+class ConnectionPool:
+    """At most *size* connections from *factory*, reused while *target* is unchanged."""
+
+    def __init__(self, factory: Callable[[], sqlite3.Connection], target: Callable[[], str],
+                 size: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT_SECONDS):
+        self.factory, self.target = factory, target
+        self.size, self.timeout = size, timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle: List[Tuple[str, sqlite3.Connection]] = []
+        self._counts = {"acquired": 0, "created": 0, "reused": 0, "discarded": 0, "timeouts": 0}
+        self.in_use = 0
+        self.closed = False
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection; it is rolled back and returned on exit."""
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count("timeouts")
+            raise PoolTimeout(f"no database connection free within {self.timeout:g}s")
+        try:
+            tag = self.target()
+            conn = self._take(tag)
+            try:
+                yield conn
+            finally:
+                self._give_back(tag, conn)
+        finally:
+            self._slots.release()
+
+    def _take(self, tag: str) -> sqlite3.Connection:
+        stale: List[sqlite3.Connection] = []
+        conn = None
+        with self._lock:
+            self._counts["acquired"] += 1
+            self.in_use += 1
+            while self._idle:
+                idle_tag, idle = self._idle.pop()
+                if idle_tag == tag:
+                    conn = idle
+                    self._counts["reused"] += 1
+                    break
+                stale.append(idle)
+            self._counts["discarded"] += len(stale)
+        for old in stale:
+            old.close()
+        if conn is None:
+            conn = self.factory()
+            self._count("created")
+        return conn
+
+    def _give_back(self, tag: str, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self.in_use -= 1
+        try:
+            conn.set_progress_handler(None, 0)
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            self._count("discarded")
+            return
+        with self._lock:
+            if not self.closed:
+                self._idle.append((tag, conn))
+                return
+        conn.close()  # pool closed while the connection was out
+
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, []
+        for _, conn in idle:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counts, "size": self.size, "idle": len(self._idle), "in_use": self.in_use}
+
+
+def file_pool(path: Path, size: int = DB_POOL_SIZE) -> ConnectionPool:
+    """Read-only connections to the SQLite file at *path*."""
+    def tag() -> str:
+        st = os.stat(path)
+        return f"{st.st_mtime_ns}:{st.st_size}"
+
+    def connect() -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+    return ConnectionPool(connect, tag, size)
+
+
+if DB_IN_MEMORY:
+    crm_pool = ConnectionPool(hot_copy.connect, hot_copy.current)
+else:
+    crm_pool = file_pool(DB_PATH)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    parser = argparse.ArgumentParser(description="Benchmark pooled vs per-call CRM connections.")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--sql", default='SELECT COUNT(*) FROM "Case" WHERE Status = \'New\'')
+    args = parser.parse_args()
+
+    def pooled() -> None:
+        with crm_pool.connection() as conn:
+            conn.execute(args.sql).fetchall()
+
+    def per_call() -> None:
+        with (hot_copy.connect() if DB_IN_MEMORY else sqlite3.connect(DB_PATH)) as conn:
+            conn.execute(args.sql).fetchall()
+
+    for name, fn in (("per-call", per_call), ("pooled", pooled)):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as workers:
+            list(workers.map(lambda _: fn(), range(args.calls)))
+        elapsed = time.perf_counter() - started
+        print(f"{name:<9} {args.calls / elapsed:9.0f} calls/s   {elapsed * 1000 / args.calls:6.3f} ms/call")
+    print(crm_pool.stats())
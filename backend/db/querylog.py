@@ -0,0 +1,162 @@
+"""Slow-query log — records every statement over ``SLOW_QUERY_MS``.
+
+Each entry keeps the raw SQL, its normalized *shape* (literals replaced by
+``?``), duration, row count and the ``EXPLAIN QUERY PLAN`` output.  Entries
+live in a small SQLite file (``QUERY_LOG_PATH``) so the CRM database itself
+stays read-only.
+
+CLI::
+
+    python -m db.querylog              # rank query shapes by total time
+    python -m db.querylog --limit 20
+"""
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List
+
+from config import QUERY_LOG_PATH
+
+_lock = threading.Lock()
+_initialised = False
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS slow_query (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    shape TEXT NOT NULL,
+    sql TEXT NOT NULL,
+    duration_ms REAL NOT NULL,
+    row_count INTEGER NOT NULL,
+    plan TEXT NOT NULL,
+    full_scan INTEGER NOT NULL,
+    scanned_tables TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_slow_query_shape ON slow_query(shape);
+"""
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\"?[\w]+\"?)")
+
+
+def _log_conn() -> sqlite3.Connection:
+    global _initialised
+    QUERY_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(QUERY_LOG_PATH, timeout=5)
+    if not _initialised:
+        conn.executescript(_SCHEMA)
+        _initialised = True
+    return conn
+
+
+def normalize_sql(sql: str) -> str:
+    """Reduce *sql* to its shape: literals → ``?``, whitespace collapsed."""
+    shape = _STRING_RE.sub("?", sql)
+    shape = _NUMBER_RE.sub("?", shape)
+    shape = _IN_LIST_RE.sub("IN (?)", shape)
+    shape = " ".join(shape.split())
+    return shape.rstrip(";").strip()
+
+
+def full_scans(plan: List[str]) -> List[str]:
+    """Return tables that *plan* reads with a full scan (no index)."""
+    tables = []
+    for detail in plan:
+        m = _SCAN_RE.match(detail)
+        if m and "USING" not in detail and "CONSTANT ROW" not in detail:
+            tables.append(m.group(1).strip('"'))
+    return tables
+
+
+def explain(conn: sqlite3.Connection, sql: str) -> List[str]:
+    """``EXPLAIN QUERY PLAN`` detail lines for *sql* on *conn*."""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def record(conn: sqlite3.Connection, sql: str, duration_ms: float, row_count: int) -> None:
+    """Log a slow statement.  Never raises — logging must not break a query."""
+    try:
+        plan = explain(conn, sql)
+        scanned = full_scans(plan)
+        with _lock, _log_conn() as log:
+            log.execute(
+                "INSERT INTO slow_query (ts, shape, sql, duration_ms, row_count, plan, "
+                "full_scan, scanned_tables) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    time.time(),
+                    normalize_sql(sql),
+                    sql,
+                    round(duration_ms, 3),
+                    row_count,
+                    json.dumps(plan),
+                    1 if scanned else 0,
+                    ",".join(sorted(set(scanned))),
+                ),
+            )
+    except (sqlite3.Error, OSError):  # includes an unwritable QUERY_LOG_PATH directory
+        pass
+
+
+def top_shapes(limit: int = 20) -> List[Dict[str, Any]]:
+    """Rank logged query shapes by total time spent."""
+    with _lock, _log_conn() as log:
+        rows = log.execute(
+            """
+            SELECT shape,
+                   COUNT(*)            AS calls,
+                   SUM(duration_ms)    AS total_ms,
+                   AVG(duration_ms)    AS avg_ms,
+                   MAX(duration_ms)    AS max_ms,
+                   AVG(row_count)      AS avg_rows,
+                   MAX(full_scan)      AS full_scan,
+                   GROUP_CONCAT(scanned_tables) AS scanned_tables,
+                   MAX(id)             AS last_id
+            FROM slow_query
+            GROUP BY shape
+            ORDER BY total_ms DESC
+            LIMIT ?
+            """,
+            (limit,),
+        ).fetchall()
+        shapes = []
+        for shape, calls, total, avg, mx, avg_rows, scan, tables, last_id in rows:
+            sample_sql, plan = log.execute(
+                "SELECT sql, plan FROM slow_query WHERE id = ?", (last_id,)
+            ).fetchone()
+            shapes.append({
+                "shape": shape,
+                "calls": calls,
+                "total_ms": round(total, 2),
+                "avg_ms": round(avg, 2),
+                "max_ms": round(mx, 2),
+                "avg_rows": round(avg_rows, 1),
+                "full_scan": bool(scan),
+                # union over every call: plans can differ between calls of one shape
+                "scanned_tables": sorted({t for t in (tables or "").split(",") if t}),
+                "sample_sql": sample_sql,
+                "plan": json.loads(plan),
+            })
+    return shapes
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rank slow query shapes by total time.")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    shapes = top_shapes(args.limit)
+    if not shapes:
+        print(f"No slow queries logged in {QUERY_LOG_PATH}.")
+    for i, s in enumerate(shapes, 1):
+        flag = "  FULL SCAN: " + ", ".join(s["scanned_tables"]) if s["full_scan"] else ""
+        print(f"{i:>3}. total {s['total_ms']:>10.1f} ms  calls {s['calls']:>5}  "
+              f"avg {s['avg_ms']:>8.1f} ms  max {s['max_ms']:>8.1f} ms{flag}")
+        print(f"     {s['shape']}")
@@ -0,0 +1,416 @@
+"""Tokenizer-based SQL guard and rewriter for ``query_database``.
+
+Replaces the old string / regex passes (``_enforce_select``,
+``_ensure_limit``, ``_quote_reserved``) with one pass over the tokens:
+
+* rejects anything but a single ``SELECT`` (or ``WITH … SELECT``)
+  statement — a trailing ``;`` is allowed, a second statement is not;
+* double-quotes keywords used as identifiers — table names after
+  ``FROM`` / ``JOIN`` / a ``FROM``-list comma, and qualifiers such as
+  ``Case.Status`` — but never inside string literals, comments, ``CASE``
+  expressions or ``ORDER BY``;
+* clamps the outermost ``LIMIT`` to ``MAX_ROWS`` (adding one if missing);
+  ``LIMIT`` in subqueries, CTEs or string literals is left alone.  A count
+  with a bound parameter (``LIMIT ?``) cannot be repeated in the clamp
+  expression without changing the parameter count, so that statement is
+  wrapped in ``SELECT * FROM (…) LIMIT MAX_ROWS`` instead;
+* and produces a canonical form — comments dropped, whitespace collapsed,
+  keywords upper-cased, identifiers lower-cased / unquoted where that is
+  equivalent — for cache and single-flight keys.
+
+Results are memoised per (statement, limit), so repeated statements skip
+the pass entirely.  Errors are ``ValueError``, as before.
+
+CLI::
+
+    python -m db.sqlrewrite --benchmark          # vs the old regex functions
+    python -m db.sqlrewrite --fuzz 2000          # random SELECTs over the CRM schema
+"""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+from config import MAX_ROWS
+
+# SQLite keywords (https://sqlite.org/lang_keywords.html)
+KEYWORDS = frozenset("""
+ABORT ACTION ADD AFTER ALL ALTER ALWAYS ANALYZE AND AS ASC ATTACH AUTOINCREMENT BEFORE BEGIN
+BETWEEN BY CASCADE CASE CAST CHECK COLLATE COLUMN COMMIT CONFLICT CONSTRAINT CREATE CROSS
+CURRENT CURRENT_DATE CURRENT_TIME CURRENT_TIMESTAMP DATABASE DEFAULT DEFERRABLE DEFERRED
+DELETE DESC DETACH DISTINCT DO DROP EACH ELSE END ESCAPE EXCEPT EXCLUDE EXCLUSIVE EXISTS
+EXPLAIN FAIL FILTER FIRST FOLLOWING FOR FOREIGN FROM FULL GENERATED GLOB GROUP GROUPS HAVING
+IF IGNORE IMMEDIATE IN INDEX INDEXED INITIALLY INNER INSERT INSTEAD INTERSECT INTO IS ISNULL
+JOIN KEY LAST LEFT LIKE LIMIT MATCH MATERIALIZED NATURAL NO NOT NOTHING NOTNULL NULL NULLS OF
+OFFSET ON OR ORDER OTHERS OUTER OVER PARTITION PLAN PRAGMA PRECEDING PRIMARY QUERY RAISE
+RANGE RECURSIVE REFERENCES REGEXP REINDEX RELEASE RENAME REPLACE RESTRICT RETURNING RIGHT
+ROLLBACK ROW ROWS SAVEPOINT SELECT SET TABLE TEMP TEMPORARY THEN TIES TO TRANSACTION TRIGGER
+UNBOUNDED UNION UNIQUE UPDATE USING VACUUM VALUES VIEW VIRTUAL WHEN WHERE WINDOW WITH WITHOUT
+""".split())
+
+# Keywords that end a FROM clause at the current nesting level
+_AFTER_FROM = frozenset({"WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "WINDOW",
+                         "UNION", "EXCEPT", "INTERSECT", "SELECT", "VALUES"})
+_STATEMENTS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "VALUES"})
+
+# One alternative per token kind; tokenize() classifies a match by its first characters
+_TOKEN_RE = re.compile(r"""
+    \s+
+  | --[^\n]* | /\*.*?(?:\*/|\Z)                                   # comments (SQLite ends an open /* at EOF)
+  | '(?:[^']|'')*' | [xX]'[0-9a-fA-F]*'                            # string, blob
+  | "(?:[^"]|"")*" | `(?:[^`]|``)*` | \[[^\]]*\]                   # quoted identifiers
+  | 0[xX][0-9a-fA-F]+ | (?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?  # numbers
+  | \?\d* | [:@$][^\W\d]\w*                                       # parameters
+  | [^\W\d][\w$]*                                                 # words
+  | \|\| | << | >> | <= | >= | == | != | <> | ->> | -> | [-+*/%&|~<>=(),;.]
+""", re.S | re.X)
+
+_SIMPLE_NAME = re.compile(r"[^\W\d]\w*\Z")
+_NO_SPACE_BEFORE = frozenset({",", ")", "."})
+_NO_SPACE_AFTER = frozenset({"(", "."})
+
+
+class Token(NamedTuple):
+    kind: str  # ws | comment | string | blob | ident | number | param | word | op
+    text: str
+
+
+class Rewritten(NamedTuple):
+    sql: str        # statement to execute
+    canonical: str  # cache key form (also valid SQL)
+    limited: bool   # the outer LIMIT was added or clamped
+
+
+_FIRST_KIND = {
+    **{c: "word" for c in "abcdefghijklmnopqrstuvwyzABCDEFGHIJKLMNOPQRSTUVWYZ_"},
+    **{c: "number" for c in "0123456789"},
+    **{c: "ws" for c in " \t\r\n\f\v"},
+    **{c: "op" for c in "+*%&|~<>=(),;!"},
+    "'": "string", '"': "ident", "`": "ident", "[": "ident",
+    "?": "param", ":": "param", "@": "param", "$": "param",
+}
+
+
+def _kind(text: str) -> str:
+    kind = _FIRST_KIND.get(text[0])
+    if kind is not None:
+        return kind
+    c = text[0]
+    if c.isspace():
+        return "ws"
+    if c == "." and len(text) > 1:
+        return "number"
+    if c in "xX":
+        return "blob" if len(text) > 1 and text[1] == "'" else "word"
+    if c.isalpha():
+        return "word"
+    if text[:2] in ("--", "/*"):
+        return "comment"
+    return "op"
+
+
+def tokenize(sql: str) -> List[Token]:
+    parts = _TOKEN_RE.findall(sql)
+    if sum(map(len, parts)) != len(sql):  # findall skipped something it could not match
+        pos = 0
+        for part in parts:
+            if not sql.startswith(part, pos):
+                break
+            pos += len(part)
+        what = {"'": "string literal", '"': "identifier", "/": "comment"}.get(sql[pos], f"character {sql[pos]!r}")
+        raise ValueError(f"Unterminated or invalid {what} at position {pos}.")
+    return [Token(_kind(part), part) for part in parts]
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _canonical_token(tok: Token) -> str:
+    if tok.kind == "word":
+        upper = tok.text.upper()
+        return upper if upper in KEYWORDS else tok.text.lower()
+    if tok.kind == "ident":
+        q = tok.text[0]
+        name = tok.text[1:-1].replace(q * 2, q) if q != "[" else tok.text[1:-1]
+        if _SIMPLE_NAME.match(name) and name.upper() not in KEYWORDS:
+            return name.lower()
+        return _quote(name.lower() if name.isascii() else name)
+    return tok.text
+
+
+def _limit_count(tokens: List[Token], max_rows: int) -> Optional[str]:
+    """Replacement text for the LIMIT count *tokens*; ``None`` to keep it."""
+    text = "".join(t.text for t in tokens).strip()
+    sig = [t for t in tokens if t.kind not in ("ws", "comment")]
+    if len(sig) == 1 and sig[0].kind == "number" and re.fullmatch(r"\d+", sig[0].text):
+        return None if int(sig[0].text) <= max_rows else str(max_rows)
+    if len(sig) == 2 and sig[0].text == "-" and sig[1].kind == "number":
+        return str(max_rows)  # negative = no limit
+    if re.fullmatch(rf"MIN\(CASE WHEN \((.*)\) < 0 THEN {max_rows} ELSE \(\1\) END, {max_rows}\)", text, re.S):
+        return None  # already clamped
+    return f"MIN(CASE WHEN ({text}) < 0 THEN {max_rows} ELSE ({text}) END, {max_rows})"
+
+
+@lru_cache(maxsize=1024)
+def rewrite(sql: str, max_rows: Optional[int] = MAX_ROWS) -> Rewritten:
+    """Validate and rewrite one SELECT; *max_rows* ``None`` leaves LIMIT alone."""
+    tokens = [t if t.kind != "comment" else Token("ws", " ") for t in tokenize(sql)]
+    sig = [i for i, t in enumerate(tokens) if t.kind != "ws"]
+    while sig and tokens[sig[-1]].text == ";":
+        sig.pop()
+    if not sig:
+        raise ValueError("Only SELECT statements are allowed.")
+    tokens = tokens[:sig[-1] + 1]
+
+    first = tokens[sig[0]].text.upper()
+    if first not in ("SELECT", "WITH"):
+        raise ValueError("Only SELECT statements are allowed.")
+
+    depth = 0
+    in_from = [False]          # per nesting level
+    expect_table = False       # previous token was FROM / JOIN / a FROM-list comma
+    statement = first if first == "SELECT" else ""
+    limit_at: Optional[int] = None  # position in sig of the outermost LIMIT
+    for n, i in enumerate(sig):
+        tok = tokens[i]
+        upper = tok.text.upper() if tok.kind == "word" else tok.text
+        prev = tokens[sig[n - 1]].text if n else ""
+        nxt = tokens[sig[n + 1]].text if n + 1 < len(sig) else ""
+
+        if tok.kind == "op":
+            if upper == ";":
+                raise ValueError("Only a single SELECT statement is allowed.")
+            if upper == "(":
+                depth += 1
+                in_from.append(False)
+            elif upper == ")":
+                if depth == 0:
+                    raise ValueError("Unbalanced parentheses.")
+                depth -= 1
+                in_from.pop()
+            expect_table = upper == "," and in_from[-1]
+            continue
+
+        if tok.kind == "word" and (expect_table or nxt == "." or prev == "."):
+            if upper in KEYWORDS:  # identifier position: a table / qualifier, not a clause
+                tokens[i] = Token("ident", _quote(tok.text))
+        elif tok.kind == "word":
+            if upper == "FROM":
+                in_from[-1], expect_table = True, True
+                continue
+            if upper == "JOIN":
+                expect_table = True
+                continue
+            if upper in _AFTER_FROM:
+                in_from[-1] = False
+            if depth == 0:
+                if upper in _STATEMENTS and not statement:
+                    statement = upper
+                if upper == "LIMIT":
+                    limit_at = n
+        expect_table = False
+
+    if statement != "SELECT":
+        raise ValueError("Only SELECT statements are allowed.")
+    if depth != 0:
+        raise ValueError("Unbalanced parentheses.")
+
+    limited = False
+    if max_rows is not None:
+        if limit_at is None:
+            tokens += tokenize(f" LIMIT {max_rows}")
+            limited = True
+        else:
+            # LIMIT count [OFFSET o]  |  LIMIT offset, count
+            start, stop = sig[limit_at] + 1, len(tokens)
+            level = 0
+            for j in sig[limit_at + 1:]:
+                text = tokens[j].text
+                level += text == "("
+                level -= text == ")"
+                if level == 0 and text.upper() == "OFFSET":
+                    stop = j
+                    break
+                if level == 0 and text == ",":
+                    start = j + 1
+                    break
+            count = tokens[start:stop]
+            if any(t.kind == "param" for t in count):
+                tokens = tokenize("SELECT * FROM (") + tokens + tokenize(f") LIMIT {max_rows}")
+                return Rewritten("".join(t.text for t in tokens).strip(), _canonicalize(tokens), True)
+            replacement = _limit_count(count, max_rows)
+            if replacement is not None:
+                lead = " " if count and count[0].kind == "ws" else ""
+                trail = " " if stop < len(tokens) else ""
+                tokens[start:stop] = tokenize(lead + replacement + trail)
+                limited = True
+
+    return Rewritten("".join(t.text for t in tokens).strip(), _canonicalize(tokens), limited)
+
+
+def _canonicalize(tokens: List[Token]) -> str:
+    parts: List[str] = []
+    call = False  # previous token was a function name
+    for tok in tokens:
+        if tok.kind in ("ws", "comment"):
+            continue
+        text = _canonical_token(tok)
+        if parts and text not in _NO_SPACE_BEFORE and parts[-1] not in _NO_SPACE_AFTER \
+                and not (call and text == "("):
+            parts.append(" ")
+        parts.append(text)
+        call = tok.kind == "word" and text.upper() not in KEYWORDS
+    return "".join(parts)
+
+
+def canonical(sql: str) -> str:
+    """Cache key for *sql*: its canonical rewritten form (whitespace-collapsed
+    text if it is not an allowed statement)."""
+    try:
+        return rewrite(sql).canonical
+    except ValueError:
+        return " ".join(sql.split())
+
+
+# ── Benchmark / fuzz ──────────────────────────────────────────────
+
+def _legacy(sql: str, limit: int = MAX_ROWS) -> str:
+    """The regex passes this module replaced, kept for comparison."""
+    if not sql.strip().lower().startswith("select"):
+        raise ValueError("Only SELECT statements are allowed.")
+    if "limit" not in sql.lower():
+        sql = f"{sql.rstrip().rstrip(';')} LIMIT {limit}"
+    for word in ("Case", "Order"):
+        sql = re.sub(rf'(?<!")\b{re.escape(word)}\b(?!")', f'"{word}"', sql)
+    return sql
+
+
+_BENCH_SQL = [
+    'SELECT Id, Subject, Status FROM Case WHERE Status = \'New\' ORDER BY CreatedDate DESC LIMIT 10',
+    "SELECT COUNT(*) FROM Case WHERE Subject LIKE '%limit%'",
+    "SELECT o.Id, o.Status FROM Order o JOIN Account a ON a.Id = o.AccountId WHERE o.Status = 'Case closed'",
+    "SELECT Status, COUNT(*) AS n FROM Case GROUP BY Status ORDER BY n DESC",
+    "SELECT CASE WHEN Priority = 'High' THEN 1 ELSE 0 END AS hi, Id FROM Case LIMIT 500",
+]
+
+
+def _benchmark(repeat: int) -> None:
+    import time
+
+    print("Differences (old → new):")
+    for sql in _BENCH_SQL:
+        old, new = _legacy(sql), rewrite(sql).sql
+        if old != new:
+            print(f"  {sql}\n    old: {old}\n    new: {new}")
+
+    def run(fn) -> float:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for sql in _BENCH_SQL:
+                fn(sql)
+        return (time.perf_counter() - started) * 1e6 / (repeat * len(_BENCH_SQL))
+
+    legacy = run(_legacy)
+    cold = run(lambda s: rewrite.__wrapped__(s, MAX_ROWS))
+    warm = run(rewrite)
+    print(f"\nregex passes        {legacy:8.2f} µs/statement")
+    print(f"tokenizer (cold)    {cold:8.2f} µs/statement")
+    print(f"tokenizer (cached)  {warm:8.2f} µs/statement")
+
+
+def _fuzz(count: int, seed: int) -> int:
+    """Random SELECTs over the CRM schema; checks each rewrite is valid SQL,
+    idempotent, keeps its string literals and returns ≤ MAX_ROWS rows."""
+    import random
+    import sqlite3
+    import time
+
+    from mcp.tools.database import _get_conn, get_schema
+
+    rng = random.Random(seed)
+    schema = {t: c for t, c in get_schema()["schema"].items() if c and not t.startswith("agg_")}
+    tables = sorted(schema)
+    tricky = ["limit 5", "Case", "Order by", "a; DROP TABLE Case", "-- x", "/* Case */", "it's"]
+
+    def literal() -> str:
+        return "'" + rng.choice(tricky).replace("'", "''") + "'"
+
+    def select(depth: int = 0) -> str:
+        table, other = rng.choice(tables), rng.choice(tables)
+        join, cross = rng.random() < 0.3, rng.random() < 0.3
+        alias = rng.choice(["", " t", " AS t"])
+        qual = "t." if alias else rng.choice(["" if not (join or cross) else f"{table}.", f"{table}."])
+        cols = [qual + c for c in rng.sample(schema[table], min(len(schema[table]), rng.randint(1, 3)))]
+        if rng.random() < 0.3:
+            cols.append(f"CASE WHEN {cols[0]} = {literal()} THEN 1 ELSE 0 END AS flag")
+        if rng.random() < 0.2:
+            cols.append(f"{literal()} AS note")
+        source = f"{other} x, {table}{alias}" if cross else f"{table}{alias}"
+        sql = f"SELECT {', '.join(cols)} FROM {rng.choice(['', '/* Case */ '])}{source}"
+        if join:
+            sql += f" JOIN {other} o ON o.{schema[other][0]} = {qual}{schema[table][0]}"
+        where = rng.random() < 0.5
+        if where:
+            sql += f" WHERE {cols[0].split(' ')[0]} {rng.choice(['=', '<>', 'LIKE'])} {literal()}"
+        if depth == 0 and rng.random() < 0.3:
+            sql += " AND" if where else " WHERE"
+            sql += f" {qual}{schema[table][0]} IN (SELECT {schema[other][0]} FROM {other} LIMIT 3)"
+        if rng.random() < 0.4:
+            sql += f" ORDER BY {cols[0].split(' ')[0]}" + rng.choice(["", " DESC"])
+        if depth == 0:
+            sql += rng.choice(["", " LIMIT 5", " LIMIT 100000", " LIMIT -1", " LIMIT 10 OFFSET 2",
+                               " LIMIT 3, 900", " LIMIT (SELECT 70)", ";", " -- trailing"])
+        return sql
+
+    failures = 0
+    with _get_conn() as conn:
+        for _ in range(count):
+            sql = select()
+            if rng.random() < 0.2:
+                sql = f"WITH c AS ({select(1)}) " + sql
+            try:
+                result = rewrite(sql)
+                again = rewrite(result.sql)
+                assert again.sql == result.sql, f"not idempotent: {again.sql}"
+                assert again.canonical == result.canonical, "canonical form changed"
+                strings = lambda s: [t.text for t in tokenize(s) if t.kind == "string"]  # noqa: E731
+                assert strings(result.sql) == strings(sql), "literals changed"
+                deadline = time.monotonic() + 2
+                conn.set_progress_handler(lambda: time.monotonic() > deadline, 10_000)
+                try:
+                    rows = conn.execute(result.sql).fetchall()
+                    assert len(rows) <= MAX_ROWS, f"{len(rows)} rows"
+                except sqlite3.OperationalError as exc:
+                    if "interrupted" not in str(exc):
+                        raise
+            except (AssertionError, ValueError, sqlite3.Error) as exc:
+                failures += 1
+                print(f"FAIL {type(exc).__name__}: {exc}\n  in:  {sql}")
+        for bad in ("SELECT 1; DELETE FROM Case", "DELETE FROM Case", "WITH c AS (SELECT 1) DELETE FROM Case",
+                    "select 1; select 2", "PRAGMA table_info(Case)", "SELECT 'unterminated"):
+            try:
+                rewrite(bad)
+                failures += 1
+                print(f"FAIL accepted: {bad}")
+            except ValueError:
+                pass
+    print(f"{count} statements, {failures} failures")
+    return failures
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark / fuzz the SQL rewriter.")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--fuzz", type=int, default=0, metavar="N", help="number of random statements")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        _benchmark(args.repeat)
+    if args.fuzz:
+        raise SystemExit(1 if _fuzz(args.fuzz, args.seed) else 0)
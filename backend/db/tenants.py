@@ -0,0 +1,191 @@
+"""Tenant routing — one CRM database per business unit.
+
+A tenant id picks the SQLite file the tools read: the default tenant (id
+``""`` or ``"default"``) is ``DB_PATH``; tenant ``acme`` is
+``TENANT_DB_DIR/acme.db``.  The id travels with the request in
+``agent.context`` (sessions carry it, ``run_agent_pipeline`` binds it), so
+``query_database`` / ``get_schema`` / the fast path just ask
+:func:`current` for their :class:`Tenant`.
+
+Each tenant gets, lazily on first use:
+
+* its own read-only connection pool (``TENANT_POOL_SIZE`` connections; the
+  default tenant keeps ``db.pool.crm_pool`` and its hot copy),
+* its own schema catalog and other derived catalogs (``caches``),
+* and a small result cache for ``query_database`` — ``RESULT_CACHE_SIZE``
+  statements per tenant for ``RESULT_CACHE_SECONDS``, keyed by the
+  statement's canonical form and the file's version, so a changed file is
+  never answered from the cache.
+
+At most ``TENANT_MAX_OPEN`` tenants stay open; opening another closes the
+least recently used idle one (no connection borrowed), as does being idle
+for ``TENANT_IDLE_SECONDS``.  File descriptors and memory therefore stay
+bounded however many tenant databases exist.
+"""
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent import context
+from config import (
+    DB_PATH,
+    RESULT_CACHE_SECONDS,
+    RESULT_CACHE_SIZE,
+    TENANT_DB_DIR,
+    TENANT_IDLE_SECONDS,
+    TENANT_MAX_OPEN,
+    TENANT_POOL_SIZE,
+)
+from db.pool import ConnectionPool, crm_pool, file_pool
+
+DEFAULT_TENANT = "default"
+
+_TENANT_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,63}\Z")
+
+
+class UnknownTenant(KeyError):
+    """No database for this tenant id (or the id is malformed)."""
+
+    def __str__(self) -> str:
+        return f"Unknown tenant '{self.args[0]}'."
+
+
+class ResultCache:
+    """Small LRU of query results with a time-to-live."""
+
+    def __init__(self, size: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_SECONDS):
+        self.size, self.ttl = size, ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        if not self.size:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple[str, str], result: Dict[str, Any]) -> None:
+        if not self.size:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+@dataclass
+class Tenant:
+    tenant_id: str
+    path: Path
+    pool: ConnectionPool
+    results: ResultCache = field(default_factory=ResultCache)
+    caches: Dict[str, Any] = field(default_factory=dict)  # schema catalog etc., dropped with the tenant
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    opened: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.monotonic)
+
+    @property
+    def is_default(self) -> bool:
+        return self.tenant_id == DEFAULT_TENANT
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tenant_id": self.tenant_id,
+            "path": str(self.path),
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+            "pool": self.pool.stats(),
+            "results": self.results.stats(),
+        }
+
+
+class TenantRegistry:
+    """Open tenants by id, least recently used first out."""
+
+    def __init__(self, max_open: int = TENANT_MAX_OPEN, idle_seconds: float = TENANT_IDLE_SECONDS):
+        self.max_open, self.idle_seconds = max_open, idle_seconds
+        self._lock = threading.Lock()
+        self._open: "OrderedDict[str, Tenant]" = OrderedDict()
+        self._counts = {"opened": 0, "evicted": 0}
+
+    @staticmethod
+    def path_for(tenant_id: str) -> Path:
+        if tenant_id == DEFAULT_TENANT:
+            return DB_PATH
+        if not _TENANT_ID.match(tenant_id):
+            raise UnknownTenant(tenant_id)
+        path = TENANT_DB_DIR / f"{tenant_id}.db"
+        if not path.is_file():
+            raise UnknownTenant(tenant_id)
+        return path
+
+    def get(self, tenant_id: str = "") -> Tenant:
+        tenant_id = tenant_id or DEFAULT_TENANT
+        with self._lock:
+            tenant = self._open.get(tenant_id)
+            if tenant is not None:
+                self._open.move_to_end(tenant_id)
+                tenant.last_used = time.monotonic()
+                return tenant
+
+        path = self.path_for(tenant_id)
+        pool = crm_pool if tenant_id == DEFAULT_TENANT else file_pool(path, TENANT_POOL_SIZE)
+        with self._lock:
+            tenant = self._open.get(tenant_id)  # opened meanwhile by another thread
+            if tenant is None:
+                tenant = self._open[tenant_id] = Tenant(tenant_id, path, pool)
+                self._counts["opened"] += 1
+                evicted = self._evict(keep=tenant_id)
+            else:
+                evicted = []  # the unused pool holds no connections yet
+            tenant.last_used = time.monotonic()
+        for old in evicted:
+            old.close()
+        return tenant
+
+    def _evict(self, keep: str) -> List[Tenant]:
+        """Drop idle-too-long tenants and, over capacity, the least recently used idle ones."""
+        now, evicted = time.monotonic(), []
+        for tenant_id, tenant in list(self._open.items()):  # oldest first
+            if tenant_id == keep or tenant.is_default or tenant.pool.in_use:
+                continue
+            if len(self._open) > self.max_open or now - tenant.last_used > self.idle_seconds:
+                evicted.append(self._open.pop(tenant_id))
+        self._counts["evicted"] += len(evicted)
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tenants = list(self._open.values())
+            counts = dict(self._counts)
+        return {**counts, "open": len(tenants), "max_open": self.max_open,
+                "tenants": [t.stats() for t in reversed(tenants)]}
+
+
+registry = TenantRegistry()
+
+
+def current() -> Tenant:
+    """The tenant of the request being processed."""
+    return registry.get(context.tenant_id())
@@ -0,0 +1,209 @@
+"""Hashed n-gram TF-IDF vectors and a memory-mapped NumPy similarity index.
+
+:class:`HashingVectorizer` maps text to fixed-width vectors without a
+vocabulary: word unigrams/bigrams and character trigrams are hashed (stable
+CRC32, signed) into ``dim`` buckets, weighted by IDF and L2-normalised, so
+cosine similarity is a plain dot product.  Character trigrams keep Thai text
+and word variants ("refund" / "refunded") close.
+
+:class:`VectorIndex` stores vectors as ``.npy`` shards opened with
+``mmap_mode="r"`` and answers top-k queries with one batched matrix product
+per shard.  Appends vectorise new rows with the IDF frozen at build time and
+write them to a fresh shard (files are never rewritten while mapped); call
+:meth:`VectorIndex.build` to re-fit the IDF from scratch.
+"""
+from __future__ import annotations
+
+import json
+import re
+import zlib
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SHARD_ROWS = 200_000
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingVectorizer:
+    """Signed feature hashing of word 1-2-grams and char 3-grams."""
+
+    def __init__(self, dim: int, idf: Optional[np.ndarray] = None):
+        self.dim = dim
+        self.idf = idf if idf is not None else np.ones(dim, dtype=np.float32)
+
+    @staticmethod
+    def features(text: str) -> List[str]:
+        words = [w.lower() for w in _WORD_RE.findall(text or "")]
+        feats = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for w in words:
+            padded = f" {w} "
+            feats.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return feats
+
+    def counts(self, texts: Sequence[str]) -> np.ndarray:
+        """Raw signed hashed counts, shape ``(len(texts), dim)``."""
+        rows: List[int] = []
+        cols: List[int] = []
+        signs: List[float] = []
+        for r, text in enumerate(texts):
+            for feat in self.features(text):
+                h = zlib.crc32(feat.encode("utf-8"))
+                rows.append(r)
+                cols.append(h % self.dim)
+                signs.append(1.0 if h & 0x80000000 else -1.0)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(out, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)),
+                  np.asarray(signs, dtype=np.float32))
+        return out
+
+    def fit_idf(self, counts: np.ndarray) -> None:
+        df = np.count_nonzero(counts, axis=0).astype(np.float32)
+        n = counts.shape[0]
+        self.idf = (np.log((1.0 + n) / (1.0 + df)) + 1.0).astype(np.float32)
+
+    def transform(self, texts: Sequence[str]) -> np.ndarray:
+        """IDF-weighted, L2-normalised vectors."""
+        vecs = self.counts(texts) * self.idf
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vecs / norms
+
+
+class VectorIndex:
+    """Sharded, memory-mapped vector store with batched top-k cosine search."""
+
+    def __init__(self, directory: Path, dim: int):
+        self.dir = directory
+        self.dim = dim
+        self.meta = {"dim": dim, "shards": [], "rows": 0, "watermark": 0}
+        self.vectorizer = HashingVectorizer(dim)
+        self._shards: List[Tuple[np.ndarray, np.ndarray]] = []
+        self.load()
+
+    # ── persistence ──
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.dir / "meta.json"
+
+    def load(self) -> None:
+        if not self._meta_path.exists():
+            return
+        meta = json.loads(self._meta_path.read_text())
+        if meta.get("dim") != self.dim:
+            return  # built with another width — treat as missing
+        self.meta = meta
+        self.vectorizer.idf = np.load(self.dir / "idf.npy")
+        self._shards = [
+            (np.load(self.dir / f"{name}.vec.npy", mmap_mode="r"),
+             np.load(self.dir / f"{name}.ids.npy", mmap_mode="r"))
+            for name in meta["shards"]
+        ]
+
+    def _write_meta(self) -> None:
+        tmp = self._meta_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.meta))
+        tmp.replace(self._meta_path)
+
+    def _write_shard(self, vecs: np.ndarray, ids: np.ndarray) -> None:
+        # Shards are never rewritten in place (readers may have them mapped);
+        # each write gets a fresh name.
+        name = f"shard-{self.meta.setdefault('next', 0):05d}"
+        self.meta["next"] += 1
+        np.save(self.dir / f"{name}.vec.npy", vecs.astype(np.float32))
+        np.save(self.dir / f"{name}.ids.npy", ids)
+        self.meta["shards"].append(name)
+        self.meta["rows"] += len(ids)
+        self._shards = self._shards + [(
+            np.load(self.dir / f"{name}.vec.npy", mmap_mode="r"),
+            np.load(self.dir / f"{name}.ids.npy", mmap_mode="r"),
+        )]
+
+    def _unlink(self, name: str) -> None:
+        for suffix in (".vec.npy", ".ids.npy"):
+            (self.dir / f"{name}{suffix}").unlink(missing_ok=True)
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._shards)
+
+    # ── build / append ──
+
+    def build(self, batches: Iterable[Tuple[List[str], List[str], int]]) -> int:
+        """Fit IDF and write all rows; *batches* yields ``(ids, texts, max_rowid)``.
+
+        Materialises the raw counts once to fit IDF, so the full build needs
+        ``rows × dim × 4`` bytes of RAM.
+        """
+        all_ids: List[str] = []
+        chunks: List[np.ndarray] = []
+        watermark = 0
+        for ids, texts, max_rowid in batches:
+            all_ids.extend(ids)
+            chunks.append(self.vectorizer.counts(texts))
+            watermark = max_rowid
+        self.dir.mkdir(parents=True, exist_ok=True)
+        stale = self.meta["shards"]
+        self.meta = {"dim": self.dim, "shards": [], "rows": 0, "watermark": watermark,
+                     "next": self.meta.get("next", 0)}
+        self._shards = []
+        counts = np.vstack(chunks) if chunks else np.zeros((0, self.dim), np.float32)
+        self.vectorizer.fit_idf(counts)
+        np.save(self.dir / "idf.npy", self.vectorizer.idf)
+        ids_arr = np.asarray(all_ids, dtype=str)
+        for start in range(0, len(all_ids), SHARD_ROWS):
+            block = counts[start:start + SHARD_ROWS] * self.vectorizer.idf
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._write_shard(block / norms, ids_arr[start:start + SHARD_ROWS])
+        self._write_meta()
+        for name in stale:
+            self._unlink(name)
+        return len(all_ids)
+
+    def append(self, ids: List[str], texts: List[str], max_rowid: int) -> int:
+        """Vectorise new rows with the frozen IDF and add them to the index.
+
+        A partly filled last shard is merged with the new rows into a fresh
+        shard, so repeated small appends don't fragment the index.
+        """
+        stale = None
+        if ids:
+            vecs = self.vectorizer.transform(texts)
+            new_ids = np.asarray(ids, dtype=str)
+            if self._shards and len(self._shards[-1][1]) + len(ids) <= SHARD_ROWS:
+                stale = self.meta["shards"].pop()
+                old_vecs, old_ids = self._shards[-1]
+                self._shards = self._shards[:-1]
+                self.meta["rows"] -= len(old_ids)
+                vecs = np.vstack([old_vecs, vecs])
+                new_ids = np.concatenate([np.asarray(old_ids, dtype=str), new_ids])
+            self._write_shard(vecs, new_ids)
+        self.meta["watermark"] = max_rowid
+        self._write_meta()
+        if stale:
+            self._unlink(stale)
+        return len(ids)
+
+    # ── query ──
+
+    def search(self, queries: np.ndarray, k: int) -> List[List[Tuple[str, float]]]:
+        """Top-*k* ``(id, cosine)`` per query row; one matmul per shard."""
+        q = np.asarray(queries, dtype=np.float32).T  # (dim, n_queries)
+        n = q.shape[1]
+        best_scores = np.full((n, 0), -np.inf, dtype=np.float32)
+        best_ids = np.empty((n, 0), dtype=object)
+        for vecs, ids in self._shards:
+            scores = (vecs @ q).T  # (n_queries, shard_rows)
+            kk = min(k, scores.shape[1])
+            top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+            best_scores = np.hstack([best_scores, np.take_along_axis(scores, top, axis=1)])
+            best_ids = np.hstack([best_ids, np.asarray(ids)[top].astype(object)])
+        order = np.argsort(-best_scores, axis=1)[:, :k]
+        return [
+            [(str(best_ids[i, j]), float(best_scores[i, j])) for j in order[i]]
+            for i in range(n)
+        ]
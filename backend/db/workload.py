@@ -0,0 +1,99 @@
+"""Representative SQL for the preset scenarios, plus a tiny timing harness.
+
+The statements mirror what the planner generates for the prompts in
+``routers/scenarios.py``.  They seed the index advisor and serve as the
+benchmark workload for the database optimisations.
+"""
+from __future__ import annotations
+
+import sqlite3
+import statistics
+import time
+from typing import Callable, Dict, List
+
+SCENARIO_SQL: Dict[str, str] = {
+    # "แสดง 5 เคสล่าสุดที่มีสถานะ Escalated"
+    "simple_query": (
+        "SELECT * FROM \"Case\" WHERE Status = 'Escalated' "
+        "ORDER BY CreatedDate DESC LIMIT 5"
+    ),
+    # "สรุปยอด order ของลูกค้า top 3 …"
+    "multi_step": (
+        "SELECT o.AccountId, SUM(oi.Quantity * oi.UnitPrice) AS total "
+        "FROM \"Order\" o JOIN OrderItem oi ON oi.OrderId = o.Id "
+        "GROUP BY o.AccountId ORDER BY total DESC LIMIT 3"
+    ),
+    # "ดึงข้อมูลเคสของ agent_id 'USR-005' ที่สร้างในเดือนนี้" (after recovery)
+    "error_recovery": (
+        "SELECT * FROM \"Case\" WHERE OwnerId = 'USR-005' "
+        "AND CreatedDate >= date('now', 'start of month') LIMIT 50"
+    ),
+    "open_case_count": "SELECT COUNT(*) AS n FROM \"Case\" WHERE Status != 'Closed'",
+    "cases_by_status_month": (
+        "SELECT Status, substr(CreatedDate, 1, 7) AS month, COUNT(*) AS n "
+        "FROM \"Case\" GROUP BY Status, month ORDER BY month DESC LIMIT 50"
+    ),
+}
+
+# The same questions answered from the precomputed summary tables
+# (db.aggregates) in the optimized copy.
+SUMMARY_SQL: Dict[str, str] = {
+    "multi_step": (
+        "SELECT AccountId, order_total AS total FROM agg_account_order_totals "
+        "ORDER BY order_total DESC LIMIT 3"
+    ),
+    "cases_by_status_month": (
+        "SELECT Status, month, case_count AS n FROM agg_case_status_month "
+        "ORDER BY month DESC LIMIT 50"
+    ),
+}
+
+
+def run_benchmark(
+    connect: Callable[[], sqlite3.Connection],
+    queries: Dict[str, str] = SCENARIO_SQL,
+    repeat: int = 5,
+) -> Dict[str, Dict[str, float]]:
+    """Time each query *repeat* times on a fresh connection from *connect*.
+
+    Returns ``{name: {"median_ms", "min_ms", "rows"}}``; queries that fail
+    (e.g. a column missing from this dataset) are reported with ``error``.
+    """
+    results: Dict[str, Dict[str, float]] = {}
+    for name, sql in queries.items():
+        timings: List[float] = []
+        rows = 0
+        try:
+            for _ in range(repeat):
+                conn = connect()
+                try:
+                    started = time.perf_counter()
+                    rows = len(conn.execute(sql).fetchall())
+                    timings.append((time.perf_counter() - started) * 1000)
+                finally:
+                    conn.close()
+        except sqlite3.Error as exc:
+            results[name] = {"error": str(exc)}
+            continue
+        results[name] = {
+            "median_ms": round(statistics.median(timings), 3),
+            "min_ms": round(min(timings), 3),
+            "rows": rows,
+        }
+    return results
+
+
+def print_comparison(
+    before: Dict[str, Dict[str, float]],
+    after: Dict[str, Dict[str, float]],
+    labels: tuple = ("before", "after"),
+) -> None:
+    """Print two :func:`run_benchmark` results side by side."""
+    print(f"{'query':<24} {labels[0]:>12} {labels[1]:>12} {'speedup':>9}")
+    for name in before:
+        b, a = before[name], after.get(name, {})
+        if "error" in b or "error" in a:
+            print(f"{name:<24} {'error: ' + (b.get('error') or a.get('error', '')):>35}")
+            continue
+        speedup = b["median_ms"] / a["median_ms"] if a["median_ms"] else float("inf")
+        print(f"{name:<24} {b['median_ms']:>10.2f}ms {a['median_ms']:>10.2f}ms {speedup:>8.1f}x")
@@ -0,0 +1,284 @@
+"""Durable outbox for outbound email / Slack messages.
+
+Tools call :func:`enqueue`, which writes one row to the ``outbox`` table in
+``OUTBOX_PATH`` and returns at once with a delivery id.  One worker thread
+per channel then:
+
+* claims up to ``DELIVERY_BATCH_SIZE`` due messages, capped by the channel's
+  token-bucket rate limit (``EMAIL_RATE_PER_MINUTE`` / ``SLACK_RATE_PER_MINUTE``);
+* hands them to the channel's transport as one batch;
+* marks each ``sent``, or reschedules it with exponential backoff and jitter
+  until ``DELIVERY_MAX_ATTEMPTS`` (then ``failed``).
+
+The idempotency key is derived from (request, channel, target, payload), so a
+pipeline retry that repeats the same send reuses the existing delivery
+instead of queueing a duplicate; transports pass it on downstream.
+
+A claim is a lease: the row records which process claimed it and when.
+Workers in every process share the table, so a row in ``sending`` is only
+claimed again once its lease (``DELIVERY_LEASE_SECONDS``) has expired — e.g.
+its process crashed mid-batch — never while another worker may still be
+sending it.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from agent.context import current
+from config import (
+    DELIVERY_BACKOFF_SECONDS,
+    DELIVERY_BATCH_SIZE,
+    DELIVERY_LEASE_SECONDS,
+    DELIVERY_MAX_ATTEMPTS,
+    EMAIL_RATE_PER_MINUTE,
+    OUTBOX_PATH,
+    SLACK_RATE_PER_MINUTE,
+)
+from delivery import transports
+
+CHANNELS = ("email", "slack")
+_RATES = {"email": EMAIL_RATE_PER_MINUTE, "slack": SLACK_RATE_PER_MINUTE}
+_IDLE_WAIT = 5.0
+_OWNER = uuid.uuid4().hex[:12]  # this process, in claimed_by
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    channel TEXT NOT NULL,
+    target TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    session_id TEXT,
+    request_id TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',   -- pending | sending | sent | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    last_error TEXT,
+    transport TEXT,
+    claimed_by TEXT,
+    claimed_at REAL,
+    created REAL NOT NULL,
+    sent REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (channel, status, next_attempt);
+CREATE INDEX IF NOT EXISTS outbox_request ON outbox (request_id);
+"""
+
+_COLUMNS = ("id", "channel", "target", "status", "attempts", "last_error", "transport",
+            "session_id", "request_id", "created", "sent")
+_migrated = False
+
+
+def _conn() -> sqlite3.Connection:
+    global _migrated
+    OUTBOX_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(OUTBOX_PATH, timeout=10)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executescript(_SCHEMA)
+    if not _migrated:  # outboxes created before claims were leases
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(outbox)")}
+        with conn:
+            for col, kind in (("claimed_by", "TEXT"), ("claimed_at", "REAL")):
+                if col not in cols:
+                    conn.execute(f"ALTER TABLE outbox ADD COLUMN {col} {kind}")
+        _migrated = True
+    return conn
+
+
+def idempotency_key(request_id: str, channel: str, target: str, payload: Dict[str, Any]) -> str:
+    raw = json.dumps([request_id, channel, target, payload], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def enqueue(channel: str, target: str, payload: Dict[str, Any], key: Optional[str] = None) -> Dict[str, Any]:
+    """Store a message for delivery; returns ``{"delivery_id", "status", "duplicate"}``."""
+    session_id, request_id = current()
+    key = key or idempotency_key(request_id or uuid.uuid4().hex, channel, target, payload)
+    now = time.time()
+    with _conn() as conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO outbox (id, idempotency_key, channel, target, payload, session_id, "
+            "request_id, next_attempt, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (f"dlv-{uuid.uuid4().hex[:12]}", key, channel, target, json.dumps(payload, ensure_ascii=False),
+             session_id, request_id, now, now),
+        )
+        delivery_id, status = conn.execute(
+            "SELECT id, status FROM outbox WHERE idempotency_key = ?", (key,)
+        ).fetchone()
+    start_workers()
+    _wake[channel].set()
+    return {"delivery_id": delivery_id, "status": status, "duplicate": cur.rowcount == 0}
+
+
+# ── Status ────────────────────────────────────────────────────────
+
+def _rows(where: str, params: tuple) -> List[Dict[str, Any]]:
+    with _conn() as conn:
+        rows = conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM outbox WHERE {where} ORDER BY created", params
+        ).fetchall()
+    return [dict(zip(_COLUMNS, r)) for r in rows]
+
+
+def get(delivery_id: str) -> Optional[Dict[str, Any]]:
+    rows = _rows("id = ?", (delivery_id,))
+    return rows[0] if rows else None
+
+
+def for_request(request_id: str) -> List[Dict[str, Any]]:
+    return _rows("request_id = ?", (request_id,))
+
+
+def for_session(session_id: str) -> List[Dict[str, Any]]:
+    return _rows("session_id = ?", (session_id,))
+
+
+def counts() -> Dict[str, Dict[str, int]]:
+    with _conn() as conn:
+        rows = conn.execute("SELECT channel, status, COUNT(*) FROM outbox GROUP BY channel, status").fetchall()
+    out: Dict[str, Dict[str, int]] = {}
+    for channel, status, n in rows:
+        out.setdefault(channel, {})[status] = n
+    return out
+
+
+# ── Workers ───────────────────────────────────────────────────────
+
+class _TokenBucket:
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute / 6.0)  # allow ~10 s worth of burst
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+
+    def available(self) -> int:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return int(self.tokens)
+
+    def take(self, n: int) -> None:
+        self.tokens -= n
+
+    def wait_time(self) -> float:
+        return max(0.05, (1.0 - self.tokens) / self.rate) if self.rate else _IDLE_WAIT
+
+
+_wake = {channel: threading.Event() for channel in CHANNELS}
+_stop = threading.Event()
+_threads: Dict[str, threading.Thread] = {}
+_threads_lock = threading.Lock()
+
+
+def _claim(conn: sqlite3.Connection, channel: str, limit: int) -> List[Dict[str, Any]]:
+    """Lease up to *limit* due messages: pending ones, and ones whose lease has expired."""
+    now = time.time()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT id, idempotency_key, target, payload, attempts FROM outbox "
+            "WHERE channel = ? AND ((status = 'pending' AND next_attempt <= ?) "
+            "OR (status = 'sending' AND COALESCE(claimed_at, 0) <= ?)) "
+            "ORDER BY next_attempt LIMIT ?",
+            (channel, now, now - DELIVERY_LEASE_SECONDS, limit),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE outbox SET status = 'sending', claimed_by = ?, claimed_at = ? WHERE id = ?",
+            [(_OWNER, now, r[0]) for r in rows],
+        )
+    return [
+        {"id": r[0], "idempotency_key": r[1], "target": r[2], "payload": json.loads(r[3]), "attempts": r[4]}
+        for r in rows
+    ]
+
+
+def _next_due(conn: sqlite3.Connection, channel: str) -> float:
+    row = conn.execute(
+        "SELECT MIN(CASE status WHEN 'pending' THEN next_attempt ELSE COALESCE(claimed_at, 0) + ? END) "
+        "FROM outbox WHERE channel = ? AND status IN ('pending', 'sending')",
+        (DELIVERY_LEASE_SECONDS, channel),
+    ).fetchone()
+    return max(0.0, row[0] - time.time()) if row and row[0] is not None else _IDLE_WAIT
+
+
+def _record(conn: sqlite3.Connection, transport: str, batch: List[Dict[str, Any]],
+            outcomes: List[Optional[str]]) -> None:
+    now = time.time()
+    mine = "AND status = 'sending' AND claimed_by = ?"  # unless the lease expired and was taken over
+    release = "claimed_by = NULL, claimed_at = NULL"
+    with conn:
+        for msg, error in zip(batch, outcomes):
+            attempts = msg["attempts"] + 1
+            if error is None:
+                conn.execute(
+                    f"UPDATE outbox SET status = 'sent', attempts = ?, sent = ?, transport = ?, last_error = NULL, "
+                    f"{release} WHERE id = ? {mine}", (attempts, now, transport, msg["id"], _OWNER))
+            elif error.startswith("permanent:") or attempts >= DELIVERY_MAX_ATTEMPTS:
+                conn.execute(
+                    f"UPDATE outbox SET status = 'failed', attempts = ?, last_error = ?, transport = ?, "
+                    f"{release} WHERE id = ? {mine}", (attempts, error, transport, msg["id"], _OWNER))
+            else:
+                delay = DELIVERY_BACKOFF_SECONDS * (2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+                conn.execute(
+                    f"UPDATE outbox SET status = 'pending', attempts = ?, last_error = ?, next_attempt = ?, "
+                    f"transport = ?, {release} WHERE id = ? {mine}",
+                    (attempts, error, now + delay, transport, msg["id"], _OWNER))
+
+
+def _worker(channel: str) -> None:
+    bucket = _TokenBucket(_RATES[channel])
+    conn = _conn()
+    while not _stop.is_set():
+        try:
+            allowed = bucket.available()
+            if allowed < 1:
+                _stop.wait(bucket.wait_time())
+                continue
+            batch = _claim(conn, channel, min(DELIVERY_BATCH_SIZE, allowed))
+            if not batch:
+                _wake[channel].wait(_next_due(conn, channel))
+                _wake[channel].clear()
+                continue
+            bucket.take(len(batch))
+            transport = transports.for_channel(channel)
+            try:
+                outcomes = transport.send_batch(batch)
+            except Exception as exc:  # connection-level failure: retry the whole batch
+                outcomes = [str(exc)] * len(batch)
+            _record(conn, transport.name, batch, outcomes)
+        except sqlite3.Error:
+            _stop.wait(1.0)
+    conn.close()
+
+
+def start_workers() -> None:
+    """Start one delivery thread per channel (idempotent).
+
+    Messages a crashed process left in ``sending`` are picked up by
+    :func:`_claim` once their lease expires.
+    """
+    with _threads_lock:
+        if _threads:
+            return
+        _stop.clear()
+        for channel in CHANNELS:
+            thread = threading.Thread(target=_worker, args=(channel,), daemon=True, name=f"outbox-{channel}")
+            _threads[channel] = thread
+            thread.start()
+
+
+def stop_workers(timeout: float = 5.0) -> None:
+    with _threads_lock:
+        _stop.set()
+        for event in _wake.values():
+            event.set()
+        for thread in _threads.values():
+            thread.join(timeout)
+        _threads.clear()
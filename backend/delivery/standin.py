@@ -0,0 +1,170 @@
+"""Local SMTP + HTTP stand-ins for testing the delivery transports.
+
+Both servers accept everything and keep what they received in memory::
+
+    python -m delivery.standin                  # SMTP :1025, webhook :8025
+    EMAIL_TRANSPORT=smtp SMTP_PORT=1025 \\
+    SLACK_TRANSPORT=webhook SLACK_WEBHOOK_URL=http://127.0.0.1:8025/hook  uvicorn main:app
+
+or in-process::
+
+    with LocalStandIn() as standin:
+        ...  # standin.smtp_port / standin.webhook_url; standin.emails / standin.posts
+
+``fail_next`` makes the webhook answer the next N requests with HTTP 503,
+to exercise retry and backoff.
+"""
+from __future__ import annotations
+
+import json
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, List
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough of RFC 5321 for ``smtplib.SMTP.send_message``."""
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self) -> None:
+        store: List[Dict[str, Any]] = self.server.emails  # type: ignore[attr-defined]
+        self._reply("220 standin ESMTP")
+        sender, rcpts = "", []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            cmd = raw.decode("utf-8", "replace").strip()
+            verb = cmd.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self._reply("250 standin")
+            elif verb == "MAIL":
+                sender, rcpts = cmd.split(":", 1)[1].strip(" <>"), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                rcpts.append(cmd.split(":", 1)[1].strip(" <>"))
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                store.append({"from": sender, "to": rcpts, "data": b"".join(lines).decode("utf-8", "replace")})
+                self._reply("250 OK queued")
+            elif verb == "RSET":
+                sender, rcpts = "", []
+                self._reply("250 OK")
+            elif verb == "NOOP":
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _SMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:  # noqa: N802
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.lock:  # type: ignore[attr-defined]
+            if server.fail_next > 0:  # type: ignore[attr-defined]
+                server.fail_next -= 1  # type: ignore[attr-defined]
+                self.send_response(503)
+                self.end_headers()
+                return
+            server.posts.append({  # type: ignore[attr-defined]
+                "path": self.path,
+                "idempotency_key": self.headers.get("Idempotency-Key"),
+                "json": json.loads(body or b"null"),
+            })
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class LocalStandIn:
+    """Runs both stand-ins on background threads (port 0 = pick a free port)."""
+
+    def __init__(self, smtp_port: int = 0, http_port: int = 0, host: str = "127.0.0.1"):
+        self.smtp = _SMTPServer((host, smtp_port), _SMTPHandler)
+        self.smtp.emails = []  # type: ignore[attr-defined]
+        self.http = HTTPServer((host, http_port), _WebhookHandler)
+        self.http.posts = []  # type: ignore[attr-defined]
+        self.http.fail_next = 0  # type: ignore[attr-defined]
+        self.http.lock = threading.Lock()  # type: ignore[attr-defined]
+        self.host = host
+
+    @property
+    def smtp_port(self) -> int:
+        return self.smtp.server_address[1]
+
+    @property
+    def webhook_url(self) -> str:
+        return f"http://{self.host}:{self.http.server_address[1]}/hook"
+
+    @property
+    def emails(self) -> List[Dict[str, Any]]:
+        return self.smtp.emails  # type: ignore[attr-defined]
+
+    @property
+    def posts(self) -> List[Dict[str, Any]]:
+        return self.http.posts  # type: ignore[attr-defined]
+
+    def fail_next(self, n: int) -> None:
+        with self.http.lock:  # type: ignore[attr-defined]
+            self.http.fail_next = n  # type: ignore[attr-defined]
+
+    def start(self) -> "LocalStandIn":
+        for server in (self.smtp, self.http):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        for server in (self.smtp, self.http):
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self) -> "LocalStandIn":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Run local SMTP + webhook stand-ins.")
+    parser.add_argument("--smtp-port", type=int, default=1025)
+    parser.add_argument("--http-port", type=int, default=8025)
+    args = parser.parse_args()
+
+    with LocalStandIn(args.smtp_port, args.http_port) as standin:
+        print(f"SMTP on 127.0.0.1:{standin.smtp_port}, webhook at {standin.webhook_url}")
+        seen_emails = seen_posts = 0
+        try:
+            while True:
+                time.sleep(0.5)
+                for mail in standin.emails[seen_emails:]:
+                    print(f"[smtp] {mail['from']} → {', '.join(mail['to'])}")
+                for post in standin.posts[seen_posts:]:
+                    print(f"[http] {post['path']} {json.dumps(post['json'], ensure_ascii=False)}")
+                seen_emails, seen_posts = len(standin.emails), len(standin.posts)
+        except KeyboardInterrupt:
+            pass
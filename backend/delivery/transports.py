@@ -0,0 +1,111 @@
+"""Delivery transports — how an outbox message actually leaves the process.
+
+Each transport takes a batch of messages for one channel and returns one
+outcome per message: ``None`` on success or an error string.  Errors that
+start with ``permanent:`` (refused recipient, 4xx from the webhook) are not
+retried.
+
+* :class:`SimulatedTransport` — records nothing, always succeeds (demo).
+* :class:`SMTPTransport` — one SMTP connection per batch.
+* :class:`WebhookTransport` — JSON POST per message (Slack incoming webhook
+  format), with an ``Idempotency-Key`` header.
+
+Point SMTP/webhook at :mod:`delivery.standin` to test without real services.
+"""
+from __future__ import annotations
+
+import json
+import smtplib
+from abc import ABC, abstractmethod
+import urllib.error
+import urllib.request
+from email.message import EmailMessage
+from typing import Any, Dict, List, Optional
+
+from config import (
+    EMAIL_TRANSPORT,
+    SLACK_TRANSPORT,
+    SLACK_WEBHOOK_URL,
+    SMTP_FROM,
+    SMTP_HOST,
+    SMTP_PORT,
+)
+
+
+class Transport(ABC):
+    name = "base"
+    simulated = False
+
+    @abstractmethod
+    def send_batch(self, messages: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """One outcome per message: ``None`` if sent, else an error string."""
+
+
+class SimulatedTransport(Transport):
+    name = "simulated"
+    simulated = True
+
+    def send_batch(self, messages: List[Dict[str, Any]]) -> List[Optional[str]]:
+        return [None for _ in messages]
+
+
+class SMTPTransport(Transport):
+    name = "smtp"
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, sender: str = SMTP_FROM,
+                 timeout: float = 10.0):
+        self.host, self.port, self.sender, self.timeout = host, port, sender, timeout
+
+    def send_batch(self, messages: List[Dict[str, Any]]) -> List[Optional[str]]:
+        outcomes: List[Optional[str]] = []
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            for msg in messages:
+                email = EmailMessage()
+                email["From"] = self.sender
+                email["To"] = msg["target"]
+                email["Subject"] = msg["payload"]["subject"]
+                # Stable id so a re-sent message can be deduplicated downstream
+                email["Message-ID"] = f"<{msg['idempotency_key']}@crm-copilot>"
+                email.set_content(msg["payload"]["body"])
+                try:
+                    smtp.send_message(email)
+                    outcomes.append(None)
+                except smtplib.SMTPRecipientsRefused as exc:
+                    outcomes.append(f"permanent: {exc}")
+                except smtplib.SMTPException as exc:
+                    outcomes.append(str(exc))
+        return outcomes
+
+
+class WebhookTransport(Transport):
+    name = "webhook"
+
+    def __init__(self, url: str = SLACK_WEBHOOK_URL, timeout: float = 10.0):
+        self.url, self.timeout = url, timeout
+
+    def send_batch(self, messages: List[Dict[str, Any]]) -> List[Optional[str]]:
+        outcomes: List[Optional[str]] = []
+        for msg in messages:
+            body = json.dumps({"channel": msg["target"], "text": msg["payload"]["message"]}).encode()
+            req = urllib.request.Request(self.url, data=body, method="POST", headers={
+                "Content-Type": "application/json",
+                "Idempotency-Key": msg["idempotency_key"],
+            })
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout):
+                    outcomes.append(None)
+            except urllib.error.HTTPError as exc:
+                retryable = exc.code == 429 or exc.code >= 500
+                outcomes.append(f"{'' if retryable else 'permanent: '}HTTP {exc.code}")
+            except (urllib.error.URLError, OSError) as exc:
+                outcomes.append(str(exc))
+        return outcomes
+
+
+def for_channel(channel: str) -> Transport:
+    """Configured transport for ``email`` / ``slack``."""
+    if channel == "email" and EMAIL_TRANSPORT == "smtp":
+        return SMTPTransport()
+    if channel == "slack" and SLACK_TRANSPORT == "webhook" and SLACK_WEBHOOK_URL:
+        return WebhookTransport()
+    return SimulatedTransport()
@@ -1,18 +1,34 @@
 """Agentic CRM Copilot — FastAPI Backend Entry Point."""
 from __future__ import annotations
 
+import asyncio
 import os
+from contextlib import asynccontextmanager
 
-from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-load_dotenv()
+import warmup
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Serve at once; warm caches, indexes and delivery workers in the background."""
+    task = asyncio.create_task(warmup.run())
+    yield
+    task.cancel()
+    from delivery import outbox
+    from session.usage import ledger
+
+    outbox.stop_workers()
+    ledger.flush()
+
 
 app = FastAPI(
     title="Agentic CRM Copilot",
     description="AI Agent Demo — MCP + LangGraph for CRM Actions",
     version="1.0.0-demo",
+    lifespan=lifespan,
 )
 
 # CORS — allow Next.js dev server
@@ -28,10 +44,18 @@ app.add_middleware(
 from routers.chat import router as chat_router
 from routers.session import router as session_router
 from routers.scenarios import router as scenarios_router
+from routers.metrics import router as metrics_router
+from routers.reports import router as reports_router
+from routers.deliveries import router as deliveries_router
+from routers.usage import router as usage_router
 
 app.include_router(chat_router)
 app.include_router(session_router)
 app.include_router(scenarios_router)
+app.include_router(metrics_router)
+app.include_router(reports_router)
+app.include_router(deliveries_router)
+app.include_router(usage_router)
 
 
 @app.get("/")
@@ -0,0 +1,12 @@
+"""CRM tools exposed over MCP.
+
+This package shares its top-level name with the MCP SDK (``pip install mcp``),
+which would otherwise be unreachable from the backend directory.  Extending
+``__path__`` with the SDK's directory lets ``mcp.server``, ``mcp.types`` …
+resolve to the SDK while ``mcp.tools`` and ``mcp.validator`` stay ours — so
+no module here may reuse an SDK name, which is why the server entry point is
+``mcp.crm_server``.
+"""
+from pkgutil import extend_path
+
+__path__ = extend_path(__path__, __name__)
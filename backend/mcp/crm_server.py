@@ -0,0 +1,164 @@
+"""FastMCP server — registers all tools (DB + simulated) under one server.
+
+The tools themselves are blocking (SQLite, report rendering, index search),
+so every handler runs its tool on a bounded worker pool (``MCP_WORKERS``
+threads) and never on the event loop: a slow query no longer stalls every
+other call.  Each tool also has its own concurrency limit
+(``MCP_TOOL_CONCURRENCY``, e.g. ``query_database=8,generate_report=2``;
+others get ``MCP_TOOL_CONCURRENCY_DEFAULT``) so one busy tool cannot take
+all the workers, and database tools borrow from the shared connection pool
+(``db.pool``) — or, given a ``tenant_id``, from that tenant's (``db.tenants``).  Every result carries ``timing`` — ``queued_ms`` waiting for
+the tool's limit, ``run_ms`` in the worker, ``total_ms``.
+
+Transports::
+
+    python -m mcp.crm_server                                    # stdio, one client
+    python -m mcp.crm_server --transport streamable-http --port 8040   # http://host:8040/mcp
+
+Over streamable HTTP the server is stateless, so several agents or workers
+can share one server (and one DB pool) without session affinity.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+try:
+    from mcp.server.fastmcp import FastMCP  # mcp 1.x
+except ModuleNotFoundError:
+    from mcp.server.mcpserver import MCPServer as FastMCP  # renamed in mcp 2.x
+
+from agent import context
+from config import (
+    MCP_HOST,
+    MCP_PORT,
+    MCP_TOOL_CONCURRENCY,
+    MCP_TOOL_CONCURRENCY_DEFAULT,
+    MCP_TRANSPORT,
+    MCP_WORKERS,
+)
+from db import tenants
+from mcp.tools.database import query_database, get_schema
+from mcp.tools.email import send_summary_email
+from mcp.tools.slack import notify_slack_channel
+from mcp.tools.report import generate_report
+from mcp.tools.search import search_crm_text
+from mcp.tools.similar import find_similar_cases
+
+server = FastMCP("crm-copilot-mcp")
+
+_workers = ThreadPoolExecutor(max_workers=MCP_WORKERS, thread_name_prefix="mcp-tool")
+
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    limits: Dict[str, int] = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            limits[name.strip()] = max(1, int(value))
+    return limits
+
+
+_limits = _parse_limits(MCP_TOOL_CONCURRENCY)
+_gates: Dict[str, asyncio.Semaphore] = {}
+
+
+def _gate(tool: str) -> asyncio.Semaphore:
+    if tool not in _gates:
+        _gates[tool] = asyncio.Semaphore(_limits.get(tool, MCP_TOOL_CONCURRENCY_DEFAULT))
+    return _gates[tool]
+
+
+async def _call(tool: str, fn: Callable[..., Dict[str, Any]], *args: Any) -> str:
+    """Run *fn* on the worker pool under *tool*'s limit; JSON result with timing."""
+    started = time.perf_counter()
+    async with _gate(tool):
+        queued = time.perf_counter()
+        ctx = contextvars.copy_context()
+        result = await asyncio.get_running_loop().run_in_executor(_workers, ctx.run, fn, *args)
+    finished = time.perf_counter()
+    result = {**result, "timing": {
+        "queued_ms": round((queued - started) * 1000, 2),
+        "run_ms": round((finished - queued) * 1000, 2),
+        "total_ms": round((finished - started) * 1000, 2),
+    }}
+    return json.dumps(result, ensure_ascii=False, default=str)
+
+
+async def _tenant_call(tool: str, tenant_id: str, fn: Callable[..., Dict[str, Any]], *args: Any) -> str:
+    """:func:`_call` against *tenant_id*'s database ("" = the default one)."""
+    try:
+        tenants.registry.get(tenant_id)
+    except tenants.UnknownTenant as exc:
+        return json.dumps({"success": False, "error": str(exc)})
+    context.set_tenant(tenant_id)  # copied into the worker with the rest of the context
+    return await _call(tool, fn, *args)
+
+
+@server.tool()
+async def mcp_query_database(sql: str, tenant_id: str = "") -> str:
+    return await _tenant_call("query_database", tenant_id, query_database, sql)
+
+
+@server.tool()
+async def mcp_get_schema(tenant_id: str = "") -> str:
+    return await _tenant_call("get_schema", tenant_id, get_schema)
+
+
+@server.tool()
+async def mcp_send_summary_email(to: str, subject: str, body: str) -> str:
+    return await _call("send_summary_email", send_summary_email, to, subject, body)
+
+
+@server.tool()
+async def mcp_notify_slack_channel(channel: str, message: str) -> str:
+    return await _call("notify_slack_channel", notify_slack_channel, channel, message)
+
+
+@server.tool()
+async def mcp_generate_report(title: str, data_summary: str, format: str = "pdf", sql: str = "") -> str:
+    return await _call("generate_report", generate_report, title, data_summary, format, sql)
+
+
+@server.tool()
+async def mcp_search_crm_text(query: str, table: str | None = None, limit: int = 10) -> str:
+    return await _call("search_crm_text", search_crm_text, query, table, limit)
+
+
+@server.tool()
+async def mcp_find_similar_cases(case_id: str = "", text: str = "", top_k: int = 5) -> str:
+    return await _call("find_similar_cases", find_similar_cases, case_id, text, top_k)
+
+
+def run(transport: str = MCP_TRANSPORT, host: str = MCP_HOST, port: int = MCP_PORT) -> None:
+    if transport == "stdio":
+        server.run()
+    elif hasattr(server.settings, "host"):  # mcp 1.x: HTTP options are server settings
+        server.settings.host, server.settings.port = host, port
+        server.settings.stateless_http = True
+        server.run(transport)
+    else:
+        server.run(transport, host=host, port=port, stateless_http=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the CRM copilot MCP server.")
+    parser.add_argument("--transport", choices=("stdio", "streamable-http"), default=MCP_TRANSPORT)
+    parser.add_argument("--host", default=MCP_HOST)
+    parser.add_argument("--port", type=int, default=MCP_PORT)
+    args = parser.parse_args()
+
+    # stdout carries the protocol on stdio — status goes to stderr
+    where = "stdio" if args.transport == "stdio" else f"http://{args.host}:{args.port}/mcp"
+    print(f"Starting MCP server 'crm-copilot-mcp' ({where}, {MCP_WORKERS} workers).", file=sys.stderr)
+    print("Tools: mcp_query_database, mcp_get_schema, mcp_send_summary_email, "
+          "mcp_notify_slack_channel, mcp_generate_report, mcp_search_crm_text, "
+          "mcp_find_similar_cases", file=sys.stderr)
+    run(args.transport, args.host, args.port)
@@ -4,36 +4,25 @@ These are the *real* tools that hit the CRM Arena SQLite database.
 """
 from __future__ import annotations
 
-import re
 import sqlite3
+import time
 from typing import Any, Dict, List
 
-from config import DB_PATH, MAX_ROWS
+from agent.context import deadline
+from config import DB_IN_MEMORY, DB_PATH, SCHEMA_CACHE_SECONDS, SLOW_QUERY_MS
+from db import aggregates, querylog, sqlrewrite, tenants
+from db.memory import hot_copy
+from session import usage
 
 
 def _get_conn() -> sqlite3.Connection:
+    """A dedicated connection to the default database (index builds); tool
+    calls borrow from their tenant's pool."""
+    if DB_IN_MEMORY:
+        return hot_copy.connect()
     return sqlite3.connect(DB_PATH)
 
 
-def _enforce_select(sql: str) -> None:
-    if not sql.strip().lower().startswith("select"):
-        raise ValueError("Only SELECT statements are allowed.")
-
-
-def _ensure_limit(sql: str, limit: int = MAX_ROWS) -> str:
-    if "limit" in sql.lower():
-        return sql
-    return f"{sql.rstrip().rstrip(';')} LIMIT {limit}"
-
-
-def _quote_reserved(sql: str) -> str:
-    """Double-quote reserved table names (Case, Order)."""
-    for word in ("Case", "Order"):
-        pattern = rf'(?<!")\b{re.escape(word)}\b(?!")'
-        sql = re.sub(pattern, f'"{word}"', sql)
-    return sql
-
-
 # ── MCP Tool: query_database ──────────────────────────────────────
 
 QUERY_DATABASE_SCHEMA = {
@@ -53,18 +42,38 @@ QUERY_DATABASE_SCHEMA = {
 
 
 def query_database(sql: str) -> Dict[str, Any]:
-    """Execute a SELECT query; return columns + rows."""
-    _enforce_select(sql)
-    sql = _ensure_limit(sql)
-    sql = _quote_reserved(sql)
-
+    """Execute a SELECT query on the current tenant's database; return columns + rows."""
+    rewritten = sqlrewrite.rewrite(sql)  # ValueError unless a single SELECT
+    sql = rewritten.sql
+    tenant = tenants.current()
+    if tenant.is_default:
+        aggregates.ensure_fresh()  # fold source changes into the summary tables
+
+    expires = deadline()
     try:
-        with _get_conn() as conn:
+        cache_key = (tenant.pool.target(), rewritten.canonical)  # file version + statement
+        cached = tenant.results.get(cache_key)
+        if cached is not None:
+            return {**cached, "cached": True}
+        with tenant.pool.connection() as conn:
+            if expires is not None:
+                # Checked every few thousand VM steps; aborts with "interrupted"
+                conn.set_progress_handler(lambda: time.monotonic() > expires, 10_000)
+            started = time.perf_counter()
             cursor = conn.execute(sql)
             columns = [d[0] for d in cursor.description]
             rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        return {"success": True, "sql": sql, "columns": columns, "rows": rows, "row_count": len(rows)}
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            usage.ledger.record_sql(elapsed_ms)
+            if elapsed_ms >= SLOW_QUERY_MS:
+                querylog.record(conn, sql, elapsed_ms, len(rows))
+        result = {"success": True, "sql": sql, "columns": columns, "rows": rows, "row_count": len(rows)}
+        tenant.results.put(cache_key, result)
+        return result
     except sqlite3.Error as exc:
+        if expires is not None and time.monotonic() > expires:
+            return {"success": False, "error": "Query cancelled: request time budget exhausted",
+                    "sql": sql, "deadline_exceeded": True}
         return {"success": False, "error": str(exc), "sql": sql}
 
 
@@ -81,16 +90,46 @@ GET_SCHEMA_SCHEMA = {
 
 
 def get_schema() -> Dict[str, Any]:
-    """Return mapping: table -> [column_names]."""
+    """Return mapping: table -> [column_names] for the current tenant, plus
+    descriptions of any precomputed summary tables present (see ``db.aggregates``)."""
     schema: Dict[str, List[str]] = {}
-    with _get_conn() as conn:
+    with tenants.current().pool.connection() as conn:
         tables = [
             r[0]
             for r in conn.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name"
+                "SELECT name FROM sqlite_master WHERE type='table' "
+                "AND name NOT LIKE 'sqlite_%' ORDER BY name"
             ).fetchall()
         ]
         for table in tables:
             cols = [r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')]
             schema[table] = cols
-    return {"success": True, "schema": schema}
+    schema.pop("agg_state", None)
+    return {
+        "success": True,
+        "schema": schema,
+        "summary_tables": aggregates.present(list(schema)),
+    }
+
+
+# ── Schema catalog ────────────────────────────────────────────────
+# Prompts need the schema on every request; introspecting it each time costs
+# a PRAGMA per table.  The tool itself always answers fresh.  Kept per
+# tenant, in ``Tenant.caches``.
+
+def schema_catalog(max_age: float = SCHEMA_CACHE_SECONDS) -> Dict[str, Any]:
+    """The current tenant's ``get_schema()`` result, reused for up to *max_age* seconds."""
+    tenant = tenants.current()
+    with tenant.lock:
+        catalog, at = tenant.caches.get("schema", ({}, 0.0))
+        if catalog and time.monotonic() - at < max_age:
+            return catalog
+        catalog = get_schema()
+        tenant.caches["schema"] = (catalog, time.monotonic())
+        return catalog
+
+
+def invalidate_schema_catalog() -> None:
+    tenant = tenants.current()
+    with tenant.lock:
+        tenant.caches.pop("schema", None)
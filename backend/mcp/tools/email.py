@@ -1,13 +1,15 @@
-"""Simulated MCP tool — send_summary_email.
+"""MCP tool — send_summary_email.
 
-Returns a mock success response so we can demo multi-tool orchestration
-without actually sending emails.
+Queues the email in the delivery outbox (:mod:`delivery.outbox`) and returns
+at once with a delivery id; a background worker sends it through the
+configured transport (``EMAIL_TRANSPORT``, simulated by default).
 """
 from __future__ import annotations
 
-from datetime import datetime, timezone
 from typing import Any, Dict
 
+from delivery import outbox, transports
+
 SEND_EMAIL_SCHEMA = {
     "name": "send_summary_email",
     "description": "Send a summary email to a specified recipient with CRM data highlights.",
@@ -33,13 +35,15 @@ SEND_EMAIL_SCHEMA = {
 
 
 def send_summary_email(to: str, subject: str, body: str) -> Dict[str, Any]:
-    """Simulated email send — always succeeds."""
+    """Queue an email for delivery."""
+    queued = outbox.enqueue("email", to, {"subject": subject, "body": body})
     return {
         "success": True,
-        "simulated": True,
-        "message_id": f"sim-email-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}",
+        "simulated": transports.for_channel("email").simulated,
+        "delivery_id": queued["delivery_id"],
+        "status": queued["status"],
+        "duplicate": queued["duplicate"],
         "to": to,
         "subject": subject,
         "body_preview": body[:120] + ("…" if len(body) > 120 else ""),
-        "note": "📧 Email simulated for demo purposes.",
     }
@@ -1,15 +1,40 @@
-"""Simulated MCP tool — generate_report.
+"""MCP tool — generate_report.
 
-Returns a mock report summary for demo purposes.
+Renders a real report file (CSV, JSON or PDF) under ``REPORTS_DIR``.  The
+rows come from a read-only SQL query (``sql``), streamed from SQLite in
+chunks through a generator into the writer, so memory stays flat however
+many rows the query returns.  Without ``sql`` the report holds just the
+title and ``data_summary``.
+
+Rendering runs in a process pool: the tool returns at once with the report
+id and download URL (``GET /api/reports/{id}``, see ``routers.reports``);
+the file appears there under its final name only when complete.
 """
 from __future__ import annotations
 
+import csv
+import json
+import re
+import sqlite3
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from config import DB_PATH, REPORT_WORKERS, REPORTS_DIR
+
+FORMATS = ("pdf", "csv", "json")
+FETCH_CHUNK = 1000
+REPORT_ID_RE = re.compile(r"^rpt-\d{14}-[0-9a-f]{8}$")
 
 GENERATE_REPORT_SCHEMA = {
     "name": "generate_report",
-    "description": "Generate a summary report from CRM data results. Returns a formatted report object.",
+    "description": (
+        "Generate a report file from CRM data. Pass the SELECT statement whose rows "
+        "should go into the report as `sql` (all rows are exported, no LIMIT needed). "
+        "Returns a report id and download URL."
+    ),
     "parameters": {
         "type": "object",
         "properties": {
@@ -24,26 +49,283 @@ GENERATE_REPORT_SCHEMA = {
             "format": {
                 "type": "string",
                 "enum": ["pdf", "csv", "json"],
-                "description": "Output format of the report.",
+                "description": (
+                    "Output format of the report. PDF only shows Latin-1 text: Thai and other "
+                    "non-Latin characters become '?', so use csv or json for such data."
+                ),
+            },
+            "sql": {
+                "type": "string",
+                "description": "Optional SQLite SELECT whose rows form the report body.",
             },
         },
         "required": ["title", "data_summary"],
     },
 }
 
+_pool: Optional[ProcessPoolExecutor] = None
+_jobs: Dict[str, Future] = {}
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=REPORT_WORKERS)
+    return _pool
+
+
+def report_path(report_id: str) -> Optional[Path]:
+    """Finished file for *report_id*, or ``None``."""
+    if not REPORT_ID_RE.match(report_id):
+        return None
+    for fmt in FORMATS:
+        path = REPORTS_DIR / f"{report_id}.{fmt}"
+        if path.exists():
+            return path
+    return None
+
+
+def report_status(report_id: str) -> Dict[str, Any]:
+    """``ready`` / ``rendering`` / ``failed`` / ``unknown`` for *report_id*."""
+    path = report_path(report_id)
+    if path is not None:
+        return {"report_id": report_id, "status": "ready", "size": path.stat().st_size,
+                "format": path.suffix[1:]}
+    if REPORT_ID_RE.match(report_id):
+        error = REPORTS_DIR / f"{report_id}.error"
+        if error.exists():
+            return {"report_id": report_id, "status": "failed", "error": error.read_text()}
+        if report_id in _jobs or any(REPORTS_DIR.glob(f"{report_id}.*.part")):
+            return {"report_id": report_id, "status": "rendering"}
+    return {"report_id": report_id, "status": "unknown"}
+
+
+# ── Row source ────────────────────────────────────────────────────
+
+def iter_rows(db_path: str, sql: str) -> Tuple[List[str], Iterator[Sequence[Any]]]:
+    """Column names and a lazy row iterator for *sql* (read-only connection)."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    cursor = conn.execute(sql)
+    columns = [d[0] for d in cursor.description]
+
+    def rows() -> Iterator[Sequence[Any]]:
+        try:
+            while True:
+                chunk = cursor.fetchmany(FETCH_CHUNK)
+                if not chunk:
+                    return
+                yield from chunk
+        finally:
+            conn.close()
+
+    return columns, rows()
+
+
+# ── Writers (stream rows → file, return row count) ────────────────
+
+def write_csv(out: TextIO, title: str, summary: str, columns: List[str],
+              rows: Iterator[Sequence[Any]]) -> int:
+    writer = csv.writer(out)
+    n = 0
+    if columns:
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            n += 1
+    else:
+        writer.writerow(["title", "summary"])
+        writer.writerow([title, summary])
+    return n
+
+
+def write_json(out: TextIO, title: str, summary: str, columns: List[str],
+               rows: Iterator[Sequence[Any]]) -> int:
+    head = {"title": title, "summary": summary, "generated_at": datetime.now(timezone.utc).isoformat(),
+            "columns": columns}
+    out.write(json.dumps(head, ensure_ascii=False)[:-1] + ', "rows": [')
+    n = 0
+    for row in rows:
+        out.write((",\n" if n else "\n") + json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str))
+        n += 1
+    out.write("\n]}\n")
+    return n
+
+
+class _PdfWriter:
+    """Minimal streaming PDF: monospaced text pages, objects written as they
+    are produced; only page object numbers and byte offsets stay in memory.
+
+    Uses the standard Courier font (WinAnsi), so characters outside Latin-1
+    (e.g. Thai) are replaced with ``?`` — use CSV or JSON for those.
+    """
+
+    PAGE_W, PAGE_H, MARGIN = 595, 842, 36
+    FONT_SIZE, LEADING = 7, 9
+    LINE_CHARS = 125
+    LINES_PER_PAGE = (PAGE_H - 2 * MARGIN) // LEADING
+
+    def __init__(self, out) -> None:
+        self.out = out
+        self.offsets: Dict[int, int] = {}
+        self.pages: List[int] = []
+        self.next_obj = 4  # 1 catalog, 2 pages, 3 font
+        self.lines: List[str] = []
+        self.pos = 0
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>")
+
+    def _write(self, data: bytes) -> None:
+        self.out.write(data)
+        self.pos += len(data)
+
+    def _object(self, num: int, body: bytes) -> None:
+        self.offsets[num] = self.pos
+        self._write(f"{num} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    @staticmethod
+    def _escape(text: str) -> bytes:
+        raw = text.encode("latin-1", "replace")
+        return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+    def line(self, text: str) -> None:
+        self.lines.append(text[:self.LINE_CHARS])
+        if len(self.lines) >= self.LINES_PER_PAGE:
+            self._flush_page()
+
+    def _flush_page(self) -> None:
+        if not self.lines:
+            return
+        top = self.PAGE_H - self.MARGIN - self.FONT_SIZE
+        ops = [f"BT /F1 {self.FONT_SIZE} Tf {self.LEADING} TL {self.MARGIN} {top} Td".encode()]
+        ops += [b"(" + self._escape(l) + b") Tj T*" for l in self.lines]
+        ops.append(b"ET")
+        stream = b"\n".join(ops)
+        content, page = self.next_obj, self.next_obj + 1
+        self.next_obj += 2
+        self._object(content, f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+        self._object(page, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.PAGE_W} {self.PAGE_H}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content} 0 R >>"
+        ).encode())
+        self.pages.append(page)
+        self.lines = []
+
+    def close(self) -> None:
+        if self.lines or not self.pages:
+            self.lines = self.lines or [""]
+            self._flush_page()
+        kids = " ".join(f"{p} 0 R" for p in self.pages)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode())
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.pos
+        total = self.next_obj
+        entries = [b"0000000000 65535 f "] + [
+            f"{self.offsets[i]:010d} 00000 n ".encode() for i in range(1, total)
+        ]
+        self._write(f"xref\n0 {total}\n".encode() + b"\n".join(entries) + b"\n")
+        self._write(f"trailer\n<< /Size {total} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def write_pdf(out, title: str, summary: str, columns: List[str], rows: Iterator[Sequence[Any]]) -> int:
+    pdf = _PdfWriter(out)
+    pdf.line(title)
+    pdf.line(f"Generated {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M UTC')}")
+    pdf.line("")
+    for chunk in summary.splitlines() or [""]:
+        for start in range(0, max(len(chunk), 1), pdf.LINE_CHARS):
+            pdf.line(chunk[start:start + pdf.LINE_CHARS])
+    n = 0
+    if columns:
+        width = max(8, min(24, pdf.LINE_CHARS // len(columns) - 3))
+        pdf.line("")
+        pdf.line(" | ".join(c[:width].ljust(width) for c in columns))
+        pdf.line("-" * pdf.LINE_CHARS)
+        for row in rows:
+            pdf.line(" | ".join(("" if v is None else str(v))[:width].ljust(width) for v in row))
+            n += 1
+    pdf.close()
+    return n
+
+
+# ── Worker ────────────────────────────────────────────────────────
+
+def render_report(report_id: str, title: str, summary: str, fmt: str,
+                  sql: str, db_path: str, out_dir: str) -> Dict[str, Any]:
+    """Process-pool entry point: write ``<id>.<fmt>`` atomically via ``.part``."""
+    final = Path(out_dir) / f"{report_id}.{fmt}"
+    part = final.with_name(final.name + ".part")
+    try:
+        columns, rows = iter_rows(db_path, sql) if sql else ([], iter(()))
+        if fmt == "pdf":
+            with open(part, "wb") as out:
+                n = write_pdf(out, title, summary, columns, rows)
+        else:
+            writer = write_csv if fmt == "csv" else write_json
+            with open(part, "w", encoding="utf-8", newline="") as out:
+                n = writer(out, title, summary, columns, rows)
+        part.replace(final)
+        return {"report_id": report_id, "rows": n, "size": final.stat().st_size}
+    except Exception as exc:  # any failure must leave an .error, or the report stays "rendering"
+        try:
+            part.unlink(missing_ok=True)
+            (Path(out_dir) / f"{report_id}.error").write_text(str(exc) or type(exc).__name__)
+        except OSError:
+            pass
+        raise
+
 
 def generate_report(
     title: str,
     data_summary: str,
     format: str = "pdf",
+    sql: str = "",
 ) -> Dict[str, Any]:
-    """Simulated report generation — always succeeds."""
+    """Queue a report render; returns immediately with the download URL."""
+    from db import sqlrewrite, tenants
+
+    if format not in FORMATS:
+        return {"success": False, "error": f"Unsupported format '{format}'."}
+    if sql:
+        try:
+            sql = sqlrewrite.rewrite(sql, max_rows=None).sql  # reports keep every row
+        except ValueError as exc:
+            return {"success": False, "error": str(exc)}
+
+    REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    report_id = f"rpt-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    future = _get_pool().submit(
+        render_report, report_id, title, data_summary, format, sql,
+        str(tenants.current().path), str(REPORTS_DIR),
+    )
+    _jobs[report_id] = future
+    future.add_done_callback(lambda _f: _jobs.pop(report_id, None))
     return {
         "success": True,
-        "simulated": True,
-        "report_id": f"rpt-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}",
+        "report_id": report_id,
         "title": title,
         "format": format,
+        "status": "rendering",
+        "sql": sql or None,
+        "download_url": f"/api/reports/{report_id}",
         "data_summary_preview": data_summary[:150] + ("…" if len(data_summary) > 150 else ""),
-        "note": "📊 Report generation simulated for demo purposes.",
     }
+
+
+if __name__ == "__main__":
+    import argparse
+    import resource
+    import time
+
+    parser = argparse.ArgumentParser(description="Render a report synchronously (for testing).")
+    parser.add_argument("sql")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--title", default="CRM report")
+    args = parser.parse_args()
+
+    REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    rid = f"rpt-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    started = time.perf_counter()
+    info = render_report(rid, args.title, "", args.format, args.sql, str(DB_PATH), str(REPORTS_DIR))
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{info['rows']} rows → {report_path(rid)} ({info['size']:,} bytes) "
+          f"in {time.perf_counter() - started:.1f}s, peak RSS {rss_mb:.0f} MB")
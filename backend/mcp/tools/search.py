@@ -0,0 +1,234 @@
+"""MCP Search tool — search_crm_text.
+
+Full-text search over the free-text columns of the CRM tables (case
+subjects / descriptions, names, comments …) using SQLite FTS5 with the
+porter stemmer, so "refund delays" also matches "refunded" / "delay".
+
+The index lives in a sidecar database (``FTS_DB_PATH``); the CRM DB is only
+read.  It is built incrementally per table by ``rowid`` watermark in a
+background thread, so startup never waits for it and searches work on a
+partial index while the first build runs.
+"""
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent import context
+from config import FTS_DB_PATH, FTS_REFRESH_SECONDS, MAX_ROWS
+from db.tenants import DEFAULT_TENANT
+from mcp.tools.database import _get_conn
+
+BATCH_SIZE = 2000
+
+# Column names that hold free text worth indexing.
+_TEXT_HINTS = ("subject", "description", "comment", "body", "title", "name", "note", "reason", "summary")
+_TITLE_HINTS = ("subject", "title", "name")
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS crm_fts USING fts5(
+    tbl UNINDEXED, row_key UNINDEXED, title, body,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS fts_state (
+    tbl TEXT PRIMARY KEY,
+    max_rowid INTEGER NOT NULL,
+    columns TEXT NOT NULL
+);
+"""
+
+_build_lock = threading.Lock()
+_last_build = 0.0
+_building = False
+
+
+def _fts_conn() -> sqlite3.Connection:
+    FTS_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(FTS_DB_PATH, timeout=10, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def text_columns(conn: sqlite3.Connection) -> Dict[str, Tuple[str, List[str]]]:
+    """Map table -> (key column, [text columns]) for tables with free text."""
+    out: Dict[str, Tuple[str, List[str]]] = {}
+    tables = [
+        r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' "
+            "AND name NOT LIKE 'sqlite_%' AND name NOT LIKE 'agg_%'"
+        )
+    ]
+    for table in tables:
+        info = list(conn.execute(f'PRAGMA table_info("{table}")'))
+        names = [r[1] for r in info]
+        cols = [
+            r[1] for r in info
+            if (r[2] or "TEXT").upper() in ("TEXT", "VARCHAR", "")
+            and any(h in r[1].lower() for h in _TEXT_HINTS)
+            and not r[1].lower().endswith("id")
+        ]
+        if cols:
+            out[table] = ("Id" if "Id" in names else "rowid", cols)
+    return out
+
+
+# ── Index build ───────────────────────────────────────────────────
+
+def build_index(batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    """Index rows added since the last build; return rows indexed per table.
+
+    Commits after every batch so searches see progress immediately.
+    """
+    indexed: Dict[str, int] = {}
+    src = _get_conn()
+    fts = _fts_conn()
+    try:
+        for table, (key, cols) in text_columns(src).items():
+            row = fts.execute(
+                "SELECT max_rowid, columns FROM fts_state WHERE tbl = ?", (table,)
+            ).fetchone()
+            watermark = row[0] if row and row[1] == ",".join(cols) else 0
+            if row and watermark == 0:
+                fts.execute("DELETE FROM crm_fts WHERE tbl = ?", (table,))  # columns changed
+            title_col = next((c for c in cols if any(h in c.lower() for h in _TITLE_HINTS)), None)
+            body_cols = [c for c in cols if c != title_col]
+            select = ", ".join(f'"{c}"' for c in [key] + cols)
+            indexed[table] = 0
+            while True:
+                batch = src.execute(
+                    f'SELECT rowid, {select} FROM "{table}" WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                    (watermark, batch_size),
+                ).fetchall()
+                if not batch:
+                    break
+                docs = []
+                for r in batch:
+                    values = dict(zip(cols, r[2:]))
+                    title = (values.get(title_col) or "") if title_col else ""
+                    body = " \n".join(str(values[c]) for c in body_cols if values.get(c))
+                    docs.append((table, str(r[1]), str(title), body))
+                fts.executemany(
+                    "INSERT INTO crm_fts (tbl, row_key, title, body) VALUES (?, ?, ?, ?)", docs
+                )
+                watermark = batch[-1][0]
+                fts.execute(
+                    "INSERT OR REPLACE INTO fts_state (tbl, max_rowid, columns) VALUES (?, ?, ?)",
+                    (table, watermark, ",".join(cols)),
+                )
+                fts.commit()
+                indexed[table] += len(batch)
+    finally:
+        fts.close()
+        src.close()
+    return indexed
+
+
+def _build_in_background() -> None:
+    global _building, _last_build
+    try:
+        build_index()
+    except sqlite3.Error:
+        pass  # source unavailable — retry on the next refresh window
+    finally:
+        _last_build = time.monotonic()
+        _building = False
+
+
+def ensure_index() -> bool:
+    """Start a background incremental build if one is due; never blocks.
+
+    Returns ``True`` while a build is running.
+    """
+    global _building
+    with _build_lock:
+        due = _last_build == 0.0 or time.monotonic() - _last_build >= FTS_REFRESH_SECONDS
+        if due and not _building:
+            _building = True
+            threading.Thread(target=_build_in_background, daemon=True, name="fts-build").start()
+        return _building
+
+
+# ── MCP Tool: search_crm_text ─────────────────────────────────────
+
+SEARCH_CRM_TEXT_SCHEMA = {
+    "name": "search_crm_text",
+    "description": (
+        "Full-text search over free-text CRM fields (e.g. case subjects and descriptions). "
+        "Matches word variants, returns ranked rows with highlighted snippets. "
+        "Prefer this over LIKE '%...%' queries."
+    ),
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "Words to search for, e.g. 'refund delay'.",
+            },
+            "table": {
+                "type": "string",
+                "description": "Optional table to restrict results to (e.g. Case).",
+            },
+            "limit": {
+                "type": "integer",
+                "description": f"Maximum number of results (default 10, max {MAX_ROWS}).",
+            },
+        },
+        "required": ["query"],
+    },
+}
+
+
+def _match_expr(query: str, op: str) -> str:
+    tokens = _TOKEN_RE.findall(query)
+    return f" {op} ".join(f'"{t}"' for t in tokens)
+
+
+def search_crm_text(query: str, table: Optional[str] = None, limit: int = 10) -> Dict[str, Any]:
+    """Ranked full-text search; falls back from all-words to any-word match."""
+    if context.tenant_id() not in ("", DEFAULT_TENANT):
+        return {"success": False, "error": "Full-text search covers the default CRM database only."}
+    building = ensure_index()
+    limit = max(1, min(int(limit or 10), MAX_ROWS))  # the model may send null
+    if not _TOKEN_RE.search(query):
+        return {"success": False, "error": "Search query has no searchable words."}
+
+    sql = (
+        "SELECT tbl, row_key, title, "
+        "snippet(crm_fts, 3, '[', ']', '…', 16) AS snippet, bm25(crm_fts, 0, 0, 2.0, 1.0) AS score "
+        "FROM crm_fts WHERE crm_fts MATCH ?"
+        + (" AND tbl = ?" if table else "")
+        + " ORDER BY score LIMIT ?"
+    )
+    try:
+        conn = _fts_conn()
+        try:
+            rows: List[Any] = []
+            match = ""
+            for op in ("AND", "OR"):
+                match = _match_expr(query, op)
+                params = [match] + ([table.strip('"')] if table else []) + [limit]
+                rows = conn.execute(sql, params).fetchall()
+                if rows:
+                    break
+        finally:
+            conn.close()
+    except sqlite3.Error as exc:
+        return {"success": False, "error": str(exc)}
+
+    results = [
+        {"table": t, "id": k, "title": title, "snippet": snip, "score": round(-score, 6)}
+        for t, k, title, snip, score in rows
+    ]
+    return {
+        "success": True,
+        "query": query,
+        "match": match,
+        "results": results,
+        "row_count": len(results),
+        "index_building": building,
+    }
@@ -0,0 +1,251 @@
+"""MCP Similarity tool — find_similar_cases.
+
+"Find cases similar to this one" over case subject + description text,
+using the hashed n-gram TF-IDF index in :mod:`db.vectors` (memory-mapped
+``.npy`` shards under ``SIMILAR_INDEX_DIR``).  The index is built on first
+use and extended with newly added cases by ``rowid`` watermark, both in a
+background thread; a call that finds the first build running waits for it
+briefly instead of failing.
+
+CLI::
+
+    python -m mcp.tools.similar --build            # (re)build from the CRM DB
+    python -m mcp.tools.similar --benchmark 1000000
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from agent import context
+from config import FTS_REFRESH_SECONDS, MAX_ROWS, SIMILAR_DIM, SIMILAR_INDEX_DIR
+from db.tenants import DEFAULT_TENANT
+from db.vectors import VectorIndex
+from mcp.tools.database import _get_conn
+
+BATCH_SIZE = 5000
+_TEXT_COLUMNS = ("Subject", "Description")
+_FIRST_BUILD_WAIT = 10.0  # seconds a call waits for the initial build before giving up
+
+_index: Optional[VectorIndex] = None
+_index_lock = threading.Lock()
+_build_lock = threading.RLock()
+_last_sync = 0.0
+_building = False
+_building_lock = threading.Lock()  # guards _building: one sync thread at a time
+_synced = threading.Event()  # set once the first sync has finished
+
+
+def get_index() -> VectorIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = VectorIndex(SIMILAR_INDEX_DIR, SIMILAR_DIM)
+        return _index
+
+
+def _case_text_columns(conn: sqlite3.Connection) -> List[str]:
+    have = {r[1] for r in conn.execute('PRAGMA table_info("Case")')}
+    return [c for c in _TEXT_COLUMNS if c in have]
+
+
+def _case_batches(conn: sqlite3.Connection, after: int) -> Iterator[Tuple[List[str], List[str], int]]:
+    cols = _case_text_columns(conn)
+    text_expr = " || ' ' || ".join(f"IFNULL(\"{c}\", '')" for c in cols) or "''"
+    while True:
+        rows = conn.execute(
+            f'SELECT rowid, Id, {text_expr} FROM "Case" WHERE rowid > ? ORDER BY rowid LIMIT ?',
+            (after, BATCH_SIZE),
+        ).fetchall()
+        if not rows:
+            return
+        after = rows[-1][0]
+        yield [str(r[1]) for r in rows], [r[2] for r in rows], after
+
+
+def sync_index(rebuild: bool = False) -> int:
+    """Build the index if missing (or *rebuild*), else append new cases."""
+    index = get_index()
+    conn = _get_conn()
+    try:
+        with _build_lock:
+            return _sync(index, conn, rebuild)
+    finally:
+        conn.close()
+
+
+def _sync(index: VectorIndex, conn: sqlite3.Connection, rebuild: bool) -> int:
+    if rebuild or not index.ready:
+        return index.build(_case_batches(conn, 0))
+    added = 0
+    for ids, texts, max_rowid in _case_batches(conn, index.meta["watermark"]):
+        added += index.append(ids, texts, max_rowid)
+    return added
+
+
+def _sync_in_background() -> None:
+    global _building, _last_sync
+    try:
+        sync_index()
+    except sqlite3.Error:
+        pass
+    finally:
+        with _building_lock:
+            _last_sync = time.monotonic()
+            _building = False
+        _synced.set()
+
+
+def ensure_index() -> bool:
+    """Start a background build/append if due; returns ``True`` while running."""
+    global _building
+    with _building_lock:
+        due = _last_sync == 0.0 or time.monotonic() - _last_sync >= FTS_REFRESH_SECONDS
+        if due and not _building:
+            _building = True
+            threading.Thread(target=_sync_in_background, daemon=True, name="similar-sync").start()
+        return _building
+
+
+def _wait_for_first_sync() -> None:
+    """Wait for the initial build, up to ``_FIRST_BUILD_WAIT`` s or the request deadline."""
+    timeout = _FIRST_BUILD_WAIT
+    deadline = context.deadline()
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+    if timeout > 0:
+        _synced.wait(timeout)
+
+
+# ── MCP Tool: find_similar_cases ──────────────────────────────────
+
+FIND_SIMILAR_CASES_SCHEMA = {
+    "name": "find_similar_cases",
+    "description": (
+        "Find support cases whose subject/description is most similar to a given case "
+        "(by case_id) or to free text. Returns case ids ranked by cosine similarity."
+    ),
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "case_id": {
+                "type": "string",
+                "description": "Id of the reference case (from the Case table).",
+            },
+            "text": {
+                "type": "string",
+                "description": "Free text to match when no case_id is given.",
+            },
+            "top_k": {
+                "type": "integer",
+                "description": "Number of similar cases to return (default 5).",
+            },
+        },
+    },
+}
+
+
+def find_similar_cases(case_id: str = "", text: str = "", top_k: int = 5) -> Dict[str, Any]:
+    """Top-k most similar cases to *case_id* (excluded from results) or *text*."""
+    if context.tenant_id() not in ("", DEFAULT_TENANT):
+        return {"success": False, "error": "Similar-case search covers the default CRM database only."}
+    building = ensure_index()
+    index = get_index()
+    if not index.ready:
+        _wait_for_first_sync()  # the first call after startup usually finds the build running
+        building = _building
+    if not index.ready:
+        return {"success": False, "error": "Similarity index is still being built; try again shortly."}
+    top_k = max(1, min(int(top_k or 5), MAX_ROWS))  # the model may send null
+    text = text or ""
+
+    conn = _get_conn()
+    try:
+        if case_id:
+            cols = _case_text_columns(conn)
+            if not cols:
+                return {"success": False, "error": "The Case table has no text columns to compare."}
+            row = conn.execute(
+                f'SELECT {", ".join(cols)} FROM "Case" WHERE Id = ?', (case_id,)
+            ).fetchone()
+            if row is None:
+                return {"success": False, "error": f"Case '{case_id}' not found."}
+            text = " ".join(str(v) for v in row if v)
+        if not text.strip():
+            return {"success": False, "error": "Provide either case_id or text."}
+
+        started = time.perf_counter()
+        hits = index.search(index.vectorizer.transform([text]), top_k + 1)[0]
+        search_ms = (time.perf_counter() - started) * 1000
+        hits = [h for h in hits if h[0] != case_id][:top_k]
+
+        details: Dict[str, Dict[str, Any]] = {}
+        if hits:
+            marks = ", ".join("?" for _ in hits)
+            cur = conn.execute(f'SELECT * FROM "Case" WHERE Id IN ({marks})', [h[0] for h in hits])
+            columns = [d[0] for d in cur.description]
+            keep = [c for c in ("Id", "Subject", "Status", "Priority", "CreatedDate") if c in columns]
+            for r in cur.fetchall():
+                rec = dict(zip(columns, r))
+                details[str(rec["Id"])] = {c: rec[c] for c in keep}
+    finally:
+        conn.close()
+
+    rows = [{**details.get(cid, {"Id": cid}), "similarity": round(score, 4)} for cid, score in hits]
+    return {
+        "success": True,
+        "case_id": case_id or None,
+        "rows": rows,
+        "row_count": len(rows),
+        "search_ms": round(search_ms, 2),
+        "indexed_cases": index.meta["rows"],
+        "index_updating": building,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    from pathlib import Path
+
+    import numpy as np
+
+    from db import vectors
+
+    parser = argparse.ArgumentParser(description="Build or benchmark the similar-case index.")
+    parser.add_argument("--build", action="store_true", help="rebuild from the CRM DB")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="time queries over N synthetic cases")
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.build:
+        started = time.perf_counter()
+        n = sync_index(rebuild=True)
+        print(f"Indexed {n} cases in {time.perf_counter() - started:.1f}s → {SIMILAR_INDEX_DIR}")
+
+    if args.benchmark:
+        rng = np.random.default_rng(0)
+        with tempfile.TemporaryDirectory() as tmp:
+            index = VectorIndex(Path(tmp), SIMILAR_DIM)
+            index.dir.mkdir(parents=True, exist_ok=True)
+            for start in range(0, args.benchmark, vectors.SHARD_ROWS):
+                n = min(vectors.SHARD_ROWS, args.benchmark - start)
+                block = rng.standard_normal((n, SIMILAR_DIM), dtype=np.float32)
+                block /= np.linalg.norm(block, axis=1, keepdims=True)
+                index._write_shard(block, np.arange(start, start + n).astype(str))
+            queries = index.vectorizer.transform([f"refund delay case {i}" for i in range(args.queries)])
+            index.search(queries[:1], 5)  # warm the page cache
+            timings = []
+            for q in queries:
+                started = time.perf_counter()
+                index.search(q[None, :], 5)
+                timings.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            index.search(queries, 5)
+            batch_ms = (time.perf_counter() - started) * 1000
+        timings.sort()
+        print(f"{args.benchmark} cases × {SIMILAR_DIM} dims: "
+              f"p50 {timings[len(timings) // 2]:.1f} ms, p95 {timings[int(len(timings) * 0.95)]:.1f} ms "
+              f"per query; batch of {args.queries}: {batch_ms:.1f} ms")
@@ -1,12 +1,15 @@
-"""Simulated MCP tool — notify_slack_channel.
+"""MCP tool — notify_slack_channel.
 
-Returns a mock success response for demo purposes.
+Queues the message in the delivery outbox (:mod:`delivery.outbox`) and
+returns at once with a delivery id; a background worker posts it through the
+configured transport (``SLACK_TRANSPORT``, simulated by default).
 """
 from __future__ import annotations
 
-from datetime import datetime, timezone
 from typing import Any, Dict
 
+from delivery import outbox, transports
+
 NOTIFY_SLACK_SCHEMA = {
     "name": "notify_slack_channel",
     "description": "Post a notification message to a Slack channel about CRM updates or alerts.",
@@ -28,12 +31,14 @@ NOTIFY_SLACK_SCHEMA = {
 
 
 def notify_slack_channel(channel: str, message: str) -> Dict[str, Any]:
-    """Simulated Slack notification — always succeeds."""
+    """Queue a Slack message for delivery."""
+    queued = outbox.enqueue("slack", channel, {"message": message})
     return {
         "success": True,
-        "simulated": True,
-        "ts": datetime.now(timezone.utc).isoformat(),
+        "simulated": transports.for_channel("slack").simulated,
+        "delivery_id": queued["delivery_id"],
+        "status": queued["status"],
+        "duplicate": queued["duplicate"],
         "channel": channel,
         "message_preview": message[:100] + ("…" if len(message) > 100 else ""),
-        "note": "💬 Slack notification simulated for demo purposes.",
     }
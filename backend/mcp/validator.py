@@ -8,6 +8,8 @@ from mcp.tools.database import QUERY_DATABASE_SCHEMA, GET_SCHEMA_SCHEMA
 from mcp.tools.email import SEND_EMAIL_SCHEMA
 from mcp.tools.slack import NOTIFY_SLACK_SCHEMA
 from mcp.tools.report import GENERATE_REPORT_SCHEMA
+from mcp.tools.search import SEARCH_CRM_TEXT_SCHEMA
+from mcp.tools.similar import FIND_SIMILAR_CASES_SCHEMA
 
 # ── Tool registry ─────────────────────────────────────────────────
 
@@ -17,6 +19,8 @@ TOOL_SCHEMAS: Dict[str, Dict[str, Any]] = {
     "send_summary_email": SEND_EMAIL_SCHEMA,
     "notify_slack_channel": NOTIFY_SLACK_SCHEMA,
     "generate_report": GENERATE_REPORT_SCHEMA,
+    "search_crm_text": SEARCH_CRM_TEXT_SCHEMA,
+    "find_similar_cases": FIND_SIMILAR_CASES_SCHEMA,
 }
 
 
@@ -2,15 +2,22 @@
 from __future__ import annotations
 
 import asyncio
+import importlib
 import json
+import sys
 import traceback
 from typing import Any, Dict
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from agent.graph import run_agent_pipeline
+from agent.context import new_request_id
+from agent.llm import LLMUnavailable
+from config import BATCH_CONCURRENCY
+from db import tenants
 from session.manager import session_manager
+from session.usage import UsageBudgetExceeded
 
 router = APIRouter(prefix="/api", tags=["chat"])
 
@@ -18,91 +25,228 @@ router = APIRouter(prefix="/api", tags=["chat"])
 class ChatRequest(BaseModel):
     message: str
     session_id: str | None = None
+    budget_seconds: float | None = None  # default AGENT_REQUEST_BUDGET
+    tenant_id: str = ""  # CRM database to query; "" = the default one
 
 
 class ChatResponse(BaseModel):
     session_id: str
+    tenant_id: str = ""
     agent_response: str
     sql_used: str
     intent: str
     events: list
     tool_results: list
     had_retry: bool
+    degradations: list = []
+
+
+async def _graph():
+    """``agent.graph``, importing the agent stack on first use.
+
+    The import (google.genai, numpy, all MCP tools) is kept off the startup
+    path; the warm-up normally loads it before the first chat arrives, and if
+    not it runs in a worker thread so the event loop keeps serving.
+    """
+    return sys.modules.get("agent.graph") or await asyncio.to_thread(importlib.import_module, "agent.graph")
+
+
+async def run_agent_pipeline(**kwargs: Any):
+    return await (await _graph()).run_agent_pipeline(**kwargs)
+
+
+async def resume_agent_pipeline(**kwargs: Any):
+    return await (await _graph()).resume_agent_pipeline(**kwargs)
+
+
+def _check_tenant(tenant_id: str) -> None:
+    """404 unless *tenant_id* has a database (opens it, so the run finds it warm)."""
+    try:
+        tenants.registry.get(tenant_id)
+    except tenants.UnknownTenant as exc:
+        raise HTTPException(404, str(exc))
 
 
 # ── REST endpoint (fallback) ──────────────────────────────────────
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat(req: ChatRequest) -> ChatResponse:
-    session = session_manager.get_or_create(req.session_id)
+    _check_tenant(req.tenant_id)
+    session = session_manager.get_or_create(req.session_id, req.tenant_id)
     session.add_message("user", req.message)
 
-    state = await run_agent_pipeline(
-        user_message=req.message,
-        session_id=session.session_id,
-    )
+    try:
+        state = await run_agent_pipeline(
+            user_message=req.message,
+            session_id=session.session_id,
+            budget_seconds=req.budget_seconds,
+            tenant_id=session.tenant_id,
+        )
+    except LLMUnavailable as exc:
+        raise HTTPException(503, str(exc), headers={"Retry-After": str(max(1, round(exc.retry_after)))})
+    except UsageBudgetExceeded as exc:
+        raise HTTPException(429, str(exc))
 
     session.add_message("agent", state.agent_response)
 
     return ChatResponse(
         session_id=session.session_id,
+        tenant_id=session.tenant_id,
         agent_response=state.agent_response,
         sql_used=state.sql_used,
         intent=state.intent,
         events=[e.to_dict() for e in state.events],
         tool_results=state.tool_results,
         had_retry=state.had_retry,
+        degradations=state.degradations,
     )
 
 
+# ── Batch (NDJSON in, NDJSON out) ──────────────────────────────────
+
+@router.post("/chat/batch")
+async def chat_batch(request: Request, concurrency: int = BATCH_CONCURRENCY,
+                     budget_seconds: float | None = None, tenant_id: str = "") -> StreamingResponse:
+    """Run a JSONL body of prompts; stream one result line per item, then a summary.
+
+    See ``agent.batch`` for the line formats.  *concurrency* is capped at
+    ``BATCH_CONCURRENCY``; every item queries *tenant_id*'s database.
+    """
+    _check_tenant(tenant_id)
+    await _graph()
+    batch = sys.modules.get("agent.batch") or importlib.import_module("agent.batch")
+    try:
+        items = batch.parse_items((await request.body()).decode("utf-8").splitlines())
+    except (batch.BatchError, UnicodeDecodeError) as exc:
+        raise HTTPException(400, str(exc))
+
+    async def lines():
+        async for result in batch.run_batch(items, min(concurrency, BATCH_CONCURRENCY),
+                                            budget_seconds=budget_seconds, tenant_id=tenant_id):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 # ── WebSocket for real-time streaming ─────────────────────────────
+#
+# Client → server:
+#   {"message": "...", "session_id": "...", "budget_seconds": 20, "tenant_id": "acme"}
+#   {"resume": "<request_id>", "session_id": "..."}   after a dropped connection
+# Server → client:
+#   {"type": "session"} · {"type": "request", "request_id"} · {"type": "event"}… ·
+#   {"type": "result"} | {"type": "error"}
+#
+# A run is not cancelled when the socket drops: it finishes (checkpointed
+# after every node, see agent.checkpoints) and a reconnecting client resumes
+# it with the request id and its session id — replayed events, then the rest
+# of the run.  A run is only resumed for the session that started it.
 
 @router.websocket("/chat/stream")
 async def chat_stream(ws: WebSocket):
     await ws.accept()
+    closed = False
+
+    async def send(payload: Dict[str, Any]) -> None:
+        nonlocal closed
+        if closed:
+            return
+        try:
+            await ws.send_json(payload)
+        except Exception:
+            closed = True  # client gone; let the run finish for a later resume
+
+    async def on_event(event: Dict[str, Any]) -> None:
+        await send({"type": "event", **event})
 
     try:
         while True:
             raw = await ws.receive_text()
             data = json.loads(raw)
-            message = data.get("message", "")
-            session_id = data.get("session_id")
 
-            session = session_manager.get_or_create(session_id)
-            session.add_message("user", message)
-
-            # Send session ID immediately
-            await ws.send_json({"type": "session", "session_id": session.session_id})
-
-            async def on_event(event: Dict[str, Any]) -> None:
-                await ws.send_json({"type": "event", **event})
+            if data.get("resume"):
+                request_id = str(data["resume"])
+                await send({"type": "request", "request_id": request_id, "resumed": True})
+                await _run_and_reply(send, resume_agent_pipeline(
+                    request_id=request_id,
+                    session_id=str(data.get("session_id") or ""),
+                    on_event=on_event,
+                    budget_seconds=data.get("budget_seconds"),
+                ), resumed=True)
+                continue
 
+            message = data.get("message", "")
+            tenant_id = str(data.get("tenant_id") or "")
             try:
-                state = await run_agent_pipeline(
-                    user_message=message,
-                    session_id=session.session_id,
-                    on_event=on_event,
-                )
+                tenants.registry.get(tenant_id)
+            except tenants.UnknownTenant as exc:
+                await send({"type": "error", "error": str(exc)})
+                continue
+            session = session_manager.get_or_create(data.get("session_id"), tenant_id)
+            session.add_message("user", message)
 
-                session.add_message("agent", state.agent_response)
+            # Send session and request IDs immediately (the latter to resume with)
+            request_id = new_request_id()
+            await send({"type": "session", "session_id": session.session_id, "tenant_id": session.tenant_id})
+            await send({"type": "request", "request_id": request_id})
 
-                await ws.send_json({
-                    "type": "result",
-                    "session_id": session.session_id,
-                    "agent_response": state.agent_response,
-                    "sql_used": state.sql_used,
-                    "intent": state.intent,
-                    "tool_results": state.tool_results,
-                    "had_retry": state.had_retry,
-                    "events": [e.to_dict() for e in state.events],
-                })
-
-            except Exception as exc:
-                await ws.send_json({
-                    "type": "error",
-                    "error": str(exc),
-                    "detail": traceback.format_exc(),
-                })
+            await _run_and_reply(send, run_agent_pipeline(
+                user_message=message,
+                session_id=session.session_id,
+                on_event=on_event,
+                budget_seconds=data.get("budget_seconds"),
+                request_id=request_id,
+                tenant_id=session.tenant_id,
+            ))
 
     except WebSocketDisconnect:
         pass
+
+
+async def _run_and_reply(send, run, resumed: bool = False) -> None:
+    try:
+        state = await run
+        if state is None:
+            await send({"type": "error", "error": "Unknown or expired request — please ask again."})
+            return
+
+        if resumed:
+            session = session_manager.restore(state.session_id, state.tenant_id)
+        else:
+            session = session_manager.get(state.session_id)
+        if session is not None:
+            if resumed and not session.messages:  # worker restarted: the session was rebuilt empty
+                session.add_message("user", state.user_message)
+            if not (session.messages and session.messages[-1]["content"] == state.agent_response):
+                session.add_message("agent", state.agent_response)
+
+        await send({
+            "type": "result",
+            "session_id": state.session_id,
+            "request_id": state.request_id,
+            "agent_response": state.agent_response,
+            "sql_used": state.sql_used,
+            "intent": state.intent,
+            "tool_results": state.tool_results,
+            "had_retry": state.had_retry,
+            "degradations": state.degradations,
+            "events": [e.to_dict() for e in state.events],
+        })
+
+    except LLMUnavailable as exc:
+        await send({
+            "type": "error",
+            "error": "The language model is temporarily unavailable — please try again shortly.",
+            "detail": str(exc),
+            "retry_after": exc.retry_after,
+        })
+
+    except UsageBudgetExceeded as exc:
+        await send({"type": "error", "error": str(exc), "budget": exc.scope})
+
+    except Exception as exc:
+        await send({
+            "type": "error",
+            "error": str(exc),
+            "detail": traceback.format_exc(),
+        })
@@ -0,0 +1,28 @@
+"""Deliveries router — status of queued email / Slack messages."""
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException
+
+from delivery import outbox
+
+router = APIRouter(prefix="/api/deliveries", tags=["deliveries"])
+
+
+@router.get("")
+async def list_deliveries(request_id: Optional[str] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Deliveries queued by one request or session; totals per channel/status otherwise."""
+    if request_id:
+        return {"request_id": request_id, "deliveries": outbox.for_request(request_id)}
+    if session_id:
+        return {"session_id": session_id, "deliveries": outbox.for_session(session_id)}
+    return {"counts": outbox.counts()}
+
+
+@router.get("/{delivery_id}")
+async def get_delivery(delivery_id: str) -> Dict[str, Any]:
+    delivery = outbox.get(delivery_id)
+    if delivery is None:
+        raise HTTPException(status_code=404, detail="Delivery not found")
+    return delivery
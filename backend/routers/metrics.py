@@ -0,0 +1,70 @@
+"""Metrics router — performance diagnostics."""
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from fastapi import APIRouter
+
+from agent import fast_path, idempotency, llm, singleflight
+from agent.templates import plan_templates
+from db import querylog, tenants
+
+router = APIRouter(prefix="/api/metrics", tags=["metrics"])
+
+
+@router.get("/slow-queries")
+async def slow_queries(limit: int = 20) -> Dict[str, Any]:
+    """Logged query shapes ranked by total time, with full-scan flags."""
+    return {"shapes": querylog.top_shapes(limit)}
+
+
+@router.get("/retries")
+async def retries() -> Dict[str, Any]:
+    """Retry rate and LLM calls per request, with vs without few-shot examples."""
+    from agent.examples import example_store  # numpy; keep it off the startup path
+
+    return example_store.retry_stats()
+
+
+@router.get("/plan-templates")
+async def plan_template_stats(limit: int = 20) -> Dict[str, Any]:
+    """Learned plan templates and how often each skipped the LLM planner."""
+    return plan_templates.stats(limit)
+
+
+@router.get("/fast-path")
+async def fast_path_stats() -> Dict[str, Any]:
+    """Share of requests answered by the rule-based fast path (no LLM call)."""
+    return fast_path.stats()
+
+
+@router.get("/idempotency")
+async def idempotency_stats() -> Dict[str, Any]:
+    """Side-effect tool calls executed vs replayed from the idempotency cache."""
+    return idempotency.cache.stats()
+
+
+@router.get("/coalescing")
+async def coalescing_stats() -> Dict[str, Any]:
+    """Pipelines, Gemini calls and SQL statements executed vs shared with identical in-flight work."""
+    return singleflight.stats()
+
+
+@router.get("/llm")
+async def llm_stats() -> Dict[str, Any]:
+    """Gemini gateway: attempts, retries, hedges, fallbacks, latency and circuit-breaker state."""
+    return llm.gateway.stats()
+
+
+@router.get("/tenants")
+async def tenant_stats() -> Dict[str, Any]:
+    """Open tenant databases: pool and result-cache use, opens and evictions."""
+    return tenants.registry.stats()
+
+
+@router.get("/speculation")
+async def speculation_stats() -> Dict[str, Any]:
+    """Speculative tool planning: accept rate and planner latency saved."""
+    from agent import speculation  # imports the nodes and every tool; keep it off the startup path
+
+    return speculation.stats()
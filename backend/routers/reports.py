@@ -0,0 +1,82 @@
+"""Reports router — status and download of rendered report files."""
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from mcp.tools.report import report_path, report_status
+
+router = APIRouter(prefix="/api/reports", tags=["reports"])
+
+CHUNK_SIZE = 64 * 1024
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_MEDIA_TYPES = {"pdf": "application/pdf", "csv": "text/csv; charset=utf-8", "json": "application/json"}
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive ``(start, end)`` for a single-range header; ``None`` if unsatisfiable."""
+    m = _RANGE_RE.match(header.strip())
+    if not m or m.groups() == ("", ""):
+        return None
+    first, last = m.groups()
+    if first == "":  # suffix range: last N bytes
+        length = int(last)
+        if length == 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return None
+    return start, end
+
+
+def _read(path, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+@router.get("/{report_id}/status")
+async def status(report_id: str) -> Dict[str, Any]:
+    return report_status(report_id)
+
+
+@router.get("/{report_id}")
+async def download(report_id: str, request: Request):
+    """Serve a finished report; supports single ``Range: bytes=…`` requests."""
+    path = report_path(report_id)
+    if path is None:
+        info = report_status(report_id)
+        if info["status"] == "rendering":
+            return JSONResponse(info, status_code=202)
+        raise HTTPException(status_code=404, detail=info.get("error", "Report not found"))
+
+    size = path.stat().st_size
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{path.name}"',
+    }
+    media_type = _MEDIA_TYPES[path.suffix[1:]]
+    range_header = request.headers.get("range")
+    if range_header is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_read(path, 0, size - 1), media_type=media_type, headers=headers)
+
+    byte_range = _parse_range(range_header, size)
+    if byte_range is None:
+        return JSONResponse({"detail": "Requested range not satisfiable"}, status_code=416,
+                            headers={"Content-Range": f"bytes */{size}"})
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_read(path, start, end), status_code=206, media_type=media_type, headers=headers)
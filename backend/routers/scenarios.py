@@ -48,7 +48,9 @@ async def list_scenarios() -> List[Dict[str, Any]]:
 
 @router.get("/health")
 async def health_check() -> Dict[str, Any]:
+    import warmup
     from mcp.tools.database import get_schema
+    from mcp.validator import TOOL_SCHEMAS
     try:
         schema = get_schema()
         table_count = len(schema.get("schema", {}))
@@ -60,7 +62,9 @@ async def health_check() -> Dict[str, Any]:
     return {
         "status": "healthy" if db_ok else "degraded",
         "database": {"connected": db_ok, "tables": table_count},
-        "mcp_tools": 5,
+        "mcp_tools": len(TOOL_SCHEMAS),
+        "ready": warmup.is_ready(),
+        "warmup": warmup.status(),
         "version": "1.0.0-demo",
     }
 
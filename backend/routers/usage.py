@@ -0,0 +1,31 @@
+"""Usage router — Gemini tokens, estimated cost and SQL time."""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict
+
+from fastapi import APIRouter, HTTPException
+
+from session.usage import ledger
+
+router = APIRouter(prefix="/api/usage", tags=["usage"])
+
+
+@router.get("")
+async def usage_totals(days: int = 7) -> Dict[str, Any]:
+    """Today's totals and budgets, plus stored per-day totals for the last *days* days."""
+    history = await asyncio.to_thread(ledger.history, max(1, min(days, 366)))
+    return {**ledger.totals(), "history": history}
+
+
+@router.get("/sessions/{session_id}")
+async def session_usage(session_id: str) -> Dict[str, Any]:
+    return {"session_id": session_id, **ledger.session(session_id)}
+
+
+@router.get("/requests/{request_id}")
+async def request_usage(request_id: str) -> Dict[str, Any]:
+    usage = ledger.request(request_id)
+    if usage is None:
+        raise HTTPException(status_code=404, detail="Request not found (or no longer tracked)")
+    return {"request_id": request_id, **usage}
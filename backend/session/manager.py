@@ -6,11 +6,13 @@ import uuid
 from typing import Any, Dict, List, Optional
 
 from config import SESSION_TIMEOUT_SECONDS, MAX_SESSIONS
+from session.usage import ledger
 
 
 class Session:
-    def __init__(self, session_id: str):
+    def __init__(self, session_id: str, tenant_id: str = ""):
         self.session_id = session_id
+        self.tenant_id = tenant_id  # CRM database this session queries (see db.tenants)
         self.created_at = time.time()
         self.last_active = time.time()
         self.messages: List[Dict[str, str]] = []  # {"role": "user"/"agent", "content": "..."}
@@ -32,22 +34,28 @@ class Session:
     def to_dict(self) -> Dict[str, Any]:
         return {
             "session_id": self.session_id,
+            "tenant_id": self.tenant_id,
             "message_count": len(self.messages),
             "created_at": self.created_at,
             "last_active": self.last_active,
+            "usage": self.usage(),
         }
 
+    def usage(self) -> Dict[str, Any]:
+        """Tokens and SQL time this session has used (see ``session.usage``)."""
+        return ledger.session(self.session_id)
+
 
 class SessionManager:
     def __init__(self):
         self._sessions: Dict[str, Session] = {}
 
-    def create(self) -> Session:
+    def create(self, tenant_id: str = "") -> Session:
         self._evict_expired()
         if len(self._sessions) >= MAX_SESSIONS:
             self._evict_oldest()
         sid = uuid.uuid4().hex[:12]
-        sess = Session(sid)
+        sess = Session(sid, tenant_id)
         self._sessions[sid] = sess
         return sess
 
@@ -60,12 +68,26 @@ class SessionManager:
             sess.touch()
         return sess
 
-    def get_or_create(self, session_id: str | None) -> Session:
+    def get_or_create(self, session_id: str | None, tenant_id: str = "") -> Session:
+        """The session *session_id*, or a new one for *tenant_id* — also when
+        the existing session belongs to another tenant (a session never
+        switches databases mid-conversation)."""
         if session_id:
             s = self.get(session_id)
-            if s:
+            if s and s.tenant_id == tenant_id:
                 return s
-        return self.create()
+        return self.create(tenant_id)
+
+    def restore(self, session_id: str, tenant_id: str = "") -> Session:
+        """The session *session_id*, recreated under the same id if it is gone
+        (e.g. after a restart) — used when resuming a checkpointed run."""
+        sess = self.get(session_id)
+        if sess is None:
+            self._evict_expired()
+            if len(self._sessions) >= MAX_SESSIONS:
+                self._evict_oldest()
+            sess = self._sessions[session_id] = Session(session_id, tenant_id)
+        return sess
 
     def reset_session(self, session_id: str) -> bool:
         sess = self._sessions.get(session_id)
@@ -0,0 +1,335 @@
+"""Usage ledger — Gemini tokens and SQL time per request, session and day.
+
+Every Gemini response the agent receives carries ``usage_metadata``;
+``agent.nodes`` hands it to :data:`ledger`, and ``query_database`` reports
+the time each statement ran.  The session and request come from
+``agent.context``.  Calls shared between
+identical in-flight requests are counted once, against the request that
+made them.
+
+Totals are kept in memory (per request for the last ``_MAX_REQUESTS``
+requests, per session, and for the current UTC day) and the deltas are
+written to the ``usage`` table in ``AGENT_STORE_PATH`` in batches — every
+``USAGE_FLUSH_ROWS`` changed rows or ``USAGE_FLUSH_SECONDS``, whichever
+comes first, and at shutdown.  The day's total and each session's total are
+read back from there on first use, so a restart resets neither budget.
+
+Budgets (``0`` = unlimited):
+
+* ``USAGE_SESSION_TOKEN_BUDGET`` — tokens one session may use (batch runs
+  are exempt, see ``agent.batch``);
+* ``USAGE_GLOBAL_TOKEN_BUDGET`` — tokens all sessions may use per UTC day.
+
+Once one is spent, new requests either fail with :class:`UsageBudgetExceeded`
+(``USAGE_BUDGET_ACTION=reject``) or run without Gemini
+(``fast_path``): the rule-based fast path answers what it can, everything
+else gets a short refusal.  Totals are served at ``GET /api/usage``.
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent.context import current
+from config import (
+    AGENT_STORE_PATH,
+    USAGE_BUDGET_ACTION,
+    USAGE_FLUSH_ROWS,
+    USAGE_FLUSH_SECONDS,
+    USAGE_GLOBAL_TOKEN_BUDGET,
+    USAGE_PROMPT_COST_PER_1M,
+    USAGE_RESPONSE_COST_PER_1M,
+    USAGE_SESSION_TOKEN_BUDGET,
+)
+
+FAST_PATH_ONLY = "usage_fast_path_only"  # degradation recorded on the state
+_WHO = {"session": "This session", "global": "The service"}
+_MAX_REQUESTS = 1000
+_MAX_SESSIONS = 10_000
+ACTIONS = ("reject", "fast_path")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL,              -- UTC, YYYY-MM-DD
+    session_id TEXT NOT NULL,
+    request_id TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    response_tokens INTEGER NOT NULL DEFAULT 0,
+    llm_calls INTEGER NOT NULL DEFAULT 0,
+    sql_ms REAL NOT NULL DEFAULT 0,
+    sql_statements INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, session_id, request_id)
+);
+CREATE INDEX IF NOT EXISTS usage_session ON usage (session_id);
+"""
+
+
+class UsageBudgetExceeded(RuntimeError):
+    """A session or the whole service has used up its token budget."""
+
+    def __init__(self, message: str, scope: str):
+        super().__init__(message)
+        self.scope = scope  # "session" | "global"
+
+
+@dataclass
+class Usage:
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+    llm_calls: int = 0
+    sql_ms: float = 0.0
+    sql_statements: int = 0
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.response_tokens
+
+    @property
+    def cost_usd(self) -> float:
+        return (self.prompt_tokens * USAGE_PROMPT_COST_PER_1M
+                + self.response_tokens * USAGE_RESPONSE_COST_PER_1M) / 1_000_000
+
+    def add(self, other: "Usage") -> None:
+        self.prompt_tokens += other.prompt_tokens
+        self.response_tokens += other.response_tokens
+        self.llm_calls += other.llm_calls
+        self.sql_ms += other.sql_ms
+        self.sql_statements += other.sql_statements
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "sql_ms": round(self.sql_ms, 2), "tokens": self.tokens,
+                "cost_usd": round(self.cost_usd, 6)}
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _conn() -> sqlite3.Connection:
+    AGENT_STORE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(AGENT_STORE_PATH, timeout=5)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+class UsageLedger:
+    def __init__(self, session_budget: int = USAGE_SESSION_TOKEN_BUDGET,
+                 global_budget: int = USAGE_GLOBAL_TOKEN_BUDGET, action: str = USAGE_BUDGET_ACTION):
+        if action not in ACTIONS:
+            raise ValueError(f"USAGE_BUDGET_ACTION must be one of {', '.join(ACTIONS)}, not {action!r}")
+        self.session_budget, self.global_budget, self.action = session_budget, global_budget, action
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._requests: "OrderedDict[str, Tuple[str, Usage]]" = OrderedDict()
+        self._sessions: "OrderedDict[str, Usage]" = OrderedDict()
+        self._day, self._day_usage = "", Usage()
+        self._pending: Dict[Tuple[str, str, str], Usage] = {}
+        self._flushed_at = time.monotonic()
+        self._counts = {"rejected": 0, "fast_path_only": 0, "flushes": 0, "flush_errors": 0}
+
+    # ── Recording ─────────────────────────────────────────────────
+
+    def record_llm(self, response: Any) -> None:
+        """Count one Gemini response's ``usage_metadata`` against the current request."""
+        meta = getattr(response, "usage_metadata", None)
+        self._record(Usage(
+            prompt_tokens=int(getattr(meta, "prompt_token_count", 0) or 0),
+            response_tokens=int(getattr(meta, "candidates_token_count", 0) or 0),
+            llm_calls=1,
+        ))
+
+    def record_sql(self, elapsed_ms: float) -> None:
+        self._record(Usage(sql_ms=elapsed_ms, sql_statements=1))
+
+    def _record(self, delta: Usage) -> None:
+        session_id, request_id = current()
+        self._load_day()
+        self._load_session(session_id)
+        with self._lock:
+            self._day_usage.add(delta)
+            self._session(session_id).add(delta)
+            if request_id:
+                if request_id not in self._requests:
+                    self._requests[request_id] = (session_id, Usage())
+                    while len(self._requests) > _MAX_REQUESTS:
+                        self._requests.popitem(last=False)
+                self._requests[request_id][1].add(delta)
+            self._pending.setdefault((self._day, session_id, request_id), Usage()).add(delta)
+            due = (len(self._pending) >= USAGE_FLUSH_ROWS
+                   or time.monotonic() - self._flushed_at >= USAGE_FLUSH_SECONDS)
+        if due:
+            self.flush()
+
+    def _session(self, session_id: str) -> Usage:
+        usage = self._sessions.get(session_id)
+        if usage is None:
+            usage = self._sessions[session_id] = Usage()
+            while len(self._sessions) > _MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return usage
+
+    def _load_day(self) -> None:
+        """Start a new day's total, seeded from anything already stored for it."""
+        today = _today()
+        if self._day == today:
+            return
+        stored = Usage()
+        try:
+            with _conn() as conn:
+                row = conn.execute(
+                    "SELECT COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(response_tokens), 0), "
+                    "COALESCE(SUM(llm_calls), 0), COALESCE(SUM(sql_ms), 0), COALESCE(SUM(sql_statements), 0) "
+                    "FROM usage WHERE day = ?", (today,),
+                ).fetchone()
+            stored = Usage(*row)
+        except sqlite3.Error:
+            pass  # accounting must never fail a chat
+        with self._lock:
+            if self._day != today:
+                self._day, self._day_usage = today, stored
+
+    def _load_session(self, session_id: str) -> None:
+        """Seed a session not in memory (new, evicted, or from before a restart) from storage."""
+        if session_id in self._sessions:
+            return
+        with self._flush_lock:  # so no delta is both flushed and still pending
+            stored = Usage()
+            try:
+                with _conn() as conn:
+                    row = conn.execute(
+                        "SELECT COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(response_tokens), 0), "
+                        "COALESCE(SUM(llm_calls), 0), COALESCE(SUM(sql_ms), 0), COALESCE(SUM(sql_statements), 0) "
+                        "FROM usage WHERE session_id = ?", (session_id,),
+                    ).fetchone()
+                stored = Usage(*row)
+            except sqlite3.Error:
+                pass  # accounting must never fail a chat
+            with self._lock:
+                if session_id not in self._sessions:
+                    for (_, sid, _), u in self._pending.items():
+                        if sid == session_id:
+                            stored.add(u)
+                    self._session(session_id).add(stored)
+
+    def flush(self) -> None:
+        """Write the pending deltas in one transaction."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._flushed_at = time.monotonic()
+            if not pending:
+                return
+            try:
+                with _conn() as conn:
+                    conn.executemany(
+                        "INSERT INTO usage (day, session_id, request_id, prompt_tokens, response_tokens, "
+                        "llm_calls, sql_ms, sql_statements) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (day, session_id, request_id) DO UPDATE SET "
+                        "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                        "response_tokens = response_tokens + excluded.response_tokens, "
+                        "llm_calls = llm_calls + excluded.llm_calls, "
+                        "sql_ms = sql_ms + excluded.sql_ms, "
+                        "sql_statements = sql_statements + excluded.sql_statements",
+                        [(*key, u.prompt_tokens, u.response_tokens, u.llm_calls, u.sql_ms, u.sql_statements)
+                         for key, u in pending.items()],
+                    )
+                with self._lock:
+                    self._counts["flushes"] += 1
+            except sqlite3.Error:
+                with self._lock:  # keep the deltas for the next flush
+                    self._counts["flush_errors"] += 1
+                    for key, u in pending.items():
+                        self._pending.setdefault(key, Usage()).add(u)
+
+    # ── Budgets ───────────────────────────────────────────────────
+
+    def exhausted(self, session_id: str, session_budget: bool = True) -> str:
+        """``"session"`` / ``"global"`` if that budget is spent, else ``""``
+        (the session budget is skipped without *session_budget*)."""
+        self._load_day()
+        if self.session_budget and session_budget:
+            self._load_session(session_id)
+        with self._lock:
+            if self.global_budget and self._day_usage.tokens >= self.global_budget:
+                return "global"
+            usage = self._sessions.get(session_id) if session_budget else None
+            if self.session_budget and usage is not None and usage.tokens >= self.session_budget:
+                return "session"
+        return ""
+
+    def admit(self, session_id: str, session_budget: bool = True) -> str:
+        """Check the budgets before a new request: ``""`` to run normally, or
+        the spent budget's scope to run fast-path-only; raises
+        :class:`UsageBudgetExceeded` instead when the action is ``reject``."""
+        scope = self.exhausted(session_id, session_budget)
+        if not scope:
+            return ""
+        with self._lock:
+            self._counts["rejected" if self.action == "reject" else "fast_path_only"] += 1
+        if self.action == "reject":
+            raise UsageBudgetExceeded(f"{_WHO[scope]} has used up its token budget.", scope)
+        return scope
+
+    # ── Reporting ─────────────────────────────────────────────────
+
+    def refusal(self, scope: str) -> str:
+        """The reply for a request the fast path could not answer once *scope*'s budget is spent."""
+        return (f"{_WHO[scope]} has used up its token budget, so only simple lookups "
+                "(counts, lists of tables, latest records) can be answered for now.")
+
+    def session(self, session_id: str) -> Dict[str, Any]:
+        self._load_session(session_id)
+        with self._lock:
+            usage = self._sessions.get(session_id) or Usage()
+            data = usage.to_dict()
+        return {**data, "budget": self.session_budget,
+                "remaining": max(0, self.session_budget - data["tokens"]) if self.session_budget else None}
+
+    def request(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._requests.get(request_id)
+            return None if entry is None else {"session_id": entry[0], **entry[1].to_dict()}
+
+    def totals(self) -> Dict[str, Any]:
+        self._load_day()
+        with self._lock:
+            today = self._day_usage.to_dict()
+            sessions = len(self._sessions)
+            counts = dict(self._counts)
+        return {
+            "day": self._day,
+            "today": today,
+            "budgets": {
+                "session_tokens": self.session_budget,
+                "global_tokens_per_day": self.global_budget,
+                "global_remaining": max(0, self.global_budget - today["tokens"]) if self.global_budget else None,
+                "action": self.action,
+            },
+            "sessions_tracked": sessions,
+            **counts,
+        }
+
+    def history(self, days: int = 7) -> List[Dict[str, Any]]:
+        """Per-day totals from storage, newest first (pending deltas flushed first)."""
+        self.flush()
+        try:
+            with _conn() as conn:
+                rows = conn.execute(
+                    "SELECT day, SUM(prompt_tokens), SUM(response_tokens), SUM(llm_calls), SUM(sql_ms), "
+                    "SUM(sql_statements), COUNT(DISTINCT session_id), COUNT(DISTINCT request_id) "
+                    "FROM usage GROUP BY day ORDER BY day DESC LIMIT ?", (days,),
+                ).fetchall()
+        except sqlite3.Error:
+            return []
+        return [{"day": r[0], **Usage(*r[1:6]).to_dict(), "sessions": r[6], "requests": r[7]} for r in rows]
+
+
+# ── Global singleton ──────────────────────────────────────────────
+ledger = UsageLedger()
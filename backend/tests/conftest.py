@@ -0,0 +1,5 @@
+"""Test setup: import the backend modules as the app does (from ``backend/``)."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
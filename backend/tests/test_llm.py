@@ -0,0 +1,117 @@
+"""Gemini gateway (``agent.llm``): retries, fallback and the circuit breaker.
+
+The first tests stub ``Gateway._once``; the rest send real requests through
+the ``google.genai`` client to :class:`agent.gemini_standin.GeminiStandIn`.
+"""
+from __future__ import annotations
+
+import pytest
+
+from agent.gemini_standin import GeminiStandIn
+from agent.llm import CircuitBreaker, Gateway, LLMUnavailable
+
+
+class _ServiceError(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def _gateway(**kwargs) -> Gateway:
+    kwargs.setdefault("backoff", 0.0)
+    kwargs.setdefault("max_attempts", 3)
+    return Gateway(api_key="test", model="primary", fallback_model="fallback", **kwargs)
+
+
+def test_retry_after_503_then_success(monkeypatch):
+    gateway = _gateway()
+    outcomes = [_ServiceError(503), "ok"]
+    calls = []
+
+    def once(model, prompt, json_mode, timeout):
+        calls.append(model)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(gateway, "_once", once)
+    assert gateway.generate("hello") == "ok"
+    assert calls == ["primary", "primary"]
+    stats = gateway.stats()
+    assert stats["retries"] == 1
+    assert stats["unavailable"] == 0
+    assert gateway.breaker("primary").failures == 0
+
+
+def test_retries_exhausted_raise_llm_unavailable(monkeypatch):
+    gateway = _gateway()
+
+    def once(model, prompt, json_mode, timeout):
+        raise _ServiceError(503)
+
+    monkeypatch.setattr(gateway, "_once", once)
+    with pytest.raises(LLMUnavailable):
+        gateway.generate("hello")
+    assert gateway.stats()["unavailable"] == 1
+
+
+# ── Against the in-repo Gemini stand-in (real client, local HTTP) ─
+
+@pytest.fixture
+def standin():
+    with GeminiStandIn() as server:
+        yield server
+
+
+def _against(standin: GeminiStandIn, **kwargs) -> Gateway:
+    return _gateway(base_url=standin.base_url, **kwargs)
+
+
+def test_standin_retry_after_503(standin):
+    gateway = _against(standin)
+    standin.fail_next(1, 503)
+    assert gateway.generate("hello").text == "[primary] stand-in answer"
+    assert [r["model"] for r in standin.requests] == ["primary", "primary"]
+    assert gateway.stats()["retries"] == 1
+
+
+def test_standin_client_error_is_not_retried(standin):
+    gateway = _against(standin)
+    standin.fail_next(1, 400)
+    with pytest.raises(Exception) as info:
+        gateway.generate("hello")
+    assert not isinstance(info.value, LLMUnavailable)
+    assert len(standin.requests) == 1
+    assert gateway.breaker("primary").failures == 0
+
+
+def test_standin_intent_falls_back_when_primary_is_down(standin):
+    gateway = _against(standin)
+    standin.set_down("primary")
+    assert gateway.generate("hello", step="intent").text == "[fallback] stand-in answer"
+    assert [r["model"] for r in standin.requests] == ["primary"] * 3 + ["fallback"]
+    assert gateway.stats()["fallbacks"] == 1
+
+
+def test_standin_other_steps_do_not_fall_back(standin):
+    gateway = _against(standin)
+    standin.set_down("primary")
+    with pytest.raises(LLMUnavailable):
+        gateway.generate("hello", step="response")
+    assert {r["model"] for r in standin.requests} == {"primary"}
+
+
+def test_standin_open_circuit_fails_fast(standin):
+    gateway = _against(standin, max_attempts=2)
+    gateway._breakers["primary"] = CircuitBreaker(threshold=2, cooldown=60)
+    standin.set_down("primary")
+    with pytest.raises(LLMUnavailable):
+        gateway.generate("hello")
+    assert gateway.breaker("primary").state == "open"
+    sent = len(standin.requests)
+
+    with pytest.raises(LLMUnavailable, match="circuit open") as info:
+        gateway.generate("hello")
+    assert len(standin.requests) == sent  # nothing reached the server
+    assert info.value.retry_after > 0
@@ -0,0 +1,183 @@
+"""Startup warm-up — runs in the background once the port is open.
+
+``main`` imports only FastAPI and the routers; the agent stack
+(google.genai, numpy, every MCP tool) is imported on first use.  The
+lifespan hook then starts :func:`run` as a task, so health checks are
+answered immediately while this:
+
+* refreshes the summary tables and loads the in-memory hot copy (these used
+  to block startup),
+* kicks off the FTS / similar-case index builds and the delivery workers,
+* and, with ``STARTUP_WARMUP=1``, imports the agent stack, builds the Gemini
+  client and caches the schema catalog and fast-path grammar catalog, so the
+  first chat does not pay for them.
+
+Every step is timed; :func:`status` is reported by ``GET /api/health``.
+A failing step is recorded and skipped — the request path does the same
+work lazily anyway.
+
+``python -m warmup`` measures cold import time and time to first answer.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from config import DB_IN_MEMORY, DB_PATH, GEMINI_API_KEY, STARTUP_WARMUP
+
+_status: Dict[str, Any] = {"state": "pending", "steps": {}}
+
+
+def _summary_tables() -> None:
+    from db import aggregates
+
+    aggregates.refresh_if_serving(DB_PATH)
+
+
+def _hot_copy() -> None:
+    from db.memory import hot_copy
+
+    if DB_IN_MEMORY:
+        hot_copy.current()  # loads it unless a request already has
+
+
+def _text_index() -> None:
+    from mcp.tools import search, similar
+
+    search.ensure_index()
+    similar.ensure_index()
+
+
+def _delivery_workers() -> None:
+    from delivery import outbox
+
+    outbox.start_workers()
+
+
+def _agent_imports() -> None:
+    importlib.import_module("agent.graph")
+
+
+def _schema_catalog() -> None:
+    from agent import fast_path
+    from mcp.tools.database import invalidate_schema_catalog, schema_catalog
+
+    invalidate_schema_catalog()  # summary tables may have just been created
+    schema_catalog()
+    fast_path._get_catalog()
+
+
+def _gemini_client() -> None:
+    from agent import llm
+
+    if GEMINI_API_KEY:
+        llm.gateway.client()
+
+
+def steps() -> List[Tuple[str, Callable[[], None]]]:
+    service = [
+        ("summary_tables", _summary_tables),
+        ("hot_copy", _hot_copy),
+        ("text_index", _text_index),
+        ("delivery_workers", _delivery_workers),
+    ]
+    if not STARTUP_WARMUP:
+        return service
+    return service + [
+        ("agent_imports", _agent_imports),
+        ("schema_catalog", _schema_catalog),
+        ("gemini_client", _gemini_client),
+    ]
+
+
+async def run() -> Dict[str, Any]:
+    """Run every step in a worker thread, one after another."""
+    started = time.perf_counter()
+    _status.update(state="running", steps={})
+    for name, fn in steps():
+        t0 = time.perf_counter()
+        try:
+            await asyncio.to_thread(fn)
+            _status["steps"][name] = {"ok": True, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+        except Exception as exc:
+            _status["steps"][name] = {"ok": False, "error": str(exc)}
+    _status.update(state="ready", ms=round((time.perf_counter() - started) * 1000, 1))
+    return _status
+
+
+def status() -> Dict[str, Any]:
+    return {**_status, "steps": dict(_status["steps"])}
+
+
+def is_ready() -> bool:
+    return _status["state"] == "ready"
+
+
+# ── Benchmark ─────────────────────────────────────────────────────
+
+def _import_ms(module: str) -> float:
+    import subprocess
+    import sys
+
+    code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1000)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _first_answer(message: str, port: int, timeout: float = 120.0) -> Dict[str, float]:
+    """Start uvicorn, then time the first health check and the first chat answer."""
+    import json
+    import subprocess
+    import sys
+    import urllib.request
+
+    base = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if time.perf_counter() - t0 > timeout:
+                raise TimeoutError("server did not come up")
+            try:
+                with urllib.request.urlopen(f"{base}/api/health", timeout=1):
+                    break
+            except OSError:
+                time.sleep(0.02)
+        health_ms = (time.perf_counter() - t0) * 1000
+        req = urllib.request.Request(
+            f"{base}/api/chat", data=json.dumps({"message": message}).encode(),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            json.loads(resp.read())
+        answer_ms = (time.perf_counter() - t0) * 1000
+        with urllib.request.urlopen(f"{base}/api/health", timeout=5) as resp:
+            warm = json.loads(resp.read()).get("warmup", {})
+        return {"health_ms": health_ms, "first_answer_ms": answer_ms, "warmup_ms": warm.get("ms", 0.0)}
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    import argparse
+    import statistics
+
+    parser = argparse.ArgumentParser(description="Measure cold import time and time to first answer.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--message", default="how many open cases",
+                        help="first chat message (the default is answered by the fast path, no Gemini key needed)")
+    parser.add_argument("--no-server", action="store_true", help="import times only")
+    args = parser.parse_args()
+
+    for module in ("main", "agent.graph"):
+        samples = [_import_ms(module) for _ in range(args.runs)]
+        print(f"import {module:<12} median {statistics.median(samples):7.1f} ms   min {min(samples):7.1f} ms")
+    if not args.no_server:
+        runs = [_first_answer(args.message, args.port) for _ in range(args.runs)]
+        for key in ("health_ms", "first_answer_ms", "warmup_ms"):
+            print(f"{key:<16} median {statistics.median(r[key] for r in runs):7.1f} ms")
@@ -3,6 +3,16 @@
 import React, { useRef, useEffect } from "react";
 import { ChatMessage } from "@/types";
 
+// Degradation codes from the backend (agent/budget.py, session/usage.py)
+const TIME_BUDGET_LABELS: Record<string, string> = {
+  no_retry: "no retry",
+  partial_results: "partial results",
+  local_response: "summary without AI",
+};
+const TOKEN_BUDGET_LABELS: Record<string, string> = {
+  usage_fast_path_only: "simple lookups only",
+};
+
 interface MessageListProps {
   messages: ChatMessage[];
 }
@@ -83,6 +93,26 @@ export default function MessageList({ messages }: MessageListProps) {
             {msg.result?.had_retry && (
               <div className="retry-badge-msg">🔄 Auto-recovered from schema mismatch</div>
             )}
+
+            {/* Budget badges: time budget and token budget are reported separately */}
+            {msg.result?.degradations?.some((d) => !(d in TOKEN_BUDGET_LABELS)) && (
+              <div className="retry-badge-msg">
+                ⏱️ Time budget:{" "}
+                {msg.result.degradations
+                  .filter((d) => !(d in TOKEN_BUDGET_LABELS))
+                  .map((d) => TIME_BUDGET_LABELS[d] ?? d)
+                  .join(", ")}
+              </div>
+            )}
+            {msg.result?.degradations?.some((d) => d in TOKEN_BUDGET_LABELS) && (
+              <div className="retry-badge-msg">
+                🪙 Token budget used up:{" "}
+                {msg.result.degradations
+                  .filter((d) => d in TOKEN_BUDGET_LABELS)
+                  .map((d) => TOKEN_BUDGET_LABELS[d])
+                  .join(", ")}
+              </div>
+            )}
           </div>
         </div>
       ))}
@@ -16,6 +16,8 @@ interface UseWebSocketReturn {
 
 export function useWebSocket(): UseWebSocketReturn {
   const wsRef = useRef<WebSocket | null>(null);
+  // Request in flight — resumed on reconnect instead of being lost
+  const pendingRequestRef = useRef<string | null>(null);
   const [connected, setConnected] = useState(false);
   const [events, setEvents] = useState<StepEvent[]>([]);
   const [result, setResult] = useState<ChatResult | null>(null);
@@ -27,7 +29,23 @@ export function useWebSocket(): UseWebSocketReturn {
 
     const ws = createChatWebSocket();
 
-    ws.onopen = () => setConnected(true);
+    ws.onopen = () => {
+      setConnected(true);
+      if (pendingRequestRef.current) {
+        // The server replays the run's events, then continues it
+        setEvents([]);
+        ws.send(
+          JSON.stringify({
+            resume: pendingRequestRef.current,
+            // only the session that started the run may resume it
+            session_id:
+              typeof window !== "undefined"
+                ? sessionStorage.getItem("demo_session_id")
+                : null,
+          })
+        );
+      }
+    };
     ws.onclose = () => {
       setConnected(false);
       // Auto-reconnect after 2s
@@ -44,12 +62,16 @@ export function useWebSocket(): UseWebSocketReturn {
           if (typeof window !== "undefined") {
             sessionStorage.setItem("demo_session_id", data.session_id);
           }
+        } else if (data.type === "request") {
+          pendingRequestRef.current = data.request_id;
         } else if (data.type === "event") {
           setEvents((prev) => [...prev, data as StepEvent]);
         } else if (data.type === "result") {
+          pendingRequestRef.current = null;
           setResult(data as ChatResult);
           setLoading(false);
         } else if (data.type === "error") {
+          pendingRequestRef.current = null;
           setError(data.error || "Unknown error");
           setLoading(false);
         }
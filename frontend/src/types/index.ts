@@ -5,6 +5,7 @@ export interface StepEvent {
   status: "pending" | "processing" | "success" | "failed" | "retry" | "skipped";
   detail: string;
   data: Record<string, unknown>;
+  degradations?: string[];
 }
 
 export interface ToolResult {
@@ -30,6 +31,7 @@ export interface ChatResult {
   events: StepEvent[];
   tool_results: ToolResult[];
   had_retry: boolean;
+  degradations?: string[];
 }
 
 export interface Scenario {